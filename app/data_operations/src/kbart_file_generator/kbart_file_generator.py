@@ -3,30 +3,30 @@
 from __future__ import annotations
 
 import argparse
-import base64
 import csv
-import json
 import multiprocessing
 import os
 from collections.abc import Mapping, Sequence
 from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import UTC, datetime
 from pathlib import Path
-from urllib.error import HTTPError, URLError
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
 
+import requests
 from ht_utils.ht_logger import get_ht_logger
 from ht_utils.ht_mysql import HtMysql, get_mysql_conn
 from ht_utils.ht_utils import (
     get_solr_url,
     normalize_catalog_id_pad_zeros,
     normalize_catalog_id_stripped_zeros,
-    split_into_batches,
     write_metadata_summary,
     write_tsv,
 )
-from ht_utils.query_maker import make_solr_term_query
+from ht_utils.query_maker import (
+    SOLR_TERMS_QUERY_MAX_BYTES,
+    make_solr_term_query,
+    split_terms_by_size,
+)
+from ht_utils.solr_client import get_solr_client
 from ht_utils.text_processor import first_value, list_values
 
 logger = get_ht_logger(name=__name__)
@@ -57,7 +57,9 @@ DEFAULT_INPUT_FILE = Path(__file__).parent / "data" / "data"
 DEFAULT_OUTPUT_FILE = Path(__file__).parent / "output" / "kbart_print_holdings.tsv"
 DEFAULT_METADATA_FILE = Path(__file__).parent / "output" / "kbart_print_holdings.metadata.json"
 DEFAULT_ERROR_FILE = Path(__file__).parent / "output" / "kbart_print_holdings.errors.tsv"
-DEFAULT_BATCH_SIZE = 100
+# The catalog_ids of each Solr request are chosen by the size of the terms query (see split_terms_by_size).
+# 64 KB are about 6500 catalog_ids, padded to 9 digits
+DEFAULT_MAX_QUERY_BYTES = 64 * 1024
 
 SOLR_FIELDS = [
     "id",
@@ -95,8 +97,15 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--batch-size",
         type=int,
-        default=DEFAULT_BATCH_SIZE,
-        help="Maximum number of catalog_ids to include per Solr request.",
+        default=None,
+        help="Maximum number of catalog_ids to include per Solr request. By default, it is limited by "
+        "--max-query-bytes.",
+    )
+    parser.add_argument(
+        "--max-query-bytes",
+        type=int,
+        default=DEFAULT_MAX_QUERY_BYTES,
+        help=f"Maximum size of the catalog_ids of each Solr request (at most {SOLR_TERMS_QUERY_MAX_BYTES} bytes).",
     )
     parser.add_argument(
         "--env", default=os.environ.get("HT_ENVIRONMENT", "dev"), help="Lookup environment."
@@ -225,28 +234,24 @@ def fetch_title_metadata_from_solr_batch(
         "rows": len(batch),
         "wt": "json",
     }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    auth = None
     if os.getenv("SOLR_USER") and os.getenv("SOLR_PASSWORD"):
-        raw_auth = f"{os.environ['SOLR_USER']}:{os.environ['SOLR_PASSWORD']}".encode()
-        headers["Authorization"] = f"Basic {base64.b64encode(raw_auth).decode('ascii')}"
+        auth = (os.environ["SOLR_USER"], os.environ["SOLR_PASSWORD"])
 
     normalized_batch = [normalize_catalog_id_pad_zeros(catalog_id) for catalog_id in batch]
 
     params.update({"fq": make_solr_term_query(normalized_batch, "record")})
-    request = Request(
-        query_url,
-        data=urlencode(params).encode("utf-8"),
-        headers=headers,
-        method="POST",
-    )
+    # The batches are queried in parallel threads sharing the pool of connections to Solr
+    solr_client = get_solr_client(query_url, pool_size=MAX_WORKERS)
     try:
-        with urlopen(request, timeout=30) as response:
-            payload = json.load(response)
-    except HTTPError as exc:
+        response = solr_client.post(query_url, data=params, auth=auth, timeout=30)
+        response.raise_for_status()
+        payload = response.json()
+    except requests.exceptions.HTTPError as exc:
         raise RuntimeError(
-            f"Solr query failed with HTTP {exc.code} for batch {list(batch)}"
+            f"Solr query failed with HTTP {exc.response.status_code} for batch {list(batch)}"
         ) from exc
-    except URLError as exc:
+    except requests.exceptions.RequestException as exc:
         raise RuntimeError(f"Could not reach Solr at {query_url}") from exc
 
     results_by_id: dict[str, dict[str, object]] = {}
@@ -259,14 +264,34 @@ def fetch_title_metadata_from_solr_batch(
     return results_by_id
 
 
+def split_catalog_ids(
+    catalog_ids: Sequence[str],
+    batch_size: int | None = None,
+    max_query_bytes: int = DEFAULT_MAX_QUERY_BYTES,
+) -> list[list[str]]:
+    """
+    Split the catalog_ids in batches whose terms query has at most max_query_bytes bytes. The size of the
+    catalog_ids padded with zeros, as they are sent to Solr (see fetch_title_metadata_from_solr_batch), is counted.
+    """
+    return list(
+        split_terms_by_size(
+            catalog_ids,
+            max_bytes=min(max_query_bytes, SOLR_TERMS_QUERY_MAX_BYTES),
+            max_terms=batch_size,
+            key=normalize_catalog_id_pad_zeros,
+        )
+    )
+
+
 def fetch_lookup_results_in_parallel(
     catalog_ids: Sequence[str],
-    batch_size: int = DEFAULT_BATCH_SIZE,
+    batch_size: int | None = None,
+    max_query_bytes: int = DEFAULT_MAX_QUERY_BYTES,
 ) -> tuple[dict[str, dict[str, object]], dict[str, dict[str, object]]]:
     if not catalog_ids:
         return {}, {}
 
-    id_batches = list(split_into_batches(list(catalog_ids), batch_size))
+    id_batches = split_catalog_ids(catalog_ids, batch_size=batch_size, max_query_bytes=max_query_bytes)
     total_workers = min(multiprocessing.cpu_count() * 2, MAX_WORKERS)
 
     db_conn = get_mysql_conn(pool_size=total_workers)
@@ -320,10 +345,11 @@ def write_error_report(path: Path, errors: Sequence[dict[str, str]]) -> Path:
 def generate_kbart_rows(
     catalog_ids: Sequence[str],
     *,
-    batch_size: int = DEFAULT_BATCH_SIZE,
+    batch_size: int | None = None,
+    max_query_bytes: int = DEFAULT_MAX_QUERY_BYTES,
 ) -> tuple[list[dict[str, str]], list[dict[str, str]]]:
     metadata_by_id, date_by_id = fetch_lookup_results_in_parallel(
-        catalog_ids, batch_size=batch_size
+        catalog_ids, batch_size=batch_size, max_query_bytes=max_query_bytes
     )
 
     logger.info(
@@ -356,13 +382,15 @@ def generate_kbart_export(
     metadata_file: Path,
     error_file: Path,
     *,
-    batch_size: int = DEFAULT_BATCH_SIZE,
+    batch_size: int | None = None,
+    max_query_bytes: int = DEFAULT_MAX_QUERY_BYTES,
 ) -> tuple[int, list[dict[str, str]]]:
     # Load all the rows of the file
     catalog_ids = read_catalog_ids(input_file)
     rows, errors = generate_kbart_rows(
         catalog_ids,
         batch_size=batch_size,
+        max_query_bytes=max_query_bytes,
     )
 
     rows_path, written_rows = write_tsv(rows, output_file, columns_name=KBART_COLUMN_ORDER)
@@ -392,6 +420,7 @@ def main() -> None:
         args.metadata_file,
         args.error_file,
         batch_size=args.batch_size,
+        max_query_bytes=args.max_query_bytes,
     )
     logger.info("Generated %d KBART rows", written_rows)
     if errors:
@@ -7,6 +7,7 @@ from kbart_file_generator.kbart_file_generator import (
     build_kbart_row,
     fetch_title_dates_from_mysql_batch,
     read_catalog_ids,
+    split_catalog_ids,
 )
 
 
@@ -114,3 +115,15 @@ def test_fetch_title_dates_from_mysql_batch_queries_one_batch(
             "date_last_issue_online": "2005",
         },
     }
+
+
+def test_split_catalog_ids_counts_padded_ids() -> None:
+    """The budget is measured on the catalog_ids padded to 9 digits, as they are sent to Solr"""
+    catalog_ids = ["1", "22", "333", "101703357"]
+
+    batches = split_catalog_ids(catalog_ids, max_query_bytes=19)
+
+    assert batches == [["1", "22"], ["333", "101703357"]]
+    assert all(
+        len(",".join(catalog_id.zfill(9) for catalog_id in batch)) <= 19 for batch in batches
+    )
@@ -0,0 +1,102 @@
+"""
+Benchmark of the creation of the metadata of all the items of a catalog record.
+
+It creates a synthetic serial record with 2,000 items and compares the previous implementation of
+CatalogItemMetadata (ht_json parsed and ht_id searched with list.index for each item, and the record fields copied
+when the item is created) with the current one (ht_json and the positions of the items indexed once per record, and
+the record fields merged only when the metadata is used).
+
+Usage:
+    python benchmarks/catalog_metadata_benchmark.py --items 2000 --repeat 3
+"""
+
+import argparse
+import json
+import time
+
+from catalog_metadata.catalog_metadata import CatalogItemMetadata, CatalogRecordMetadata
+
+
+def create_synthetic_record(total_items: int) -> dict:
+    """Create a serial record with total_items items, each one with its source and publication data"""
+    ht_ids = [f"mdp.{39015000000000 + item}" for item in range(total_items)]
+    ht_json = [
+        {"htid": ht_id, "newly_open": None, "ingest": "20220910", "rights": ["pd", None], "heldby": ["umich"],
+         "collection_code": "miu", "enumcron": f"v. {item + 1}", "enum_pubdate": str(1860 + item % 100),
+         "enum_pubdate_range": "1860-1969", "dig_source": "google"}
+        for item, ht_id in enumerate(ht_ids)
+    ]
+    return {
+        "id": "001234567",
+        "title": ["Synthetic serial"],
+        "author": ["HathiTrust"],
+        "publishDate": ["1860"],
+        "format": ["Serial"],
+        "ht_id": ht_ids,
+        "htsource": ["University of Michigan"] * total_items,
+        "ht_json": json.dumps(ht_json),
+        "ht_id_display": [f"{ht_id}|20220910|v. {item + 1}|1860|1860-1969|||Synthetic serial"
+                          for item, ht_id in enumerate(ht_ids)],
+    }
+
+
+def legacy_item_metadata(ht_id: str, record_metadata: CatalogRecordMetadata) -> dict:
+    """Previous implementation of CatalogItemMetadata"""
+    record = record_metadata.record
+    metadata = {}
+    try:
+        volume_enumcron = record.get("ht_id_display")[0].split("|")[2]
+    except IndexError:
+        volume_enumcron = []
+    doc_json = [item for item in json.loads(record.get("ht_json"))
+                if item.get("enum_pubdate") and ht_id == item.get("htid")]
+    if len(doc_json) > 0:
+        metadata["enumPublishDate"] = doc_json[0].get("ht_json")
+    if len(volume_enumcron) > 1:
+        metadata["volume_enumcron"] = volume_enumcron
+    item_position = record.get("ht_id").index(ht_id)
+    try:
+        metadata["htsource"] = record.get("htsource")[item_position]
+    except IndexError:
+        metadata["htsource"] = record.get("htsource")[0]
+    metadata["vol_id"] = ht_id
+    return {**record_metadata.metadata, **metadata}
+
+
+def current_item_metadata(ht_id: str, record_metadata: CatalogRecordMetadata) -> dict:
+    """Current implementation of CatalogItemMetadata"""
+    return CatalogItemMetadata(ht_id, record_metadata).metadata
+
+
+def run_implementation(implementation, record: dict) -> tuple[list[dict], float]:
+    """Create the metadata of all the items of the record, as the retriever does for a record"""
+    start_time = time.perf_counter()
+    record_metadata = CatalogRecordMetadata(record)
+    items_metadata = [implementation(ht_id, record_metadata) for ht_id in record.get("ht_id")]
+    return items_metadata, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=2000, help="Number of items of the synthetic record")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each implementation")
+    args = parser.parse_args()
+
+    record = create_synthetic_record(args.items)
+    print(f"Synthetic record: items={args.items} ht_json_size={len(record['ht_json'])} bytes")
+
+    results = {}
+    for name, implementation in (("legacy", legacy_item_metadata), ("current", current_item_metadata)):
+        elapsed_times = []
+        for _ in range(args.repeat):
+            items_metadata, elapsed_time = run_implementation(implementation, record)
+            elapsed_times.append(elapsed_time)
+        results[name] = items_metadata
+        print(f"{name:<10} items={len(items_metadata)} best_time={min(elapsed_times):.4f}s "
+              f"per_item={min(elapsed_times) / args.items * 1e6:.1f}us")
+
+    assert results["legacy"] == results["current"], "The implementations generate different metadata"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Memory benchmark of the generation of the ocr field of a full-text search document.
+
+It creates a synthetic zip with 5,000 pages and compares the peak RSS of the previous implementation (all the pages
+loaded in a dictionary, joined into a string and the whole entry serialized with json.dumps to get its size) with
+the streaming implementation of FullTextDocumentGenerator (pages written one at a time into a buffer and the size of
+the entry computed without serializing the ocr field).
+
+Each implementation runs in a new process, so the peak RSS of one does not hide the other.
+
+Usage:
+    python benchmarks/full_text_memory_benchmark.py --pages 5000 --page_size 2000
+"""
+
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import string
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from document_generator.full_text_document_generator import (
+    FullTextDocumentGenerator,
+    get_document_size,
+)
+from ht_utils.text_processor import string_preparation
+
+
+def create_synthetic_zip(zip_path: Path, total_pages: int, page_size: int) -> None:
+    """Create a zip with total_pages .txt files of page_size characters"""
+    words = ["".join(random.choices(string.ascii_letters, k=random.randint(2, 10))) for _ in range(5000)]
+    with zipfile.ZipFile(zip_path, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_doc:
+        for page in range(1, total_pages + 1):
+            text = []
+            length = 0
+            while length < page_size:
+                word = random.choice(words)
+                text.append(word)
+                length += len(word) + 1
+            zip_doc.writestr(f"39015078560292/{page:08d}.txt", " ".join(text) + "\n")
+
+
+def legacy_full_text_entry(zip_path: str) -> int:
+    """Previous implementation of the ocr field and the entry size"""
+    with zipfile.ZipFile(zip_path, mode="r") as zip_doc:
+        file_contents = {name: string_preparation(zip_doc.read(name)) for name in zip_doc.namelist() if
+                         name.endswith('.txt') and not name.startswith('__MACOSX/')}
+        full_text = " ".join([file_contents[key] for key in sorted(file_contents)])
+    entry = {"id": "mdp.39015078560292", "ocr": full_text}
+    entry_data = json.dumps(entry)
+    return len(entry_data.encode('utf-8'))
+
+
+def streaming_full_text_entry(zip_path: str) -> int:
+    """Current implementation of the ocr field and the entry size"""
+    entry = {"id": "mdp.39015078560292", "ocr": FullTextDocumentGenerator.get_full_text_field(zip_path)}
+    return get_document_size(entry)
+
+
+def run_implementation(name: str, zip_path: str, results: multiprocessing.Queue) -> None:
+    implementation = legacy_full_text_entry if name == "legacy" else streaming_full_text_entry
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.time()
+    entry_size = implementation(zip_path)
+    elapsed_time = time.time() - start_time
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((name, entry_size, rss_before, peak_rss, elapsed_time))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=5000, help="Number of pages of the synthetic document")
+    parser.add_argument("--page_size", type=int, default=2000, help="Number of characters of each page")
+    args = parser.parse_args()
+
+    # A fresh interpreter per implementation, so the peak RSS is not inherited from the parent process
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        zip_path = Path(tmp_dir, "39015078560292.zip")
+        create_synthetic_zip(zip_path, args.pages, args.page_size)
+        print(f"Synthetic document: pages={args.pages} zip_size={zip_path.stat().st_size} bytes")
+
+        for name in ("legacy", "streaming"):
+            results = context.Queue()
+            process = context.Process(target=run_implementation, args=(name, str(zip_path), results))
+            process.start()
+            name, entry_size, rss_before, peak_rss, elapsed_time = results.get()
+            process.join()
+            print(f"{name:<10} entry_size={entry_size} bytes peak_rss={peak_rss / 1024:.1f} MB "
+                  f"(+{(peak_rss - rss_before) / 1024:.1f} MB) time={elapsed_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of the creation of the allfields field from the MARC record of a catalog record.
+
+It creates a synthetic MARC record of a serial with 1,000 974 fields and compares the previous implementation of
+get_all_fields_field (start and end events of all the elements parsed, and the string concatenated and stripped for
+each subfield) with the current one (only the end of the data fields parsed and cleared, and the subfields joined
+once).
+
+Both are checked against the values extracted with XPath from the whole record. The previous implementation read the
+subfields at the start of each data field, so it missed the subfields not parsed yet when a data field crosses the
+chunks read by the parser, which happens in large records.
+
+Usage:
+    python benchmarks/marc_allfields_benchmark.py --items 1000 --repeat 3
+"""
+
+import argparse
+import io
+import time
+import xml.sax.saxutils
+
+import lxml.etree
+from catalog_metadata.marc_record import get_all_fields_field
+
+MARC_NAMESPACE = "http://www.loc.gov/MARC21/slim"
+
+# Values of the subfields of the data fields with tag > 99
+ALLFIELDS_XPATH = lxml.etree.XPath("//*[local-name()='datafield'][number(@tag) > 99]/*/text()")
+
+
+def create_synthetic_marc_record(total_items: int) -> str:
+    """Create the MARC XML of a serial with a 974 field (HathiTrust item) for each one of its items"""
+    data_fields = [
+        '<datafield tag="245" ind1="1" ind2="0"><subfield code="a">Synthetic serial.</subfield></datafield>',
+        '<datafield tag="260" ind1=" " ind2=" "><subfield code="a">Ann Arbor,</subfield>'
+        '<subfield code="c">1860-1969.</subfield></datafield>',
+    ]
+    for item in range(total_items):
+        data_fields.append(
+            f'<datafield tag="974" ind1=" " ind2=" ">'
+            f'<subfield code="b">UOM</subfield><subfield code="c">MIU</subfield>'
+            f'<subfield code="d">20220910</subfield><subfield code="s">google</subfield>'
+            f'<subfield code="u">mdp.{39015000000000 + item}</subfield><subfield code="y">{1860 + item % 100}</subfield>'
+            f'<subfield code="r">pd</subfield><subfield code="q">bib</subfield>'
+            f'<subfield code="z">v. {item + 1}</subfield></datafield>'
+        )
+    return (f'<collection xmlns="{MARC_NAMESPACE}"><record><leader>00838nas a22002411  4500</leader>'
+            f'<controlfield tag="001">001234567</controlfield>{"".join(data_fields)}</record></collection>')
+
+
+def legacy_get_all_fields_field(catalog_xml: str) -> str:
+    """Previous implementation of get_all_fields_field"""
+    all_fields = ""
+    xml_string_like_file = io.BytesIO(catalog_xml.encode(encoding="utf-8"))
+    for event, element in lxml.etree.iterparse(xml_string_like_file, events=("start", "end")):
+        if element.tag.find("datafield") > -1:
+            tag_att = element.attrib.get("tag")
+            try:
+                if int(tag_att) > 99 and event == "start":
+                    childs = [child for child in element]
+                    if len(childs) > 0:
+                        for child in childs:
+                            all_fields = all_fields.strip() + " " + str(child.text)
+                    else:
+                        if element.text:
+                            all_fields = all_fields.strip() + " " + str(element.text)
+            except ValueError:
+                pass
+    return xml.sax.saxutils.quoteattr(all_fields)
+
+
+def reference_all_fields(catalog_xml: str) -> list[str]:
+    """Values of the allfields field extracted from the whole record"""
+    return [value.strip() for value in ALLFIELDS_XPATH(lxml.etree.fromstring(catalog_xml.encode("utf-8")))]
+
+
+def run_implementation(implementation, catalog_xml: str) -> tuple[str, float]:
+    """Create the allfields field of the record, as the retriever does once per record"""
+    start_time = time.perf_counter()
+    all_fields = implementation(catalog_xml)
+    return all_fields, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000, help="Number of 974 fields of the synthetic record")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs of each implementation")
+    args = parser.parse_args()
+
+    catalog_xml = create_synthetic_marc_record(args.items)
+    print(f"Synthetic MARC record: 974_fields={args.items} size={len(catalog_xml)} bytes")
+
+    results = {}
+    for name, implementation in (("legacy", legacy_get_all_fields_field), ("current", get_all_fields_field)):
+        elapsed_times = []
+        for _ in range(args.repeat):
+            all_fields, elapsed_time = run_implementation(implementation, catalog_xml)
+            elapsed_times.append(elapsed_time)
+        results[name] = all_fields
+        print(f"{name:<10} allfields_size={len(all_fields)} best_time={min(elapsed_times):.4f}s")
+
+    reference = xml.sax.saxutils.quoteattr(" ".join(reference_all_fields(catalog_xml)))
+    missed_words = len(reference.split()) - len(results["legacy"].split())
+    print(f"legacy missed_words={missed_words}")
+    assert results["current"] == reference, "The current implementation does not generate all the values"
+
+
+if __name__ == "__main__":
+    main()
@@ -51,6 +51,7 @@ def main():
     def solr_indexing(path, list_documents: list = None):
         """Read an XML and feed into SOLR for indexing"""
         response = solr_api.index_documents_by_file(path, list_documents=list_documents)
+        solr_api.commit_pending_documents()
         return {"status": response.status_code, "description": response.headers}
 
     uvicorn.run(app, host=args.host, port=int(args.port))
@@ -1,15 +1,44 @@
 import json
+from functools import cached_property
 
-from catalog_metadata.ht_indexer_config import IDENTICAL_CATALOG_METADATA, RENAMED_CATALOG_METADATA
+from catalog_metadata.ht_indexer_config import (
+    CATALOG_MARC_FIELD,
+    IDENTICAL_CATALOG_METADATA,
+    RENAMED_CATALOG_METADATA,
+)
+from catalog_metadata.marc_record import get_all_fields_field
 
 
 class CatalogRecordMetadata:
-    """This class is used to retrieve the metadata of a specific item in the Catalog"""
+    """This class is used to retrieve the metadata of a specific item in the Catalog.
+
+    A record of a serial could have thousands of items, so the ht_json field and the positions of the items in the
+    ht_id field are indexed once per record (see ht_json_by_item and item_positions), instead of parsing and
+    searching them for each item. The allfields field is also created once per record from the MARC XML, so the
+    messages of its items do not include the MARC record.
+    """
 
     def __init__(self, record: dict):
         self.record = record
         self.metadata = self.get_metadata()
 
+    @cached_property
+    def ht_json_by_item(self) -> dict[str, list[dict]]:
+        """Entries of the ht_json field with publication data (enum_pubdate), by htid"""
+        entries = {}
+        for item in json.loads(self.record.get("ht_json")):
+            if item.get("enum_pubdate"):
+                entries.setdefault(item.get("htid"), []).append(item)
+        return entries
+
+    @cached_property
+    def item_positions(self) -> dict[str, int]:
+        """Position of each item in the ht_id field, it is the position of its source in the htsource field"""
+        positions = {}
+        for position, item_id in enumerate(self.record.get("ht_id")):
+            positions.setdefault(item_id, position)
+        return positions
+
     def get_metadata(self) -> dict:
 
         """Create a dictionary with the fulltext fields extracted from catalog metadata"""
@@ -22,6 +51,10 @@ class CatalogRecordMetadata:
         if self.record.get("date") and self.record.get("enumPublishDate"):
             metadata.update({"bothPublishDate": self.record.get("enumPublishDate")})
 
+        # Create allfields field from the MARC record
+        if self.record.get(CATALOG_MARC_FIELD):
+            metadata["allfields"] = get_all_fields_field(self.record.get(CATALOG_MARC_FIELD))
+
         return metadata
 
     def get_catalog_identical_fields(self) -> dict:
@@ -44,16 +77,27 @@ class CatalogRecordMetadata:
 
 
 class CatalogItemMetadata:
-    """This class is used to retrieve the metadata of a specific item in the Catalog"""
+    """This class is used to retrieve the metadata of a specific item in the Catalog.
+
+    It is a lightweight view of the item on its CatalogRecordMetadata: the item fields are computed with the indexes
+    of the record, and they are merged with the record fields only when the metadata is used (e.g. to publish it).
+    """
+
+    __slots__ = ("record_metadata", "ht_id", "item_metadata", "_metadata")
 
     def __init__(self, ht_id: str, record_metadata: CatalogRecordMetadata = None):
 
         self.record_metadata = record_metadata
         self.ht_id = ht_id
-        metadata = self.get_metadata()
+        self.item_metadata = self.get_metadata()
+        self._metadata = None
 
-        # Merge both dictionaries
-        self.metadata = {**self.record_metadata.metadata, **metadata}
+    @property
+    def metadata(self) -> dict:
+        """Metadata of the item, the record fields merged with the item fields"""
+        if self._metadata is None:
+            self._metadata = {**self.record_metadata.metadata, **self.item_metadata}
+        return self._metadata
 
     def get_volume_enumcron(self) -> list:
         """Obtain the volume and enumcron of a specific item in the catalog.
@@ -84,13 +128,7 @@ class CatalogItemMetadata:
 
     def get_data_ht_json_obj(self) -> list:
         """Obtain the publication data of a specific item in the catalog."""
-        doc_json = [
-            item
-            for item in json.loads(self.record_metadata.record.get("ht_json"))
-            if (_v := item.get("enum_pubdate") and self.ht_id == item.get("htid"))
-        ]
-
-        return doc_json
+        return self.record_metadata.ht_json_by_item.get(self.ht_id, [])
 
     def get_item_htsource(self) -> str:
         """
@@ -98,7 +136,7 @@ class CatalogItemMetadata:
         If there are no sources, return the first source in the list
         :return:
         """
-        item_position = self.record_metadata.record.get("ht_id").index(self.ht_id)
+        item_position = self.record_metadata.item_positions[self.ht_id]
         try:
             ht_source = self.record_metadata.record.get("htsource")[item_position]
         except IndexError:
@@ -86,9 +86,19 @@ IDENTICAL_CATALOG_METADATA = [
     "countryOfPubStr",
     "genre",
     "era",
-    "fullrecord"
 ]
 
+# Catalog fields used to create the metadata of each item of a record (see CatalogItemMetadata)
+CATALOG_ITEM_FIELDS = ["id", "ht_id", "ht_json", "ht_id_display", "htsource", "date", "enumPublishDate"]
+
+# MARC XML of the catalog record. The retriever uses it to create the allfields field once per record, and it is not
+# included in the messages
+CATALOG_MARC_FIELD = "fullrecord"
+
+# Fields retrieved from the Catalog (Solr fl parameter)
+SOLR_CATALOG_FIELDS = list(dict.fromkeys([*IDENTICAL_CATALOG_METADATA, *RENAMED_CATALOG_METADATA.values(),
+                                          *CATALOG_ITEM_FIELDS, CATALOG_MARC_FIELD]))
+
 # indexer queue
 queue_host = os.getenv("QUEUE_HOST") if os.getenv("QUEUE_HOST") else "localhost"
 indexer_queue_name = "indexer_queue"
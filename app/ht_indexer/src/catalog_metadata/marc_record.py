@@ -0,0 +1,47 @@
+import io
+import xml.sax.saxutils
+
+import lxml.etree
+from ht_utils.ht_logger import get_ht_logger
+
+logger = get_ht_logger(name=__name__)
+
+
+# Data fields with a tag greater than this value are included in the allfields field
+MIN_ALLFIELDS_TAG = 99
+
+
+def get_all_fields_field(catalog_xml: str = None) -> str:
+    """
+    Create a string using some of the values of the MARC XML file.
+
+    Only the end of the data fields is parsed, when all their subfields are available, and each data field is cleared
+    and deleted from the tree with its previous siblings once its values are collected, so the memory and the time
+    are linear in the size of the record (e.g. serials with hundreds of 974 fields).
+    :param catalog_xml: MARC XML of the catalog record (fullrecord field)
+    :return: The values of the data fields with tag > 99, quoted to be used as an XML attribute
+    """
+
+    all_fields = []
+
+    xml_string_like_file = io.BytesIO(catalog_xml.encode(encoding="utf-8"))
+
+    # {*} matches the data fields with or without the MARC namespace
+    for _, element in lxml.etree.iterparse(xml_string_like_file, events=("end",), tag="{*}datafield"):
+        tag_att = element.attrib.get("tag")
+        try:
+            if int(tag_att) > MIN_ALLFIELDS_TAG:
+                # Looks for subfields
+                childs = [child for child in element]
+                if len(childs) > 0:
+                    all_fields.extend(child.text.strip() for child in childs if child.text and child.text.strip())
+                elif element.text and element.text.strip():
+                    all_fields.append(element.text.strip())
+        except ValueError as e:
+            logger.info(f"Element tag is not an integer value {e}")
+        element.clear()
+        # The cleared data fields are still children of the record, delete the previous ones so the tree does not
+        # grow with the size of the record
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    return xml.sax.saxutils.quoteattr(" ".join(all_fields))
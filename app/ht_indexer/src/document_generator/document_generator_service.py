@@ -1,24 +1,46 @@
 import argparse
-import json
 import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from pathlib import Path
 
 from ht_document.ht_document import HtDocument
+from ht_indexer_monitoring.fingerprint_store import FingerprintStore
+from ht_queue_service.claim_check_store import ClaimCheckStore
+from ht_queue_service.message_encoding import decode_message
 from ht_queue_service.queue_consumer import QueueConsumer
 from ht_queue_service.queue_producer import QueueProducer
 from ht_utils.ht_logger import get_ht_logger
 from ht_utils.ht_utils import get_error_message_by_document, get_general_error_message
 
-from .full_text_document_generator import FullTextDocumentGenerator
+from .fingerprint import compute_fingerprint
+from .full_text_document_generator import (
+    FullTextDocumentGenerator,
+    assemble_full_text_document,
+    generate_document_text_fields,
+    get_document_size,
+)
 from .generator_arguments import GeneratorServiceArguments
 
 logger = get_ht_logger(name=__name__)
 
+# Time in seconds the consumer waits for a message before checking the documents generated by the workers
+CONCURRENT_INACTIVITY_TIMEOUT = 1
+
 class DocumentGeneratorService:
     def __init__(self, db_conn, src_queue_consumer: QueueConsumer,
                  tgt_queue_producer: QueueProducer | None,
                  document_repository: str = None,
-                 tgt_local: bool = False
+                 tgt_local: bool = False,
+                 workers: int = 1,
+                 claim_check_store: ClaimCheckStore | None = None,
+                 fingerprint_store: FingerprintStore | None = None,
+                 metadata_only: bool = False
                  ):
 
         """
@@ -31,6 +53,16 @@ class DocumentGeneratorService:
         :param tgt_local: Indicates if the document will be published in a queue or locally
         :param document_repository: Parameter to know if the plain text of the items is in the local or remote
         repository
+        :param workers: Number of worker processes generating documents. If it is greater than 1, the messages are
+        processed concurrently (see consume_messages_concurrently)
+        :param claim_check_store: Store where the documents are written. If it is defined, only a reference to the
+        document {id, path, size, checksum} is published in the queue
+        :param fingerprint_store: Store of the fingerprints of the inputs of the indexed documents. If it is
+        defined, the items whose inputs did not change since their last indexed document are not generated again
+        (see check_fingerprints)
+        :param metadata_only: If True, only the metadata of the documents is updated, with Solr atomic updates
+        that do not read the zip and METS files (see update_document_metadata). The fingerprint store is not used,
+        because the fingerprint includes the zip and METS files, that are not indexed again
         """
 
         # Instantiate the document generator object
@@ -38,10 +70,17 @@ class DocumentGeneratorService:
 
         self.src_queue_consumer = src_queue_consumer
         self.document_repository = document_repository
+        self.workers = workers
+        self.claim_check_store = claim_check_store
+        self.fingerprint_store = fingerprint_store
+        self.metadata_only = metadata_only
+        # Fingerprints of the documents generated by the workers, by delivery tag (see complete_documents)
+        self.pending_fingerprints: dict[int, str] = {}
         if not tgt_local:
             self.tgt_queue_producer = tgt_queue_producer
 
-    def generate_full_text_entry(self, item_id: str, record: dict, document_repository: str):
+    def generate_full_text_entry(self, item_id: str, record: dict, document_repository: str,
+                                 mysql_metadata: dict | None = None):
 
         start_time = time.time()
         logger.info(f"Generating document {item_id}")
@@ -57,13 +96,12 @@ class DocumentGeneratorService:
             raise FileNotFoundError(f"The file of the ht_id={ht_document.document_id} on the path={ht_document.source_path}.zip not found")
         logger.info(f"Processing item {ht_document.document_id} using {ht_document.source_path}.zip")
         try:
-            entry = self.document_generator.make_full_text_search_document(ht_document, record)
+            entry = self.document_generator.make_full_text_search_document(ht_document, record, mysql_metadata)
         except Exception as e:
             raise Exception(f"Document {ht_document.document_id} could not be generated: Error - {e}") from e
 
-        # Use to get the size of the entry dictionary
-        entry_data = json.dumps(entry)
-        entry_size = len(entry_data.encode('utf-8'))  # Convert to bytes and get length
+        # Use to get the size of the entry dictionary without serializing the ocr field again
+        entry_size = get_document_size(entry)
         logger.info(f"Time to generate process=full-text_document ht_id={ht_document.document_id} "
                     f"Time={time.time() - start_time:.10f} Size={entry_size} bytes")
 
@@ -71,12 +109,57 @@ class DocumentGeneratorService:
 
     def publish_document(self, content: dict = None):
         """
-        Publish the document in a queue
+        Publish the document in a queue. In claim-check mode, the document is written in the store and
+        the message only contains the reference to it.
         """
         message = content
+        if self.claim_check_store:
+            message = self.claim_check_store.store(content)
         logger.info(f"Sending message to queue {content.get('id')}")
         self.tgt_queue_producer.publish_messages(message)
 
+    def check_fingerprints(self, messages: list[dict],
+                           mysql_metadata: dict[str, dict]) -> tuple[dict[str, str], set[str]]:
+        """
+        Compute the fingerprint of the inputs of each item (zip, METS, catalog record, rights and holdings) and
+        compare it with the fingerprint of its last generated document.
+        :param messages: List of messages retrieved from the queue
+        :param mysql_metadata: MySQL fields of the items {ht_id: fields}
+        :return: The fingerprints of the items {ht_id: fingerprint} and the set of ht_ids whose inputs did not
+        change. The items whose fingerprint could not be computed (e.g. the zip file does not exist) are generated
+        as usual, and they fail in the generation.
+        """
+        fingerprints = {}
+        for message in messages:
+            item_id = message.get("ht_id")
+            ht_document = HtDocument(document_id=item_id, document_repository=self.document_repository)
+            try:
+                fingerprints[item_id] = compute_fingerprint(ht_document.source_path, message,
+                                                            mysql_metadata.get(item_id))
+            except OSError as e:
+                logger.info(f"Fingerprint of ht_id={item_id} not computed: {e}")
+
+        stored_fingerprints = self.fingerprint_store.get_fingerprints(list(fingerprints))
+        unchanged_items = {item_id for item_id, fingerprint in fingerprints.items()
+                           if stored_fingerprints.get(item_id) == fingerprint}
+        return fingerprints, unchanged_items
+
+    def skip_unchanged_documents(self, messages: list[dict], delivery_tags: list[int]):
+        """Acknowledge the messages of the items whose inputs did not change and mark them as completed,
+        without generating their documents again"""
+        if not messages:
+            return
+        for delivery_tag in delivery_tags:
+            self.src_queue_consumer.positive_acknowledge(self.src_queue_consumer.channel, delivery_tag)
+        self.fingerprint_store.mark_completed([message.get("ht_id") for message in messages])
+        logger.info(f"Skipped total_items={len(messages)} with unchanged inputs")
+
+    def save_pending_fingerprint(self, item_id: str, fingerprint: str | None):
+        """Save the fingerprint of a document before publishing it in the queue. The indexer confirms it once the
+        document is indexed (see FingerprintStore.confirm_fingerprints)"""
+        if self.fingerprint_store and fingerprint:
+            self.fingerprint_store.save_pending_fingerprints({item_id: fingerprint})
+
     def log_error_document_generator_service(self, e, document, delivery_tag):
         """
         Log the error message when the document could not be generated and reject the message requeeing the message
@@ -90,25 +173,264 @@ class DocumentGeneratorService:
                                                delivery_tag)
 
     def consume_messages(self):
+        """
+        Consume the messages from the queue and generate the documents in batches of size batch_size
+        (src_queue configuration). The batch is processed when it is full or when no message arrives
+        before the inactivity timeout of the consumer.
+        If the service runs with more than one worker, the messages are processed concurrently, except in
+        metadata-only mode, that does not have CPU-bound work.
+        """
+        if self.workers > 1 and not self.metadata_only:
+            self.consume_messages_concurrently()
+            return
+
+        batch_size = self.src_queue_consumer.queue_manager.batch_size
+        messages = []
+        delivery_tags = []
         try:
-            for method_frame, _properties, body in self.src_queue_consumer.consume_message():
+            for method_frame, properties, body in self.src_queue_consumer.consume_message():
                 if method_frame:
-                    message = json.loads(body.decode('utf-8'))
-                    self.generate_document(message, method_frame.delivery_tag)
+                    messages.append(decode_message(body, properties.content_encoding))
+                    delivery_tags.append(method_frame.delivery_tag)
+                if messages and (len(messages) >= batch_size or not method_frame):
+                    self.generate_documents(messages, delivery_tags)
+                    messages, delivery_tags = [], []
         except Exception as e:
             logger.error(f"There is something wrong with the queue connection: "
                          f"{get_general_error_message('DocumentGeneratorService', e)}")
 
-    def generate_document(self, message: dict, delivery_tag: int):
+    def generate_documents(self, messages: list[dict], delivery_tags: list[int]):
+        """
+        Generate the documents of a batch of messages. The MySQL fields of all the items in the batch are
+        retrieved with a bounded number of queries before generating each document. If they could not be
+        retrieved, all the messages of the batch are rejected.
+
+        :param messages: List of messages retrieved from the queue
+        :param delivery_tags: List of delivery tags of the messages
+        """
+        start_time = time.time()
+        try:
+            mysql_metadata = self.document_generator.mysql_data_extractor.retrieve_mysql_data_batch(
+                [message.get("ht_id") for message in messages]
+            )
+        except Exception as e:
+            for message, delivery_tag in zip(messages, delivery_tags, strict=True):
+                self.log_error_document_generator_service(e, message, delivery_tag)
+            return
+        logger.info(f"Time to generate process=MySQL_fields_batch total_items={len(messages)} "
+                    f"Time={time.time() - start_time:.10f}")
+
+        fingerprints, unchanged_items = {}, set()
+        # The metadata updates do not read the zip and METS files, so they are always published
+        if self.fingerprint_store and not self.metadata_only:
+            fingerprints, unchanged_items = self.check_fingerprints(messages, mysql_metadata)
+            skipped = [(message, delivery_tag) for message, delivery_tag in zip(messages, delivery_tags, strict=True)
+                       if message.get("ht_id") in unchanged_items]
+            self.skip_unchanged_documents([message for message, _ in skipped],
+                                          [delivery_tag for _, delivery_tag in skipped])
+
+        for message, delivery_tag in zip(messages, delivery_tags, strict=True):
+            item_id = message.get("ht_id")
+            if item_id in unchanged_items:
+                continue
+            if self.metadata_only:
+                self.update_document_metadata(message, delivery_tag, mysql_metadata.get(item_id))
+            else:
+                self.generate_document(message, delivery_tag, mysql_metadata.get(item_id),
+                                       fingerprints.get(item_id))
+
+    def consume_messages_concurrently(self):
+        """
+        Consume the messages from the queue and generate the documents in parallel.
+
+        The consumer thread groups the messages in batches of at most batch_size messages (src_queue
+        configuration) and hands each batch to a thread pool, that retrieves the MySQL fields of all its items
+        (see MysqlMetadataExtractor.retrieve_mysql_data_batch), and each message to a process pool, that generates
+        the ocr, allfields and METS fields (CPU-bound work). The documents are published, and the messages are
+        acknowledged, on the consumer thread in order of completion, because the channels are not thread-safe.
+        At most max(2 * workers, batch_size) messages are in flight. When the consumer stops, the documents in
+        flight are published before leaving.
+        """
+        batch_size = self.src_queue_consumer.queue_manager.batch_size
+        max_in_flight = max(self.workers * 2, batch_size)
+        # text fields future -> (message, delivery_tag, MySQL fields of the batch future)
+        pending: dict[Future, tuple[dict, int, Future]] = {}
+        # fingerprints of the batch future -> (message, delivery_tag) of the batch (see check_batch_fingerprints)
+        pending_batches: dict[Future, list[tuple[dict, int]]] = {}
+        # (message, delivery_tag) of the messages waiting to be submitted to the workers
+        batch: list[tuple[dict, int]] = []
+
+        with ProcessPoolExecutor(max_workers=self.workers) as process_pool, \
+                ThreadPoolExecutor(max_workers=self.workers) as thread_pool:
+            try:
+                # Allow the broker to deliver as many messages as the workers can process
+                self.src_queue_consumer.channel.basic_qos(prefetch_count=max_in_flight)
+
+                for method_frame, properties, body in self.src_queue_consumer.consume_message(
+                        inactivity_timeout=CONCURRENT_INACTIVITY_TIMEOUT):
+                    if method_frame:
+                        batch.append((decode_message(body, properties.content_encoding), method_frame.delivery_tag))
+
+                    # Submit the batch when it is full, when no message arrives before the inactivity timeout or
+                    # when the maximum number of messages in flight is reached
+                    if batch and (len(batch) >= batch_size or not method_frame
+                                  or self.count_in_flight(pending, pending_batches) + len(batch) >= max_in_flight):
+                        self.submit_documents(batch, pending, pending_batches, process_pool, thread_pool)
+                        batch = []
+
+                    # Wait for a worker only when the maximum number of messages in flight is reached
+                    self.submit_checked_batches(pending_batches, pending, process_pool,
+                                                block=not pending and
+                                                self.count_in_flight(pending, pending_batches) >= max_in_flight)
+                    self.complete_documents(pending,
+                                            block=self.count_in_flight(pending, pending_batches) >= max_in_flight)
+
+                if batch:
+                    self.submit_documents(batch, pending, pending_batches, process_pool, thread_pool)
+            except Exception as e:
+                logger.error(f"There is something wrong with the queue connection: "
+                             f"{get_general_error_message('DocumentGeneratorService', e)}")
+            finally:
+                self.drain_documents(pending, pending_batches, process_pool)
+
+    @staticmethod
+    def count_in_flight(pending: dict[Future, tuple[dict, int, Future]],
+                        pending_batches: dict[Future, list[tuple[dict, int]]]) -> int:
+        """Number of messages handed to the workers and not acknowledged or rejected yet"""
+        return len(pending) + sum(len(batch) for batch in pending_batches.values())
+
+    def check_batch_fingerprints(self, messages: list[dict]) -> tuple[dict[str, dict], dict[str, str], set[str]]:
+        """Retrieve the MySQL fields of a batch of messages and check the fingerprints of their items
+        (see check_fingerprints). It runs in the thread pool, so the consumer thread does not wait for MySQL
+        and the file system.
+        :return: The MySQL fields of the items, their fingerprints and the set of ht_ids whose inputs did not change
+        """
+        mysql_metadata = self.document_generator.mysql_data_extractor.retrieve_mysql_data_batch(
+            [message.get("ht_id") for message in messages]
+        )
+        fingerprints, unchanged_items = self.check_fingerprints(messages, mysql_metadata)
+        return mysql_metadata, fingerprints, unchanged_items
+
+    def submit_documents(self, batch: list[tuple[dict, int]], pending: dict[Future, tuple[dict, int, Future]],
+                         pending_batches: dict[Future, list[tuple[dict, int]]],
+                         process_pool: ProcessPoolExecutor, thread_pool: ThreadPoolExecutor):
+        """
+        Hand a batch of messages to the workers. The MySQL fields of the batch are retrieved by the thread pool,
+        and the text fields of each message by the process pool. If the fingerprint store is defined, the MySQL
+        fields are retrieved before the text fields, because they are part of the fingerprint, so the batch is
+        only checked by the thread pool (see check_batch_fingerprints) and its messages are submitted to the
+        process pool once the check is done (see submit_checked_batches).
+
+        :param batch: List of (message, delivery_tag)
+        :param pending: Dictionary with the text fields futures and their message, delivery tag and MySQL future
+        :param pending_batches: Dictionary with the fingerprint futures and their batch
+        """
+        if self.fingerprint_store:
+            pending_batches[thread_pool.submit(self.check_batch_fingerprints,
+                                               [message for message, _ in batch])] = batch
+            return
+
+        mysql_future = thread_pool.submit(self.document_generator.mysql_data_extractor.retrieve_mysql_data_batch,
+                                          [message.get("ht_id") for message, _ in batch])
+        self.submit_text_fields(batch, mysql_future, pending, process_pool)
+
+    def submit_checked_batches(self, pending_batches: dict[Future, list[tuple[dict, int]]],
+                               pending: dict[Future, tuple[dict, int, Future]],
+                               process_pool: ProcessPoolExecutor, block: bool = False):
+        """
+        Skip the items of the checked batches whose inputs did not change and submit the rest of the messages to
+        the process pool. If the batch could not be checked, all its messages are rejected.
+
+        :param pending_batches: Dictionary with the fingerprint futures and their batch
+        :param pending: Dictionary with the text fields futures and their message, delivery tag and MySQL future
+        :param block: If True, wait until at least one batch is checked
+        """
+        if not pending_batches:
+            return
+        done, _ = wait(pending_batches, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for batch_future in done:
+            batch = pending_batches.pop(batch_future)
+            try:
+                mysql_metadata, fingerprints, unchanged_items = batch_future.result()
+            except Exception as e:
+                for message, delivery_tag in batch:
+                    self.log_error_document_generator_service(e, message, delivery_tag)
+                continue
+            skipped = [(message, delivery_tag) for message, delivery_tag in batch
+                       if message.get("ht_id") in unchanged_items]
+            self.skip_unchanged_documents([message for message, _ in skipped],
+                                          [delivery_tag for _, delivery_tag in skipped])
+            batch = [(message, delivery_tag) for message, delivery_tag in batch
+                     if message.get("ht_id") not in unchanged_items]
+            for message, delivery_tag in batch:
+                if message.get("ht_id") in fingerprints:
+                    self.pending_fingerprints[delivery_tag] = fingerprints[message.get("ht_id")]
+
+            mysql_future = Future()
+            mysql_future.set_result(mysql_metadata)
+            self.submit_text_fields(batch, mysql_future, pending, process_pool)
+
+    def submit_text_fields(self, batch: list[tuple[dict, int]], mysql_future: Future,
+                           pending: dict[Future, tuple[dict, int, Future]], process_pool: ProcessPoolExecutor):
+        """Submit the generation of the text fields of each message of the batch to the process pool"""
+        for message, delivery_tag in batch:
+            logger.info(f"Generating document {message.get('ht_id')}")
+            text_future = process_pool.submit(generate_document_text_fields, message.get("ht_id"),
+                                              self.document_repository, message.get("fullrecord"))
+            pending[text_future] = (message, delivery_tag, mysql_future)
+
+    def complete_documents(self, pending: dict[Future, tuple[dict, int, Future]], block: bool = False):
+        """
+        Publish the documents generated by the workers and acknowledge their messages.
+        If the document generation failed, the message is rejected.
+
+        :param pending: Dictionary with the text fields futures and their message, delivery tag and MySQL future
+        :param block: If True, wait until at least one document is generated
+        """
+        if not pending:
+            return
+        done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for text_future in done:
+            message, delivery_tag, mysql_future = pending.pop(text_future)
+            fingerprint = self.pending_fingerprints.pop(delivery_tag, None)
+            try:
+                item_id = message.get("ht_id")
+                full_text_document = assemble_full_text_document(item_id, text_future.result(), message,
+                                                                 mysql_future.result().get(item_id, {}))
+
+                self.save_pending_fingerprint(item_id, fingerprint)
+                self.publish_document(full_text_document)
+                self.src_queue_consumer.positive_acknowledge(self.src_queue_consumer.channel, delivery_tag)
+            except Exception as e:
+                self.log_error_document_generator_service(e, message, delivery_tag)
+
+    def drain_documents(self, pending: dict[Future, tuple[dict, int, Future]],
+                        pending_batches: dict[Future, list[tuple[dict, int]]] | None = None,
+                        process_pool: ProcessPoolExecutor | None = None):
+        """Wait until all the documents in flight are generated, publish them and acknowledge their messages.
+        It runs when the consumer stops, so the generated documents are not lost."""
+        try:
+            while pending_batches:
+                self.submit_checked_batches(pending_batches, pending, process_pool, block=True)
+            while pending:
+                self.complete_documents(pending, block=True)
+        except Exception as e:
+            logger.error(f"The documents in flight could not be published: "
+                         f"{get_general_error_message('DocumentGeneratorService', e)}")
+
+    def generate_document(self, message: dict, delivery_tag: int, mysql_metadata: dict | None = None,
+                          fingerprint: str | None = None):
 
         item_id = message.get("ht_id")
 
         # try to generate the full text entry dictionary, if it fails, the message is rejected
         try:
-            full_text_document = self.generate_full_text_entry(item_id, message, self.document_repository)
+            full_text_document = self.generate_full_text_entry(item_id, message, self.document_repository,
+                                                               mysql_metadata)
 
             # try to publish the full text entry dictionary in the queue, if it fails, the message is
             # rejected
+            self.save_pending_fingerprint(item_id, fingerprint)
             self.publish_document(full_text_document)
             # Acknowledge the message to src_queue if the message is processed successfully and published in
             # the other queue
@@ -117,6 +439,24 @@ class DocumentGeneratorService:
         except Exception as e:
             self.log_error_document_generator_service(e, message, delivery_tag)
 
+    def update_document_metadata(self, message: dict, delivery_tag: int, mysql_metadata: dict | None = None):
+        """
+        Publish an atomic update of the metadata of the document (see
+        FullTextDocumentGenerator.make_metadata_update_document). The update is a small message, so it is
+        published in the queue even in claim-check mode. If it fails, the message is rejected.
+        The fingerprint of the item is not saved, the next full generation compares the zip and METS files with
+        the ones of the last indexed document.
+        """
+        item_id = message.get("ht_id")
+        try:
+            update_document = self.document_generator.make_metadata_update_document(item_id, message,
+                                                                                    mysql_metadata)
+            logger.info(f"Sending metadata update to queue {item_id}")
+            self.tgt_queue_producer.publish_messages(update_document)
+            self.src_queue_consumer.positive_acknowledge(self.src_queue_consumer.channel, delivery_tag)
+        except Exception as e:
+            self.log_error_document_generator_service(e, message, delivery_tag)
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -126,7 +466,11 @@ def main():
                                                           init_args_obj.src_queue_consumer,
                                                           init_args_obj.tgt_queue_producer,
                                                           init_args_obj.document_repository,
-                                                          tgt_local=init_args_obj.tgt_local
+                                                          tgt_local=init_args_obj.tgt_local,
+                                                          workers=init_args_obj.workers,
+                                                          claim_check_store=init_args_obj.claim_check_store,
+                                                          fingerprint_store=init_args_obj.fingerprint_store,
+                                                          metadata_only=init_args_obj.metadata_only
                                                           )
     document_generator_service.consume_messages()
 
@@ -18,7 +18,8 @@ class DocumentGeneratorServiceLocal(DocumentGeneratorService):
                  document_local_path: str = DOCUMENT_LOCAL_PATH,
                  document_repository: str = None,
                  document_local_folder: str = "indexing_data",
-                 tgt_local: bool = True):
+                 tgt_local: bool = True,
+                 workers: int = 1):
         """
         This class is responsible to retrieve from the queue a message with metadata at item level and generates
         the full text search entry and publish the document in a local folder
@@ -29,12 +30,14 @@ class DocumentGeneratorServiceLocal(DocumentGeneratorService):
         :param document_local_folder: Folder where the documents are stored
         :param document_repository: The plain text of the item is in the local or remote repository
         :param tgt_local: Indicates if the document will be published in a queue or locally
+        :param workers: Number of worker processes generating documents
         """
 
         super().__init__(db_conn, src_queue_consumer,
                          None,
                          document_repository=document_repository,
-                         tgt_local=tgt_local
+                         tgt_local=tgt_local,
+                         workers=workers
                          )
 
         self.document_local_folder = document_local_folder
@@ -77,7 +80,8 @@ def main():
                                                                document_local_path=init_args_obj.document_local_path,
                                                                document_repository=init_args_obj.document_repository,
                                                                document_local_folder="indexing_data",
-                                                               tgt_local=init_args_obj.tgt_local)
+                                                               tgt_local=init_args_obj.tgt_local,
+                                                               workers=init_args_obj.workers)
     document_generator_service.consume_messages()
 
 
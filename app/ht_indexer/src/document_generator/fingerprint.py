@@ -0,0 +1,41 @@
+import hashlib
+import os
+from pathlib import Path
+
+import orjson
+
+# Fields of the retriever message that are not part of the catalog record
+NOT_CATALOG_FIELDS = ("ht_id",)
+
+
+def hash_file(file_path: Path) -> str | None:
+    """SHA-256 of the content of a file, None if the file does not exist"""
+    try:
+        with file_path.open("rb") as file:
+            return hashlib.file_digest(file, "sha256").hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def compute_fingerprint(source_path: str, message: dict, mysql_metadata: dict | None) -> str:
+    """
+    Compute the fingerprint of the inputs of a full-text document: the zip file (modification time and size),
+    the METS file (checksum), the catalog record (the fields of the retriever message) and the rights and holdings
+    (the MySQL fields). If any of them changes, the document must be generated again.
+    :param source_path: Path of the files of the document, without extension
+    :param message: Message of the retriever with the catalog metadata of the item
+    :param mysql_metadata: MySQL fields of the item (see MysqlMetadataExtractor.retrieve_mysql_data)
+    :return: SHA-256 of the inputs
+    :raises FileNotFoundError: If the zip file does not exist
+    """
+    zip_stat = os.stat(f"{source_path}.zip")
+    # The members of ht_heldby and the coll_ids are sets, the order of the MySQL rows must not change the fingerprint
+    mysql_fields = {key: sorted(map(str, value)) if isinstance(value, list) else value
+                    for key, value in (mysql_metadata or {}).items()}
+    inputs = {
+        "zip": [zip_stat.st_mtime_ns, zip_stat.st_size],
+        "mets": hash_file(Path(f"{source_path}.mets.xml")),
+        "catalog": {key: value for key, value in message.items() if key not in NOT_CATALOG_FIELDS},
+        "mysql": mysql_fields,
+    }
+    return hashlib.sha256(orjson.dumps(inputs, option=orjson.OPT_SORT_KEYS)).hexdigest()
@@ -1,10 +1,11 @@
 import io
+import re
 import time
-import xml.sax.saxutils
 import zipfile
 from pathlib import Path
 
-import lxml.etree
+import orjson
+from catalog_metadata.marc_record import get_all_fields_field
 
 # root imports
 from ht_document.ht_document import HtDocument
@@ -21,6 +22,15 @@ from .mysql_data_extractor import MysqlMetadataExtractor
 
 logger = get_ht_logger(name=__name__)
 
+# Fields of the full-text document retrieved from MySQL. The fields without value are removed from the document by
+# the atomic updates (see make_metadata_update_document)
+MYSQL_FIELDS = ("rights", "ht_heldby", "ht_heldby_brlm", "coll_id")
+
+# JSON escapes all the control characters (below 0x20). These ones take 2 bytes (e.g. \n), the rest of them take
+# 6 bytes (\u00XX)
+JSON_SHORT_ESCAPES = "\b\t\n\f\r"
+CONTROL_CHARACTERS = re.compile(r"[\x00-\x1f]")
+
 
 def extract_fields_from_mets_file(doc_source_path) -> dict:
     """Read the METS file and extract the fields to be used in the full-text search entry
@@ -43,6 +53,76 @@ def extract_fields_from_mets_file(doc_source_path) -> dict:
         raise e
 
 
+def generate_document_text_fields(document_id: str, document_repository: str, fullrecord: str) -> dict:
+    """Generate the fields of the full-text search entry extracted from the files of the document (ocr and METS
+    fields) and from the MARC record (allfields). They are the CPU-bound part of the document generation.
+
+    It is a module-level function, so it can run in a worker process of DocumentGeneratorService
+    :param document_id: ht_id of the document
+    :param document_repository: Parameter to know if the plain text of the items is in the local or remote repository
+    :param fullrecord: MARC XML of the catalog record. The messages of the retriever already have the allfields
+    field instead of the MARC record, then it is None
+    :return: a dictionary with the ocr, allfields (if fullrecord is defined) and METS fields
+    """
+    ht_document = HtDocument(document_id=document_id, document_repository=document_repository)
+
+    if not Path(f"{ht_document.source_path}.zip").is_file():
+        raise FileNotFoundError(f"The file of the ht_id={ht_document.document_id} on the "
+                                f"path={ht_document.source_path}.zip not found")
+
+    start = time.time()
+    text_fields = FullTextDocumentGenerator.create_ocr_field(ht_document.source_path)
+    if fullrecord:
+        text_fields.update(FullTextDocumentGenerator.create_allfields_field(fullrecord))
+    text_fields.update(extract_fields_from_mets_file(ht_document.source_path))
+    logger.info(f"Time to generate process=text_fields ht_id={document_id} Time={time.time() - start}")
+    return text_fields
+
+
+def assemble_full_text_document(document_id: str, text_fields: dict, doc_metadata: dict,
+                                mysql_metadata: dict) -> dict:
+    """Create the full-text search entry with the fields generated from the files of the document and the MARC
+    record (see generate_document_text_fields), the catalog metadata of the item and its MySQL fields.
+    The MARC record and the ht_id of the message are not included in the entry.
+    :param document_id: ht_id of the document
+    :param text_fields: ocr, allfields and METS fields
+    :param doc_metadata: Catalog metadata of the item (message of the retriever)
+    :param mysql_metadata: MySQL fields of the document
+    :return: a dictionary with the full text search entry
+    """
+    entry = {"id": document_id}
+    entry.update(text_fields)
+    entry.update({key: value for key, value in doc_metadata.items() if key not in ("fullrecord", "ht_id")})
+    entry.update(mysql_metadata)
+    return entry
+
+
+def get_text_size(text: str) -> int:
+    """Size in bytes of a string encoded as a JSON value in UTF-8, computed without copying the string.
+    The escape sequences of the quotes, the backslashes and the control characters (e.g. form feeds in the OCR
+    text) are counted."""
+    text_size = len(text) if text.isascii() else len(text.encode("utf-8"))
+    escaped_size = text.count('"') + text.count("\\")
+    for character in CONTROL_CHARACTERS.findall(text):
+        escaped_size += 1 if character in JSON_SHORT_ESCAPES else 5
+    return text_size + 2 + escaped_size
+
+
+def get_document_size(entry: dict) -> int:
+    """
+    Size in bytes of the JSON serialization of a full-text search entry. The ocr field, that is most of the
+    document, is measured by get_text_size, so the size is obtained without serializing the whole document again.
+    :param entry: Full-text search entry
+    :return: Size in bytes
+    """
+    ocr = entry.get("ocr")
+    if not isinstance(ocr, str):
+        return len(orjson.dumps(entry))
+    metadata_size = len(orjson.dumps({key: value for key, value in entry.items() if key != "ocr"}))
+    # '"ocr":' plus the comma separating it from the rest of the fields
+    return metadata_size + len('"ocr":,') + get_text_size(ocr)
+
+
 class FullTextDocumentGenerator:
 
     def __init__(self, db_conn: HtMysql):
@@ -72,19 +152,34 @@ class FullTextDocumentGenerator:
             raise e
 
     @staticmethod
-    def txt_files_2_full_text(zip_doc: zipfile.ZipFile):
+    def write_full_text(zip_doc: zipfile.ZipFile, buffer: io.StringIO) -> None:
         """
-        Read all .TXT files in a zip and concatenate their contents.
-        :return: Single string with all text files concatenated.
+        Write the content of the .TXT files in a zip into the buffer, separated by a space.
+        The files are sorted by name and read one at a time, so only one page is decoded in memory
+        besides the buffer.
+        :param zip_doc: Zip file with the pages of the document
+        :param buffer: Buffer to write the text into
         """
 
         # Get only .txt files and sort them by name
         txt_files = sorted([i_file for i_file in zip_doc.namelist() if
                      i_file.endswith('.txt') and not i_file.startswith('__MACOSX/')])
 
-        full_text_parts = [string_preparation(zip_doc.read(f)) for f in txt_files]
+        for position, txt_file in enumerate(txt_files):
+            if position > 0:
+                buffer.write(" ")
+            buffer.write(string_preparation(zip_doc.read(txt_file)))
+
+    @staticmethod
+    def txt_files_2_full_text(zip_doc: zipfile.ZipFile):
+        """
+        Read all .TXT files in a zip and concatenate their contents.
+        :return: Single string with all text files concatenated.
+        """
 
-        return " ".join(full_text_parts)
+        buffer = io.StringIO()
+        FullTextDocumentGenerator.write_full_text(zip_doc, buffer)
+        return buffer.getvalue()
 
     @staticmethod
     def get_full_text_field(zip_doc_path: str):
@@ -102,81 +197,79 @@ class FullTextDocumentGenerator:
             raise FileNotFoundError(f"File {zip_doc_path} not found")
 
         with zipfile.ZipFile(zip_doc_path, mode="r") as zip_doc:
-            file_contents = {name: string_preparation(zip_doc.read(name)) for name in zip_doc.namelist() if
-                             name.endswith('.txt') and not name.startswith('__MACOSX/')}
-            full_text = " ".join([file_contents[key] for key in sorted(file_contents)])
+            full_text = FullTextDocumentGenerator.txt_files_2_full_text(zip_doc)
 
         return full_text
 
     @staticmethod
     def get_all_fields_field(catalog_xml: str = None) -> str:
         """
-        Create a string using some of the values of the MARC XML file
-        :param catalog_xml: Path to the MARC XML file
+        Create a string using some of the values of the MARC XML file. The retriever creates the field once per
+        catalog record (see CatalogRecordMetadata), it is only created here for the messages with the MARC record.
+        :param catalog_xml: MARC XML of the catalog record
         :return:
         """
-
-        all_fields = ""
-
-        xml_string_like_file = io.BytesIO(catalog_xml.encode(encoding="utf-8"))
-
-        for event, element in lxml.etree.iterparse(
-                xml_string_like_file,
-                events=("start", "end"),
-        ):
-            if element.tag.find("datafield") > -1:
-                tag_att = element.attrib.get("tag")
-                try:
-                    if int(tag_att) > 99 and event == "start":
-                        # Looks for subfields
-                        childs = [child for child in element]
-                        if len(childs) > 0:
-                            for child in childs:
-                                all_fields = all_fields.strip() + " " + str(child.text)
-                        else:
-                            if element.text:
-                                all_fields = all_fields.strip() + " " + str(element.text)
-                except ValueError as e:
-                    logger.info(f"Element tag is not an integer value {e}")
-                    pass
-        return xml.sax.saxutils.quoteattr(all_fields)
+        return get_all_fields_field(catalog_xml)
 
     def make_full_text_search_document(self, doc: HtDocument,
-                                       doc_metadata: dict) -> dict:
+                                       doc_metadata: dict,
+                                       mysql_metadata: dict | None = None) -> dict:
         # TODO Check exception if doc_id is None
         """
         Receive the HtDocument object and the metadata from the Catalog API and generate the full text search entry
         :param doc:
         :param doc_metadata:
+        :param mysql_metadata: MySQL fields of the document already retrieved in batch
+        (see MysqlMetadataExtractor.retrieve_mysql_data_batch). If None, they are retrieved for this document.
         :return: a dictionary with the full text search entry
         """
-        entry = {"id": doc.document_id}
-
         start = time.time()
 
         # Generate ocr field and check if the current document is a valid UTF-8 encoded document
-        entry.update(FullTextDocumentGenerator.create_ocr_field(doc.source_path))
-
-        # Generate allfields field from fullrecord field
-        # This field is in a Catalog object, we process it here, and after that we delete because it is not
-        # necessary to be in Solr index
-        entry.update(
-            FullTextDocumentGenerator.create_allfields_field(doc_metadata.get("fullrecord"))
-        )
-        doc_metadata.pop("fullrecord")
+        text_fields = FullTextDocumentGenerator.create_ocr_field(doc.source_path)
+
+        # Generate allfields field from fullrecord field, if the message has the MARC record instead of the
+        # allfields field created by the retriever. The MARC record is not included in the Solr index
+        if doc_metadata.get("fullrecord"):
+            text_fields.update(
+                FullTextDocumentGenerator.create_allfields_field(doc_metadata.get("fullrecord"))
+            )
         logger.info(f"Time to generate process=OCR_field ht_id={doc.document_id} Time={time.time() - start}")
 
-        # Add Catalog fields to the full-text document
-        entry.update(doc_metadata)
-
         start = time.time()
         # Retrieve data from MariaDB
-        entry.update(self.mysql_data_extractor.retrieve_mysql_data(doc.document_id))
+        if mysql_metadata is None:
+            mysql_metadata = self.mysql_data_extractor.retrieve_mysql_data(doc.document_id)
         logger.info(f"Time to generate process=MySQL_fields ht_id={doc.document_id} Time={time.time() - start}")
 
         start = time.time()
         # Extract fields from METS file
-        entry.update(extract_fields_from_mets_file(doc.source_path))
+        text_fields.update(extract_fields_from_mets_file(doc.source_path))
         logger.info(f"Time to generate process=METS_fields ht_id={doc.document_id} Time={time.time() - start}")
-        entry.pop("ht_id")
-        return entry
+        return assemble_full_text_document(doc.document_id, text_fields, doc_metadata, mysql_metadata)
+
+    def make_metadata_update_document(self, document_id: str, doc_metadata: dict,
+                                      mysql_metadata: dict | None = None) -> dict:
+        """
+        Generate a Solr atomic update of the metadata of a full-text document, without reading the zip and METS
+        files. The catalog fields (and allfields) and the MySQL fields (rights, holdings and coll_id) are
+        replaced with {"set": value}, the MySQL fields without value are removed ({"set": null}),
+        and the ocr and METS fields are not changed.
+        :param document_id: ht_id of the document
+        :param doc_metadata: Catalog metadata of the item (see CatalogItemMetadata.get_metadata)
+        :param mysql_metadata: MySQL fields of the document already retrieved in batch
+        (see MysqlMetadataExtractor.retrieve_mysql_data_batch). If None, they are retrieved for this document.
+        :return: a dictionary with the atomic update
+        """
+        fields = {key: value for key, value in doc_metadata.items() if key not in ("ht_id", "fullrecord")}
+        if doc_metadata.get("fullrecord"):
+            fields.update(FullTextDocumentGenerator.create_allfields_field(doc_metadata.get("fullrecord")))
+
+        if mysql_metadata is None:
+            mysql_metadata = self.mysql_data_extractor.retrieve_mysql_data(document_id)
+        fields.update(dict.fromkeys(MYSQL_FIELDS))
+        fields.update(mysql_metadata)
+
+        update_document = {"id": document_id}
+        update_document.update({field: {"set": value} for field, value in fields.items()})
+        return update_document
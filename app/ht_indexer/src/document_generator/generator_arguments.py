@@ -1,12 +1,15 @@
 import sys
 
 from config import config_queue_file_path
+from ht_indexer_monitoring.fingerprint_store import FingerprintStore
+from ht_queue_service.claim_check_store import ClaimCheckStore
 from ht_queue_service.queue_config import QueueConfig, QueueParams
 
 # root imports
 from ht_queue_service.queue_consumer import QueueConsumer
 from ht_queue_service.queue_producer import QueueProducer
 from ht_utils.ht_logger import get_ht_logger
+from ht_utils.ht_mysql import get_mysql_conn as get_tracktable_conn
 
 # utils
 from ht_utils.ht_utils import get_general_error_message
@@ -40,12 +43,49 @@ class GeneratorServiceArguments:
                                  "the documents will be stored in a local folder."
                             )
 
+        parser.add_argument("--workers",
+                            type=int,
+                            default=1,
+                            help="Number of worker processes generating documents in parallel. By default is 1 and "
+                                 "the messages are processed one at a time."
+                            )
+
+        parser.add_argument("--claim_check_path",
+                            help="Path of the folder shared with the indexer where the documents are stored. "
+                                 "If it is defined, only a reference to the document is published in the queue.",
+                            required=False,
+                            default=None
+                            )
+
+        parser.add_argument("--skip_unchanged",
+                            action='store_true',
+                            help="Do not generate again the documents whose inputs (zip, METS, catalog record, "
+                                 "rights and holdings) did not change since their last generation."
+                            )
+
+        parser.add_argument("--metadata_only",
+                            action='store_true',
+                            help="Update only the metadata (catalog, rights, holdings and coll_id fields) of the "
+                                 "documents with Solr atomic updates, without reading the zip and METS files."
+                            )
+
         self.args = parser.parse_args()
 
+        self.workers: int = max(self.args.workers, 1)
+        self.metadata_only: bool = self.args.metadata_only
+
         # MySql connection
         # TODO: Create the db connection pool when required by document_generator_service instead of here to shorten the
         #  startup time of the service
-        self.db_conn = self.get_db_conn()
+        # Each worker thread retrieving the MySQL fields uses its own connection
+        self.db_conn = self.get_db_conn(pool_size=self.workers)
+
+        # Fingerprints of the inputs of the generated documents, stored next to the tracktable. The worker threads
+        # check them in parallel, so the pool has one connection per worker
+        self.fingerprint_store: FingerprintStore | None = None
+        if self.args.skip_unchanged:
+            self.fingerprint_store = FingerprintStore(get_tracktable_conn(pool_size=self.workers))
+            self.fingerprint_store.create_table()
 
         # Queue configuration
         self.src_queue_config, self.tgt_queue_config = GeneratorServiceArguments._build_queue_configs()
@@ -56,7 +96,11 @@ class GeneratorServiceArguments:
         self.tgt_local: bool = self.args.tgt_local
         self.tgt_queue_producer: QueueProducer | None = None
 
+        self.claim_check_store: ClaimCheckStore | None = None
+
         if not self.tgt_local:
+            if self.args.claim_check_path:
+                self.claim_check_store = ClaimCheckStore(self.args.claim_check_path)
             self.tgt_queue_producer = GeneratorServiceArguments._make_producer(self.tgt_queue_config.queue_params)
 
         # Local output options
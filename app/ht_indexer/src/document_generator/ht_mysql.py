@@ -27,9 +27,12 @@ class HtMysql:
                     HtMysql.create_connection_pool(host=host, user=user, password=password, database=database,
                                                    pool_size=pool_size)
 
-    def query_mysql(self, query: str = None) -> list[Any] | None | list[dict[Any, Any]]:
+    def query_mysql(self, query: str = None, params: tuple | None = None) -> list[Any] | None | list[dict[Any, Any]]:
 
-        """Execute a query in MySQL and return the results as a list of dictionaries"""
+        """Execute a query in MySQL and return the results as a list of dictionaries
+        :param query: The SQL query to execute, using %s placeholders for the bound values
+        :param params: Optional tuple of values to bind to the query placeholders
+        """
 
         if not query:
             logger.error("Please pass the valid query")
@@ -40,7 +43,7 @@ class HtMysql:
         try:
             conn = self.get_connection_from_pool()
             cursor = conn.cursor()
-            cursor.execute(query)
+            cursor.execute(query, params)
 
             results = cursor.fetchall()
 
@@ -1,10 +1,17 @@
+from collections import defaultdict
+
 from catalog_metadata.ht_indexer_config import MAX_ITEM_IDS
 from ht_utils.ht_logger import get_ht_logger
+from ht_utils.ht_utils import split_into_batches
 
 from .ht_mysql import HtMysql
 
 logger = get_ht_logger(name=__name__)
 
+# Maximum number of ht_ids included in the IN (...) clause of a single query. It keeps the size of the statement
+# bounded when the generator enriches a large batch of documents.
+MYSQL_BATCH_QUERY_SIZE = 500
+
 def create_coll_id_field(large_coll_id_result: dict) -> dict:
     if len(large_coll_id_result) > 0:
         # Obtain the list with the unique coll_id from the result
@@ -114,3 +121,89 @@ class MysqlMetadataExtractor:
         entry.update(create_coll_id_field(large_coll_id_result))
 
         return entry
+
+    def add_rights_field_batch(self, doc_ids: list[str]) -> dict[str, str]:
+        """
+        Get the rights attribute of a list of documents.
+        :param doc_ids: List of ht_ids
+        :return: Dictionary {ht_id: attr}
+        """
+        rights_by_id = {}
+        for batch in split_into_batches(doc_ids, MYSQL_BATCH_QUERY_SIZE):
+            keys = [extract_namespace_and_id(doc_id) for doc_id in batch]
+            placeholders = ", ".join(["(%s, %s)"] * len(keys))
+            query = f"SELECT namespace, id, attr FROM rights_current WHERE (namespace, id) IN ({placeholders})"
+            logger.info(f"MySQL query: rights_current for {len(keys)} documents")
+            for row in self.mysql_obj.query_mysql(query, tuple(value for key in keys for value in key)):
+                rights_by_id[f"{row.get('namespace')}.{row.get('id')}"] = row.get("attr")
+        return rights_by_id
+
+    def add_ht_heldby_field_batch(self, doc_ids: list[str]) -> tuple[dict[str, list], dict[str, list]]:
+        """
+        Get the ht_heldby and ht_heldby_brlm members of a list of documents with a single query per batch.
+        ht_heldby_brlm are the members with access_count > 0.
+        :param doc_ids: List of ht_ids
+        :return: Two dictionaries {ht_id: [member_id]}, the first one for ht_heldby and the second one for
+        ht_heldby_brlm
+        """
+        ht_heldby = defaultdict(list)
+        heldby_brlm = defaultdict(list)
+        for batch in split_into_batches(doc_ids, MYSQL_BATCH_QUERY_SIZE):
+            placeholders = ", ".join(["%s"] * len(batch))
+            query = (f"SELECT volume_id, member_id, access_count FROM holdings_htitem_htmember "
+                     f"WHERE volume_id IN ({placeholders})")
+            logger.info(f"MySQL query: holdings_htitem_htmember for {len(batch)} documents")
+            for row in self.mysql_obj.query_mysql(query, tuple(batch)):
+                ht_heldby[row.get("volume_id")].append({"member_id": row.get("member_id")})
+                if row.get("access_count") and row.get("access_count") > 0:
+                    heldby_brlm[row.get("volume_id")].append({"member_id": row.get("member_id")})
+        return ht_heldby, heldby_brlm
+
+    def add_large_coll_id_field_batch(self, doc_ids: list[str]) -> dict[str, list]:
+        """
+        Get the list of large coll_ids of a list of documents. See add_large_coll_id_field.
+        :param doc_ids: List of ht_ids
+        :return: Dictionary {ht_id: [{"MColl_ID": coll_id}]}
+        """
+        large_coll_ids = defaultdict(list)
+        for batch in split_into_batches(doc_ids, MYSQL_BATCH_QUERY_SIZE):
+            placeholders = ", ".join(["%s"] * len(batch))
+            query = (f"SELECT mb_item.extern_item_id, mb_item.MColl_ID "
+                     f"FROM mb_coll_item mb_item, mb_collection mb_coll "
+                     f"WHERE mb_item.extern_item_id IN ({placeholders}) "
+                     f"AND mb_coll.num_items > {MAX_ITEM_IDS} ")
+            logger.info(f"MySQL query: mb_coll_item for {len(batch)} documents")
+            for row in self.mysql_obj.query_mysql(query, tuple(batch)):
+                large_coll_ids[row.get("extern_item_id")].append({"MColl_ID": row.get("MColl_ID")})
+        return large_coll_ids
+
+    def retrieve_mysql_data_batch(self, doc_ids: list[str]) -> dict[str, dict]:
+        """
+        Retrieve the MySQL fields (rights, ht_heldby, ht_heldby_brlm and coll_id) of a list of documents.
+        The fields are resolved with three queries per batch of MYSQL_BATCH_QUERY_SIZE ht_ids instead of four
+        queries per document. Each entry has the same format as the output of retrieve_mysql_data.
+
+        :param doc_ids: List of ht_ids
+        :return: Dictionary {ht_id: entry}
+        """
+        # Remove duplicates preserving the order
+        doc_ids = list(dict.fromkeys(doc_ids))
+        logger.info(f"Retrieving data from MySql for {len(doc_ids)} documents")
+
+        rights_by_id = self.add_rights_field_batch(doc_ids)
+        ht_heldby_by_id, heldby_brlm_by_id = self.add_ht_heldby_field_batch(doc_ids)
+        large_coll_id_by_id = self.add_large_coll_id_field_batch(doc_ids)
+
+        entries = {}
+        for doc_id in doc_ids:
+            entry = {}
+            if doc_id in rights_by_id:
+                entry.update({"rights": rights_by_id[doc_id]})
+            # The fields with an empty list of members do not appear in Solr index
+            if ht_heldby_by_id.get(doc_id):
+                entry.update(create_ht_heldby_field(ht_heldby_by_id[doc_id]))
+            if heldby_brlm_by_id.get(doc_id):
+                entry.update(create_ht_heldby_brlm_field(heldby_brlm_by_id[doc_id]))
+            entry.update(create_coll_id_field(large_coll_id_by_id.get(doc_id, [])))
+            entries[doc_id] = entry
+        return entries
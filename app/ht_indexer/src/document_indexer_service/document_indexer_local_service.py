@@ -71,6 +71,8 @@ class DocumentIndexerLocalService:
                             self.clean_up_folder(
                                 document_local_path, chunk
                             )
+                    # One commit after indexing all the files in the folder, instead of one commit per file
+                    self.solr_api_full_text.commit_pending_documents()
 
             except Exception as e:
                 logger.info(f"{document_local_path} does not exit {e}")
@@ -1,7 +1,15 @@
 import argparse
+import signal
 import time
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 
+import orjson
+import requests
 from ht_indexer_api.ht_indexer_api import HTSolrAPI
+from ht_indexer_monitoring.fingerprint_store import FingerprintStore
+from ht_queue_service.claim_check_store import ClaimCheckStore
 from ht_queue_service.queue_config import QueueParams
 from ht_queue_service.queue_multiple_consumer import QueueMultipleConsumer
 from ht_utils.ht_logger import get_ht_logger
@@ -11,19 +19,73 @@ from .indexer_arguments import IndexerServiceArguments
 
 logger = get_ht_logger(name=__name__)
 
+# Operations of the Solr atomic updates, e.g. {"id": "mdp.39015078560292", "rights": {"set": 1}}
+ATOMIC_UPDATE_OPERATIONS = {"set", "add", "add-distinct", "remove", "removeregex", "inc"}
+# The atomic updates are sent to the update handler, /update/json/docs would index them as new documents
+SOLR_ATOMIC_UPDATE_HANDLER = "update"
+# Seconds between two deletions of the expired documents of the claim-check store
+CLAIM_CHECK_CLEANUP_INTERVAL = 3600
+
 
 class DocumentIndexerQueueService(QueueMultipleConsumer):
 
-    def __init__(self, solr_api_full_text: HTSolrAPI, queue_params: QueueParams):
+    def __init__(self, solr_api_full_text: HTSolrAPI, queue_params: QueueParams, in_flight_batches: int = 1,
+                 claim_check_store: ClaimCheckStore | None = None, claim_check_retention: float | None = None,
+                 fingerprint_store: FingerprintStore | None = None):
 
         """Initialize the Document Indexer Queue Service.
         :param solr_api_full_text: The Solr API client for full-text indexing
         :param queue_params: The object with the queue parameters
+        :param in_flight_batches: Number of batches indexed at the same time by worker threads. If it is greater
+        than 1, the next batches are consumed while the previous ones are indexed (see submit_batch)
+        :param claim_check_store: Store shared with the document generator, where the documents of the claim-check
+        references are read from. The references are rejected if it is not defined. The stored documents
+        older than claim_check_retention seconds (e.g. the documents of the messages in the Dead Letter Queue) are
+        deleted every CLAIM_CHECK_CLEANUP_INTERVAL seconds
+        :param claim_check_retention: Seconds the stored documents are kept
+        :param fingerprint_store: Store of the fingerprints of the document generator (--skip_unchanged). If it is
+        defined, the fingerprints of the indexed documents are confirmed and the ones of the failed documents are
+        removed (see update_fingerprints)
         """
         # Call the parent class constructor that initializes the connection to the queue
         super().__init__(queue_params)
         self.solr_api_full_text = solr_api_full_text
 
+        # Counters to measure the cost of isolating the documents that Solr rejects
+        self.indexing_metrics = {"failed_batches": 0, "bisection_requests": 0, "failed_documents": 0}
+
+        self.in_flight_batches = in_flight_batches
+        self.indexing_executor = None
+        if in_flight_batches > 1:
+            self.indexing_executor = ThreadPoolExecutor(max_workers=in_flight_batches)
+            # The broker must deliver the next batch while the in-flight batches are not acknowledged
+            if self.prefetch_batches:
+                self.prefetch_batches = max(self.prefetch_batches, in_flight_batches + 1)
+        # Batches are numbered when submitted, and settled (acknowledged/rejected) in the same order, so an ack
+        # with multiple=True never acknowledges a message of a batch that is still in flight
+        self.submitted_batches = 0
+        self.settled_batches = 0
+        self.completed_batches: dict[int, tuple[list, list, int | None]] = {}
+
+        self.claim_check_store = claim_check_store
+        self.claim_check_retention = claim_check_retention
+        self.last_claim_check_cleanup: float | None = None
+
+        self.fingerprint_store = fingerprint_store
+
+    def get_document_chunks(self, message: dict) -> tuple[int, Iterable[bytes]]:
+        """Return the size and the serialized document. If the message is a claim-check reference, the document is
+        read from the store, otherwise the message is the document.
+        :param message: The document or the reference {id, path, size, checksum} to the document
+        :raises ValueError: If the message is a reference and the claim-check store is not defined
+        """
+        if ClaimCheckStore.is_reference(message):
+            if self.claim_check_store is None:
+                raise ValueError(f"Document {message['id']} is a claim-check reference, but the indexer does not "
+                                 f"have a claim-check store (--claim_check_path)")
+            return message["size"], self.claim_check_store.read_chunks(message)
+        body = orjson.dumps(message)
+        return len(body), (body,)
 
     def requeue_failed_messages(self, messages: list[dict]=None, delivery_tags: list[int]=None, error: Exception = None,
                                 channel=None) -> None:
@@ -42,46 +104,243 @@ class DocumentIndexerQueueService(QueueMultipleConsumer):
             logger.error(f"Failed process=indexing error_detail={error_info}")
             self.reject_message(channel, delivery_tag)
 
-    def process_batch(self, batch: list, delivery_tags: list) -> bool:
-        """Process a batch of messages from the queue.
-        If the indexing process is successful, acknowledge all the messages in the batch.
-        If the indexing process fails, requeue all the failed messages to the Dead Letter Queue.
-        The error on this service is because Solr is not available.
+    @staticmethod
+    def is_atomic_update(message: dict) -> bool:
+        """Check if the message is an atomic update of the fields of a document (e.g. the metadata-only updates of
+        the document generator) instead of a full document"""
+        return any(isinstance(value, dict) and value and value.keys() <= ATOMIC_UPDATE_OPERATIONS
+                   for value in message.values())
 
-        :param batch: List of messages to process
-        :param delivery_tags: List of delivery tags to acknowledge
+    def index_messages(self, messages: list[dict]) -> None:
+        """Index the documents of the messages in Solr. The atomic updates are sent in a separate request to the
+        update handler.
+        :param messages: List of documents, claim-check references or atomic updates
+        :raises Exception: If Solr rejects the request or the documents could not be read
         """
-        # TODO - Implement the process to validate if the message is well formatted to index in Solr.
-        # When the validation is in place, instead of sending all the messages to the dead letter queue,
-        # we should add the logic to just sent the message that are not well formatted to the dead letter queue.
-        start_time = time.time()
-
-        try:
-            response = self.solr_api_full_text.index_documents(batch)
-            logger.info(
-                f"Success process=indexing {len(batch)} items."
-                f"Operation status: {response.status_code} Time={time.time() - start_time:.10f} ")
+        documents = []
+        atomic_updates = []
+        for message in messages:
+            (atomic_updates if self.is_atomic_update(message) else documents).append(message)
 
+        if documents:
+            response = self.solr_api_full_text.index_serialized_documents(
+                self.get_document_chunks(message) for message in documents
+            )
             response.raise_for_status()
+        if atomic_updates:
+            response = self.solr_api_full_text.index_serialized_documents(
+                (self.get_document_chunks(message) for message in atomic_updates), SOLR_ATOMIC_UPDATE_HANDLER
+            )
+            response.raise_for_status()
+
+    @staticmethod
+    def is_document_error(error: Exception) -> bool:
+        """Check if the error could be caused by some documents of the batch, e.g. Solr answers 400 to a malformed
+        document or a stored document does not exist. Otherwise, the error (e.g. Solr is not available)
+        fails all the documents, and it is not worth splitting the batch.
+        """
+        if isinstance(error, requests.exceptions.HTTPError):
+            status_code = error.response.status_code if error.response is not None else None
+            return status_code is not None and 400 <= status_code < 500 and status_code != 429
+        return not isinstance(error, requests.exceptions.RequestException)
 
-            # Acknowledge all messages in batch
-            for delivery_tag in delivery_tags:
-                self.positive_acknowledge(self.channel, delivery_tag)
+    def bisect_batch(self, items: list[tuple[dict, int]],
+                     error: Exception) -> tuple[list[tuple[dict, int]], list[tuple[dict, int, Exception]], int]:
+        """Split a failed batch in halves and index them again, recursively, until the documents that
+        Solr rejects are isolated. So, only the failed documents are sent to the Dead Letter Queue.
+        :param items: List of (message, delivery_tag) of the failed batch
+        :param error: The error of the failed batch
+        :return: The list of indexed (message, delivery_tag), the list of failed (message, delivery_tag, error)
+        and the number of requests sent to Solr
+        """
+        if len(items) == 1 or not self.is_document_error(error):
+            return [], [(message, delivery_tag, error) for message, delivery_tag in items], 0
 
+        indexed_items = []
+        failed_items = []
+        bisection_requests = 0
+        middle = len(items) // 2
+        for half_items in (items[:middle], items[middle:]):
+            bisection_requests += 1
+            try:
+                self.index_messages([message for message, _ in half_items])
+                indexed_items.extend(half_items)
+            except Exception as e:
+                half_indexed_items, half_failed_items, half_requests = self.bisect_batch(half_items, e)
+                indexed_items.extend(half_indexed_items)
+                failed_items.extend(half_failed_items)
+                bisection_requests += half_requests
+        return indexed_items, failed_items, bisection_requests
+
+    def index_batch(self, items: list[tuple[dict, int]]) -> tuple[list, list, int | None]:
+        """Index a batch of messages. If Solr rejects the batch because of some documents, the batch is split in
+        halves recursively (see bisect_batch) to isolate the failed documents. If Solr is not available, all the
+        messages fail. This method runs in the worker threads, so it does not use the channel.
+        :param items: List of (message, delivery_tag) of the batch
+        :return: The list of indexed (message, delivery_tag), the list of failed (message, delivery_tag, error) and
+        the number of extra requests sent to Solr to isolate the failed documents (None if the batch did not fail)
+        """
+        start_time = time.time()
+        try:
+            self.index_messages([message for message, _ in items])
+            logger.info(f"Success process=indexing {len(items)} items. Time={time.time() - start_time:.10f}")
+            return items, [], None
         except Exception as e:
             logger.info(f"Failed process=indexing with error={e}")
-            failed_messages = batch #self.batch
-            failed_messages_tags = delivery_tags.copy()
-            # Requeue the full list of failed messages to the Dead Letter Queue
-            self.requeue_failed_messages(failed_messages, failed_messages_tags, e, self.channel)
+            indexed_items, failed_items, bisection_requests = self.bisect_batch(items, e)
+            logger.info(f"Bisection process=indexing batch_size={len(items)} indexed={len(indexed_items)} "
+                        f"failed={len(failed_items)} extra_requests={bisection_requests} "
+                        f"Time={time.time() - start_time:.10f}")
+            return indexed_items, failed_items, bisection_requests
+
+    def settle_batch(self, indexed_items: list[tuple[dict, int]], failed_items: list[tuple[dict, int, Exception]],
+                     bisection_requests: int | None = None) -> None:
+        """Acknowledge the indexed messages and requeue the failed ones to the Dead Letter Queue.
+        It must run in the thread of the connection to the queue.
+        :param indexed_items: List of indexed (message, delivery_tag)
+        :param failed_items: List of failed (message, delivery_tag, error)
+        :param bisection_requests: Number of extra requests sent to Solr to isolate the failed documents, None if
+        the batch did not fail
+        """
+        if bisection_requests is not None:
+            self.indexing_metrics["failed_batches"] += 1
+            self.indexing_metrics["bisection_requests"] += bisection_requests
+            self.indexing_metrics["failed_documents"] += len(failed_items)
+            logger.info(f"Indexing metrics={self.indexing_metrics}")
+
+        self.update_fingerprints(indexed_items, failed_items)
+
+        # Requeue the failed messages to the Dead Letter Queue
+        for message, delivery_tag, error in failed_items:
+            self.requeue_failed_messages([message], [delivery_tag], error, self.channel)
+
+        # Acknowledge the indexed messages with a single ack. The failed messages are already rejected, so all the
+        # unacknowledged messages up to the last delivery tag were indexed
+        if indexed_items:
+            self.positive_acknowledge(self.channel, max(delivery_tag for _, delivery_tag in indexed_items),
+                                      multiple=True)
+        # The documents of the failed messages are kept, so the messages can be requeued from the Dead Letter Queue
+        for message, _ in indexed_items:
+            if self.claim_check_store and ClaimCheckStore.is_reference(message):
+                self.claim_check_store.remove(message)
+        self.remove_expired_documents()
+
+    def update_fingerprints(self, indexed_items: list[tuple[dict, int]],
+                            failed_items: list[tuple[dict, int, Exception]]) -> None:
+        """Confirm the fingerprints of the documents indexed in Solr and remove the fingerprints of the failed ones,
+        so the document generator only skips the items whose last document was indexed, and the documents requeued
+        from the Dead Letter Queue are generated again. The atomic updates do not confirm any fingerprint.
+        :param indexed_items: List of indexed (message, delivery_tag)
+        :param failed_items: List of failed (message, delivery_tag, error)
+        """
+        if self.fingerprint_store is None:
+            return
+        try:
+            self.fingerprint_store.remove([message.get("id") for message, _, _ in failed_items])
+            self.fingerprint_store.confirm_fingerprints([message.get("id") for message, _ in indexed_items
+                                                         if not self.is_atomic_update(message)])
+        except Exception as e:
+            logger.error(f"Failed process=fingerprint_update with error={e}")
+
+    def remove_expired_documents(self) -> None:
+        """Delete the expired documents of the claim-check store, at most once every CLAIM_CHECK_CLEANUP_INTERVAL
+        seconds (see ClaimCheckStore.remove_expired)"""
+        if self.claim_check_store is None or not self.claim_check_retention:
+            return
+        if (self.last_claim_check_cleanup is not None and
+                time.monotonic() - self.last_claim_check_cleanup < CLAIM_CHECK_CLEANUP_INTERVAL):
+            return
+        self.last_claim_check_cleanup = time.monotonic()
+        try:
+            self.claim_check_store.remove_expired(self.claim_check_retention)
+        except Exception as e:
+            logger.error(f"Failed process=claim_check_cleanup with error={e}")
+
+    def process_batch(self, batch: list, delivery_tags: list) -> bool:
+        """Process a batch of messages from the queue.
+        The indexed messages are acknowledged and the failed ones are requeued to the Dead Letter Queue
+        (see index_batch). The messages with a claim-check reference are resolved and streamed from the store into
+        the Solr request, and the stored documents are deleted once they are indexed.
+        If in_flight_batches is greater than 1, the batch is indexed by a worker thread and this method returns
+        without waiting for Solr.
+
+        :param batch: List of messages to process
+        :param delivery_tags: List of delivery tags to acknowledge
+        """
+        items = list(zip(batch, delivery_tags, strict=False))
+
+        if self.indexing_executor:
+            self.submit_batch(items)
+        else:
+            self.settle_batch(*self.index_batch(items))
 
         batch.clear()
         delivery_tags.clear()
         return True
 
-def start_service(solr_api_full_text: HTSolrAPI, queue_params: QueueParams) -> None:
-    document_indexer_queue_service = DocumentIndexerQueueService(solr_api_full_text, queue_params)
+    def submit_batch(self, items: list[tuple[dict, int]]) -> None:
+        """Send the batch to a worker thread to index it.
+        If there are in_flight_batches batches being indexed, wait until one of them is settled. While waiting,
+        the connection processes the events of the broker and the acks of the finished batches.
+        The worker threads cannot use the channel (pika is not thread safe), so the batch is settled in the
+        connection thread using add_callback_threadsafe.
+        """
+        while self.submitted_batches - self.settled_batches >= self.in_flight_batches:
+            self.channel.connection.process_data_events(time_limit=0.1)
+
+        sequence = self.submitted_batches
+        self.submitted_batches += 1
+        connection = self.channel.connection
+        future = self.indexing_executor.submit(self.index_batch, items)
+        future.add_done_callback(
+            lambda done_future: connection.add_callback_threadsafe(
+                partial(self.complete_batch, sequence, items, done_future)
+            )
+        )
+
+    def complete_batch(self, sequence: int, items: list[tuple[dict, int]], future: Future) -> None:
+        """Settle the indexed batches in the order they were submitted. It runs in the connection thread."""
+        try:
+            self.completed_batches[sequence] = future.result()
+        except Exception as e:
+            logger.error(f"Failed process=indexing with error={e}")
+            self.completed_batches[sequence] = ([], [(message, delivery_tag, e) for message, delivery_tag in items], 0)
+
+        while self.settled_batches in self.completed_batches:
+            result = self.completed_batches.pop(self.settled_batches)
+            self.settled_batches += 1
+            self.settle_batch(*result)
+
+    def wait_in_flight_batches(self) -> None:
+        """Wait until all the submitted batches are indexed and settled."""
+        while self.submitted_batches > self.settled_batches and self.channel.is_open:
+            self.channel.connection.process_data_events(time_limit=0.1)
+
+    def start_consuming(self) -> None:
+        """Start consuming messages from the queue, and commit the indexed documents when the service stops."""
+        try:
+            super().start_consuming()
+        finally:
+            try:
+                if self.indexing_executor:
+                    self.wait_in_flight_batches()
+                    self.indexing_executor.shutdown()
+                self.solr_api_full_text.commit_pending_documents()
+            except Exception as e:
+                logger.error(f"Failed process=commit with error={e}")
+
+def start_service(solr_api_full_text: HTSolrAPI, queue_params: QueueParams, in_flight_batches: int = 1,
+                  claim_check_store: ClaimCheckStore | None = None, claim_check_retention: float | None = None,
+                  fingerprint_store: FingerprintStore | None = None) -> None:
+    document_indexer_queue_service = DocumentIndexerQueueService(solr_api_full_text, queue_params,
+                                                                 in_flight_batches=in_flight_batches,
+                                                                 claim_check_store=claim_check_store,
+                                                                 claim_check_retention=claim_check_retention,
+                                                                 fingerprint_store=fingerprint_store)
     logger.info(f"Starting Document Indexer Service with queue: {queue_params.queue_name}")
+    # When Kubernetes stops the pod, stop consuming after the current batch, so the in-flight batches are settled
+    # and the indexed documents are committed (see DocumentIndexerQueueService.start_consuming)
+    signal.signal(signal.SIGTERM, lambda signum, frame: document_indexer_queue_service.request_stop())
     # Start consuming messages from the queue
     document_indexer_queue_service.start_consuming()
 
@@ -90,7 +349,11 @@ def main():
 
     init_args_obj = IndexerServiceArguments(parser)
 
-    start_service(init_args_obj.solr_api_full_text, init_args_obj.queue_config.queue_params)
+    start_service(init_args_obj.solr_api_full_text, init_args_obj.queue_config.queue_params,
+                  in_flight_batches=init_args_obj.in_flight_batches,
+                  claim_check_store=init_args_obj.claim_check_store,
+                  claim_check_retention=init_args_obj.claim_check_retention,
+                  fingerprint_store=init_args_obj.fingerprint_store)
 
 if __name__ == "__main__":
     main()
@@ -2,15 +2,23 @@ import os
 import sys
 
 from config import config_queue_file_path
-from ht_indexer_api.ht_indexer_api import HTSolrAPI
+from ht_indexer_api.ht_indexer_api import COMMIT_POLICIES, NO_COMMIT, HTSolrAPI
+from ht_indexer_monitoring.fingerprint_store import FingerprintStore
+from ht_queue_service.claim_check_store import ClaimCheckStore
 from ht_queue_service.queue_config import QueueConfig
 from ht_utils.ht_logger import get_ht_logger
+from ht_utils.ht_mysql import get_mysql_conn
 from ht_utils.ht_utils import get_general_error_message
 
 from . import indexer_config_file_path
 
 logger = get_ht_logger(name=__name__)
 
+# Maximum size of the body of an update request sent to Solr. A batch bigger than it is split in several requests
+MAX_BYTES_PER_REQUEST = 32 * 1024 * 1024
+# Days the documents of the claim-check store are kept. It must be longer than the messages stay in the queues
+CLAIM_CHECK_RETENTION_DAYS = 14
+
 
 class IndexerServiceArguments:
 
@@ -35,14 +43,95 @@ class IndexerServiceArguments:
             help="Integer that represents the number of documents to process in a batch."
         )
 
+        parser.add_argument(
+            "--max_bytes_per_request",
+            type=int,
+            default=MAX_BYTES_PER_REQUEST,
+            help="Maximum size in bytes of each request to index documents in Solr. A batch of documents bigger "
+                 "than it is split in several requests. Use 0 to send each batch in one request."
+        )
+
+        parser.add_argument(
+            "--commit_policy",
+            choices=COMMIT_POLICIES,
+            default=NO_COMMIT,
+            help="How the indexed documents are committed: none (Solr autoCommit configuration), commit_within "
+                 "(--commit_within_ms), soft_commit (each request) or hard_commit (every --commit_every_documents). "
+                 "In all the cases, a hard commit is sent when the service stops."
+        )
+
+        parser.add_argument(
+            "--commit_within_ms",
+            type=int,
+            default=60000,
+            help="Maximum time in milliseconds to commit the documents with the commit_within policy."
+        )
+
+        parser.add_argument(
+            "--commit_every_documents",
+            type=int,
+            default=10000,
+            help="Number of documents indexed between hard commits with the hard_commit policy."
+        )
+
+        parser.add_argument(
+            "--in_flight_batches",
+            type=int,
+            default=2,
+            help="Number of batches indexed at the same time by worker threads, while the next batches are "
+                 "consumed from the queue. Use 1 to index one batch at a time."
+        )
+
+        parser.add_argument(
+            "--claim_check_path",
+            help="Path of the folder shared with the document generator where the documents are stored "
+                 "(claim-check mode). It is required to index the claim-check references. The documents older "
+                 "than --claim_check_retention_days, e.g. the documents of the messages in the Dead Letter Queue, "
+                 "are deleted.",
+            required=False,
+            default=None
+        )
+
+        parser.add_argument(
+            "--claim_check_retention_days",
+            type=float,
+            default=CLAIM_CHECK_RETENTION_DAYS,
+            help="Days the documents of the claim-check store are kept. The messages in the Dead Letter Queue "
+                 "must be requeued before their documents are deleted."
+        )
+
+        parser.add_argument(
+            "--skip_unchanged",
+            action='store_true',
+            help="Confirm the fingerprints of the indexed documents in the fulltext_item_fingerprint table. Use it "
+                 "when the document generator runs with --skip_unchanged."
+        )
+
         self.args = parser.parse_args()
 
+        self.claim_check_store: ClaimCheckStore | None = None
+        if self.args.claim_check_path:
+            self.claim_check_store = ClaimCheckStore(self.args.claim_check_path)
+        self.claim_check_retention: float = self.args.claim_check_retention_days * 24 * 3600
+
+        self.in_flight_batches: int = max(self.args.in_flight_batches, 1)
+
+        # Fingerprints of the inputs of the documents published by the document generator
+        self.fingerprint_store: FingerprintStore | None = None
+        if self.args.skip_unchanged:
+            self.fingerprint_store = FingerprintStore(get_mysql_conn())
+            self.fingerprint_store.create_table()
+
         solr_user = os.getenv("SOLR_USER")
         solr_password = os.getenv("SOLR_PASSWORD")
 
         self.solr_api_full_text = HTSolrAPI(url=self.args.solr_indexing_api,
                                             user=solr_user,
-                                            password=solr_password)
+                                            password=solr_password,
+                                            max_bytes_per_request=self.args.max_bytes_per_request,
+                                            commit_policy=self.args.commit_policy,
+                                            commit_within_ms=self.args.commit_within_ms,
+                                            commit_every_documents=self.args.commit_every_documents)
 
         self.document_local_path = self.args.document_local_path
 
@@ -9,24 +9,27 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 from catalog_metadata.catalog_metadata import CatalogItemMetadata, CatalogRecordMetadata
-from document_retriever_service.retriever_arguments import RetrieverServiceArguments
+from document_retriever_service.retriever_arguments import (
+    TOTAL_MYSQL_ROWS,
+    RetrieverServiceArguments,
+)
 from document_retriever_service.retriever_services_utils import RetrieverServicesUtils
 from ht_indexer_api.ht_indexer_api import HTSolrAPI
 from ht_indexer_monitoring.ht_indexer_tracktable import (
     HT_INDEXER_TRACKTABLE,
     PROCESSING_STATUS_TABLE_NAME,
+    HTIndexerTracktable,
 )
 from ht_queue_service.queue_config import QueueParams
-from ht_queue_service.queue_connection import MAX_DOCUMENT_IN_QUEUE
+from ht_queue_service.queue_flow_controller import QueueFlowController
 from ht_queue_service.queue_producer import QueueProducer
 from ht_utils.ht_logger import get_ht_logger
 from ht_utils.ht_utils import (
     get_current_time,
     get_error_message_by_document,
     get_general_error_message,
-    split_into_batches,
 )
-from ht_utils.query_maker import make_solr_term_query
+from ht_utils.query_maker import make_solr_term_query, split_terms_by_size
 
 logger = get_ht_logger(name=__name__)
 
@@ -34,14 +37,14 @@ current = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()
 parent = os.path.dirname(current)
 sys.path.insert(0, parent)
 
-WAITING_TIME_QUEUE_PRODUCER = 180 # Wait 3 minutes to send documents in the queue
-WAITING_TIME_MYSQL = 60 # Wait 1 minute to query MySQL checking if there are documents to process (retriever_status = pending)
-MYSQL_COLUMN_UPDATE = 'retriever_status'
-SUCCESS_UPDATE_STATUS = f"UPDATE {PROCESSING_STATUS_TABLE_NAME} SET status = :status, {MYSQL_COLUMN_UPDATE} = :retriever_status, processed_at = :processed_at WHERE ht_id = :ht_id"
-FAILURE_UPDATE_STATUS = f"UPDATE {PROCESSING_STATUS_TABLE_NAME} SET status = :status, {MYSQL_COLUMN_UPDATE} = :retriever_status, processed_at = :processed_at, error = :error WHERE ht_id = :ht_id"
+WAITING_TIME_MYSQL = 60 # Wait at most 1 minute to query MySQL checking if there are documents to process (retriever_status = pending)
 
-SOLR_BATCH_SIZE = 200 # The chunk size is 200, because Solr will fail with the status code 414. The chunk size was determined
-# by testing the Solr query with different values (e.g., 100-500 and with 200 ht_ids it worked.
+# Maximum size of the ids of each Solr lookup. The terms query is sent in the body of the request, so the size is not
+# limited by the URL, but by the size of the response: 32 KB are about 1500 ht_ids, and the same number of catalog
+# records with their MARC record
+SOLR_QUERY_MAX_BYTES = 32 * 1024
+# Minimum number of items worth fetching from MySQL (see QueueFlowController)
+MIN_RETRIEVER_CREDITS = 200
 
 # TODO: Apply the Strategy Pattern on this module to encapsulate the logic of extracting the documents by ht_id or
 #  record_id, it will reduce the if-else statements in the code
@@ -65,7 +68,8 @@ class FullTextSearchRetrieverQueueService:
                  solr_host: str = None,
                  solr_user: str = None,
                  solr_password: str = None,
-                 solr_retriever_query_params: dict = None
+                 solr_retriever_query_params: dict = None,
+                 flow_controller: QueueFlowController = None
                  ):
 
 
@@ -77,6 +81,9 @@ class FullTextSearchRetrieverQueueService:
         # Queue configuration
         self.queue_params = queue_params
 
+        # The published messages are reported to the flow controller to measure the queue (see main)
+        self.flow_controller = flow_controller
+
     @staticmethod
     def get_queue_producer(queue_params) -> QueueProducer | None:
 
@@ -92,82 +99,74 @@ class FullTextSearchRetrieverQueueService:
 
 
 
-    @staticmethod
-    def generate_metadata(record: CatalogItemMetadata) -> tuple[dict, str]:
-
-        """ Generate the metadata and the ht_id of the document to be published in the queue"""
-
-        item_id = record.ht_id
-        logger.info(f"Processing document {item_id}")
-
-        item_metadata = record.metadata
-        item_metadata['ht_id'] = item_id
-
-        return item_metadata, item_id
-
     @staticmethod
     def publishing_documents(queue_producer_conn, result, mysql_db) -> None:
+        """Publish the documents in the queue and update their status in MySQL.
+        Only the documents confirmed by the broker are marked as completed, the others are marked as failed.
+        :param queue_producer_conn: QueueProducer object
+        :param result: list of CatalogItemMetadata to publish
+        :param mysql_db: MySQL connection
+        """
 
-        processed_items = []
-        failed_items = []
-
-        for record in result:
-
-            item_metadata, item_id = FullTextSearchRetrieverQueueService.generate_metadata(record)
-            logger.info(f"Publishing document {item_id}")
-
-            # Try to publish the document in the queue, if an error occurs, log the error and continue to the next
-            try:
-                RetrieverServicesUtils.publish_document(queue_producer_conn, item_metadata)
-
-                processed_items.append(
-                    {
-                        "status": "processing",
-                        "retriever_status": "completed",
-                        "processed_at": get_current_time(),
-                        "ht_id": item_id
-                    }
-                )
-
-            except Exception as e:
-                error_info = get_error_message_by_document(
-                    "FullTextSearchRetrieverQueueService", e, item_metadata
-                )
+        confirmed_messages, failed_messages = RetrieverServicesUtils.publish_documents(queue_producer_conn, result)
+        # The same processed_at for all the items, so they are updated with one query by status (see
+        # HTIndexerTracktable.update_items_status)
+        processed_at = get_current_time()
+
+        processed_items = [
+            {
+                "status": "processing",
+                "retriever_status": "completed",
+                "processed_at": processed_at,
+                "ht_id": item_metadata.get("ht_id")
+            }
+            for item_metadata in confirmed_messages
+        ]
 
-                failed_items.append(
-                    {
-                        "status": "failed",
-                        "retriever_status": "failed",
-                        "processed_at": get_current_time(),
-                        "error": f"{error_info.get('service_name')}_{error_info.get('error_message')}",
-                        "ht_id": error_info.get("ht_id")
-                    }
-                )
-
-                logger.error(f"Error in publishing document {item_id} {error_info}")
-                continue
+        failed_items = []
+        for item_metadata, error in failed_messages:
+            error_info = get_error_message_by_document(
+                "FullTextSearchRetrieverQueueService", error, item_metadata
+            )
+
+            failed_items.append(
+                {
+                    "status": "failed",
+                    "retriever_status": "failed",
+                    "processed_at": processed_at,
+                    "error": f"{error_info.get('service_name')}_{error_info.get('error_message')}",
+                    "ht_id": error_info.get("ht_id")
+                }
+            )
+
+            logger.error(f"Error in publishing document {item_metadata.get('ht_id')} {error_info}")
 
         # Update the status of the items in MySQL table
+        tracktable = HTIndexerTracktable(mysql_db)
         if len(failed_items)>0:
-            mysql_db.update_status(FAILURE_UPDATE_STATUS, failed_items)
+            tracktable.update_items_status(failed_items)
 
         if len(processed_items)>0:
             logger.info(f"Total of processed documents: {len(processed_items)}")
-            mysql_db.update_status(SUCCESS_UPDATE_STATUS, processed_items)
+            tracktable.update_items_status(processed_items)
 
-    def retrieve_documents_from_solr(self, solr_query: str, solr_retriever) -> requests.Response:
+    def retrieve_documents_from_solr(self, solr_query: str, solr_retriever, rows: int | None = None) -> requests.Response:
 
-        """Function to retrieve documents from Solr
+        """Function to retrieve documents from Solr. The query is sent in the body of the request, so it could
+        include thousands of ids.
         :param solr_query:
         :param solr_retriever: HTSolrAPI object
+        :param rows: Number of documents to return, by default the rows of the retriever query parameters
         :return: response from Solr
         """
 
         chunk_solr_params = copy.deepcopy(self.solr_retriever_query_params)
 
         chunk_solr_params['fq'] = solr_query
+        if rows:
+            chunk_solr_params['rows'] = rows
 
-        response = solr_retriever.send_solr_request(
+        response = solr_retriever.send_solr_json_request(
             solr_host=f"{self.solr_host}/query",
             solr_params=chunk_solr_params
         )
@@ -177,29 +176,35 @@ class FullTextSearchRetrieverQueueService:
         return response
 
     @staticmethod
-    def generate_chunk_metadata(chunk: list, solr_output: dict, by_field: str = 'item') -> list[
-                                                                                               CatalogItemMetadata] | None:
-        """Generate the metadata for the documents
+    def generate_chunk_metadata(chunk: list, solr_output: dict, by_field: str = 'item',
+                                failed_ids: dict[str, list[str]] | None = None) -> list[CatalogItemMetadata] | None:
+        """Generate the metadata for the documents. If the metadata of a record cannot be generated (e.g. its MARC
+        record is malformed), the record is skipped and the rest of the records of the chunk are processed.
 
         :param chunk: list of documents to process
         :param solr_output: response from Solr
         :param by_field: field to search by (item=ht_id or record=id)
+        :param failed_ids: If defined, the ids of the chunk whose record failed are added to it, by error message
         :return: list of metadata for the documents
         """
 
+        # The requested ht_ids are looked up for each item of each record, a set is built once per chunk
+        requested_items = set(chunk)
         record_metadata_list = []
         for record in solr_output.get("response").get("docs"):
 
-            # Create the object to create items and metadata.
-            catalog_record_metadata = CatalogRecordMetadata(record)
-
             # If there is something with Solr retrieving a chunk of documents will try to retrieve the next chunk
             try:
+                # Create the object to create items and metadata. The allfields field of the record is created here
+                # and shared by all its items
+                catalog_record_metadata = CatalogRecordMetadata(record)
+
                 if by_field == 'item':
                     # Validate query field = ht_id, list_documents could contain 1 or more items, but they probably are from
                     # different records
                     # Process a specific item of a record
-                    results = RetrieverServicesUtils.create_catalog_object_by_item_id(chunk, record, catalog_record_metadata)
+                    results = RetrieverServicesUtils.create_catalog_object_by_item_id(requested_items, record,
+                                                                                     catalog_record_metadata)
                     # This is the most efficient way to retrieve the items from Catalog
                 else:
                     # Process all the items of a record
@@ -209,17 +214,39 @@ class FullTextSearchRetrieverQueueService:
             except Exception as e:
                 error_info = get_general_error_message("FullTextSearchRetrieverQueueService",
                                                                          e)
-                logger.error(f"Error in getting documents from Solr {error_info}")
+                logger.error(f"Error in getting documents from Solr record_id={record.get('id')} {error_info}")
+                if failed_ids is not None:
+                    if by_field == 'item':
+                        record_ids = [item_id for item_id in record.get("ht_id") or [] if item_id in requested_items]
+                    else:
+                        record_ids = [record.get("id")]
+                    failed_ids.setdefault(f"{error_info.get('service_name')}_{error_info.get('error_message')}",
+                                          []).extend(record_ids)
         return record_metadata_list
 
+    @staticmethod
+    def get_missing_ids(chunk: list, record_metadata_list: list[CatalogItemMetadata], by_field: str = 'item') -> list:
+        """Ids of the chunk without any item to publish, because their record is not in the catalog or the
+        metadata of the record could not be generated
+        :param chunk: ht_ids or record ids requested to Solr
+        :param record_metadata_list: metadata of the items generated for the chunk
+        :param by_field: field to search by (item=ht_id or record=id)
+        :return: list of ids of the chunk
+        """
+        if by_field == 'item':
+            generated_ids = {item.ht_id for item in record_metadata_list}
+        else:
+            generated_ids = {item.record_metadata.record.get("id") for item in record_metadata_list}
+        return [document_id for document_id in chunk if document_id not in generated_ids]
+
     def full_text_search_retriever_service(self, mysql_db, initial_documents, by_field: str = 'item') -> None:
         """
         This method is used to retrieve the documents from the Catalog and generate the full text search entry
         If the Solr is not available, an error will be raised, and the process will be stopped
 
         We run Solr queries in batch
-        Each batch will retrieve 200 documents because Solr will fail with the status code 414
-        if the URI is too Long.
+        Each batch retrieves the ids that fit in SOLR_QUERY_MAX_BYTES, the terms query is sent in the body of the
+        request, so it is not limited by the length of the URI.
         """
 
         # Create a connection to the queue to produce messages
@@ -227,30 +254,53 @@ class FullTextSearchRetrieverQueueService:
 
         solr_retriever = HTSolrAPI(self.solr_host, self.solr_user, self.solr_password)
 
-        # As we have a long list of ht_ids/ids, the recommendation is to split the list of documents into chunks
-        # and create query batch to avoid the Solr URI too long error.
-        # The chunk size is 200, because Solr will fail with the status code 414. The chunk size was determined
-        # by testing the Solr query with different values (e.g., 100-500 and with 200 ht_ids it worked.
-
-        # Create chunk of documents to process according to the Solr query batch size
-        for chunk in split_into_batches(initial_documents, SOLR_BATCH_SIZE):
+        # Create chunk of documents to process according to the size of the Solr query
+        for chunk in split_terms_by_size(initial_documents, SOLR_QUERY_MAX_BYTES):
 
             # Build the query to retrieve the total of documents to process
             query = make_solr_term_query(chunk, by_field)
 
-            # Retrieve the documents from Solr
-            response = self.retrieve_documents_from_solr(query, solr_retriever)
+            # Retrieve the documents from Solr. Each id matches at most one record
+            response = self.retrieve_documents_from_solr(query, solr_retriever, rows=len(chunk))
             output = json.loads(response.content.decode("utf-8"))
 
             # Generate the metadata for the documents
             start_time = time.time()
-            record_metadata_list = FullTextSearchRetrieverQueueService.generate_chunk_metadata(chunk, output, by_field)
-
-            logger.info(f"Metadata generator: Total items = {len(record_metadata_list)}.")
-            logger.info(f"Metadata generator: Total time = {time.time() - start_time}")
+            # ids of the records whose metadata could not be generated, by error message
+            failed_ids = {}
+            record_metadata_list = FullTextSearchRetrieverQueueService.generate_chunk_metadata(chunk, output, by_field,
+                                                                                                failed_ids)
+
+            elapsed_time = time.time() - start_time
+            logger.info(f"Time to generate process=chunk_metadata "
+                        f"total_records={len(output.get('response').get('docs'))} "
+                        f"total_items={len(record_metadata_list)} Time={elapsed_time:.10f} "
+                        f"items_per_second={len(record_metadata_list) / max(elapsed_time, 1e-9):.1f}")
+
+            # The items that cannot be published are failed, so they are not claimed again. If Solr is not
+            # available, the exception stops the process and the claimed items are released when the claim expires
+            # (see HTIndexerTracktable.release_expired_claims)
+            tracktable = HTIndexerTracktable(mysql_db)
+            for error, record_ids in failed_ids.items():
+                tracktable.fail_claimed_items(record_ids, error, by_field)
+            failed_record_ids = {record_id for record_ids in failed_ids.values() for record_id in record_ids}
+            missing_ids = [document_id for document_id in
+                           FullTextSearchRetrieverQueueService.get_missing_ids(chunk, record_metadata_list, by_field)
+                           if document_id not in failed_record_ids]
+            if missing_ids:
+                logger.error(f"Total of {by_field} ids not found in the catalog or without metadata "
+                             f"{len(missing_ids)}: {missing_ids[:10]}")
+                tracktable.fail_claimed_items(
+                    missing_ids, "FullTextSearchRetrieverQueueService_not found in the catalog or without metadata",
+                    by_field)
 
             # Publish the documents in the queue
+            published_messages = queue_producer.published_messages
+            published_bytes = queue_producer.published_bytes
             FullTextSearchRetrieverQueueService.publishing_documents(queue_producer, record_metadata_list, mysql_db)
+            if self.flow_controller:
+                self.flow_controller.record_published(queue_producer.published_messages - published_messages,
+                                                      queue_producer.published_bytes - published_bytes)
 
 def run_retriever_service_threads(mysql_db, list_documents, by_field, document_retriever_service, max_workers):
     """
@@ -345,23 +395,47 @@ def main():
             logger.error(f"{PROCESSING_STATUS_TABLE_NAME} does not exist")
             init_args_obj.db_conn.create_table(HT_INDEXER_TRACKTABLE)
 
-        # The process will run every 5 minutes to check if there are documents to process (retriever_status = pending)
+        # The flow controller checks the queue every few seconds and gives the number of items (credits) the
+        # retriever can fetch from MySQL, so the queue has enough messages for the consumers but it is not overloaded
+        queue_producer = document_retriever_service.get_queue_producer(init_args_obj.queue_config.queue_params)
+        if queue_producer is None:
+            logger.error("Error: the connection to the queue could not be established")
+            sys.exit(1)
+        flow_controller = QueueFlowController(queue_producer, max_credits=TOTAL_MYSQL_ROWS,
+                                              min_credits=MIN_RETRIEVER_CREDITS)
+        document_retriever_service.flow_controller = flow_controller
+
+        waiting_time_mysql = flow_controller.poll_interval
+        last_ht_id = ""
         while True:
-            total_time_waiting = 0
-            if total_time_waiting > 0:
-                logger.info(f"Process=retrieving: Waiting {total_time_waiting} until reduce the number of messages in the queue")
-            list_documents = init_args_obj.db_conn.query_mysql(init_args_obj.retriever_query, params={"status": "pending"})
+            # The claims of the items not published by a retriever that crashed or failed are released once per
+            # pass over the table
+            if not last_ht_id:
+                init_args_obj.tracktable.release_expired_claims()
+
+            credits = flow_controller.wait_for_credits()
+
+            # The pending items are claimed (retriever_status = processing), so several retrievers can run at the
+            # same time without processing the same items. The items are claimed in ht_id order after the last
+            # claimed one, and from the beginning of the table once the end is reached.
+            list_documents = init_args_obj.tracktable.claim_pending_items(credits, last_ht_id)
+            if len(list_documents) == 0 and last_ht_id:
+                last_ht_id = ""
+                continue
             if len(list_documents) == 0:
-                logger.info("No documents to process")
-                time.sleep(WAITING_TIME_MYSQL)
+                # Wait longer each time there are no documents to process, up to WAITING_TIME_MYSQL
+                logger.info(f"No documents to process. Waiting {waiting_time_mysql} seconds")
+                time.sleep(waiting_time_mysql)
+                waiting_time_mysql = min(waiting_time_mysql * 2, WAITING_TIME_MYSQL)
                 continue
-            else:
 
-                extract_ids = SOLR_ID_EXTRACTION_STRATEGIES.get(by_field)
-                if extract_ids is None:
-                    logger.error(f"Error: by_field {by_field} not supported")
-                    sys.exit(1)
-                list_ids = extract_ids(list_documents)
+            waiting_time_mysql = flow_controller.poll_interval
+            last_ht_id = list_documents[-1]["ht_id"]
+            extract_ids = SOLR_ID_EXTRACTION_STRATEGIES.get(by_field)
+            if extract_ids is None:
+                logger.error(f"Error: by_field {by_field} not supported")
+                sys.exit(1)
+            list_ids = extract_ids(list_documents)
             logger.info(f"Process=retrieving: Total of documents to process {len(list_ids)}")
 
             if init_args_obj.parallelize:
@@ -378,24 +452,10 @@ def main():
 
                 document_retriever_service.full_text_search_retriever_service(
                     init_args_obj.db_conn,
-                    list_documents,
+                    list_ids,
                     by_field
                 )
 
 
-            # Checking the number of messages in the queue
-            # Create a connection to the queue to produce messages
-            queue_producer = document_retriever_service.get_queue_producer(init_args_obj.queue_config.queue_params)
-
-            total_messages_in_queue = queue_producer.queue_manager.get_total_messages(queue_producer.channel)
-
-            while total_messages_in_queue > MAX_DOCUMENT_IN_QUEUE:
-                logger.info (f"Waiting: There are {total_messages_in_queue} or more documents in the {queue_producer.queue_manager.queue_name}")
-                time.sleep(WAITING_TIME_QUEUE_PRODUCER) # Wait 5 minutes to send documents in the queue
-                total_messages_in_queue = queue_producer.queue_manager.get_total_messages(queue_producer.channel)
-                total_time_waiting += WAITING_TIME_QUEUE_PRODUCER
-            queue_producer.channel.close()
-
-
 if __name__ == "__main__":
     main()
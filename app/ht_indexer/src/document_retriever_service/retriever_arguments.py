@@ -3,8 +3,9 @@ import multiprocessing
 import os
 import sys
 
+from catalog_metadata.ht_indexer_config import SOLR_CATALOG_FIELDS
 from config import config_queue_file_path
-from ht_indexer_monitoring.ht_indexer_tracktable import PROCESSING_STATUS_TABLE_NAME
+from ht_indexer_monitoring.ht_indexer_tracktable import HTIndexerTracktable
 from ht_queue_service.queue_config import QueueConfig
 from ht_utils.ht_logger import get_ht_logger
 from ht_utils.ht_mysql import get_mysql_conn
@@ -75,8 +76,8 @@ class RetrieverServiceArguments:
         self.list_documents = self.args.list_documents
         self.query_field = self.args.query_field
 
-        # Retriever 24k items from the database
-        self.retriever_query = f"SELECT ht_id, record_id FROM {PROCESSING_STATUS_TABLE_NAME} WHERE retriever_status = :status LIMIT {TOTAL_MYSQL_ROWS}"
+        # Claim at most 24k pending items from the database, the limit is given by the flow controller
+        self.tracktable = HTIndexerTracktable(self.db_conn)
 
         # TODO Remove the line below once SolrExporter been updated self.solr_url = f"{solr_url}/query"
 
@@ -87,7 +88,9 @@ class RetrieverServiceArguments:
         self.solr_retriever_query_params = {
         'q': '*:*',
         'rows': SOLR_TOTAL_ROWS,
-        'wt': 'json'
+        'wt': 'json',
+        # Only the fields used to create the metadata of the items are retrieved
+        'fl': ",".join(SOLR_CATALOG_FIELDS)
     }
 
 
@@ -1,4 +1,4 @@
-import json
+from collections.abc import Collection
 
 from catalog_metadata.catalog_metadata import CatalogItemMetadata, CatalogRecordMetadata
 from ht_queue_service.queue_producer import QueueProducer
@@ -11,18 +11,21 @@ class RetrieverServicesUtils:
     """
 
     @staticmethod
-    def publish_document(queue_producer_conn: QueueProducer, content: dict = None):
+    def publish_documents(queue_producer_conn: QueueProducer, records: list[CatalogItemMetadata]) \
+            -> tuple[list[dict], list[tuple[dict, Exception]]]:
         """
-        Publish the document in a queue
+        Publish the metadata of a chunk of items in the queue in one call.
+        Each message is serialized once by the producer, and only the messages confirmed by the broker are
+        returned as published.
         :param queue_producer_conn: QueueProducer object
-        :param content: dict with the content of the message
+        :param records: list of CatalogItemMetadata to publish
+        :return: The list of confirmed messages, and the list of (message, error) of the failed messages
         """
-        message = content
-        entry_data = json.dumps(message)
-        entry_size = len(entry_data.encode('utf-8'))  # Convert to bytes and get length
-        logger.info(f"Sending message with id {content.get('ht_id')} and Size={entry_size} "
-                    f"bytes to queue {queue_producer_conn.queue_manager.queue_name}")
-        queue_producer_conn.publish_messages(message)
+        # The metadata of the items is not modified, each message is a copy with the ht_id of the item
+        messages = [{**record.metadata, "ht_id": record.ht_id} for record in records]
+
+        logger.info(f"Sending total_messages={len(messages)} to queue {queue_producer_conn.queue_manager.queue_name}")
+        return queue_producer_conn.publish_many(messages)
 
     @staticmethod
     def get_catalog_object(item_id: str,
@@ -70,13 +73,14 @@ class RetrieverServicesUtils:
         return results
 
     @staticmethod
-    def create_catalog_object_by_item_id(list_documents: list, record: dict,
+    def create_catalog_object_by_item_id(list_documents: Collection[str], record: dict,
                                          catalog_record_metadata: CatalogRecordMetadata) \
             -> list[CatalogItemMetadata]:
         """Receive a list of documents and a catalog record;
         Search for the item (ht_id) in the list and then;
         Create the CatalogMetadata object for each document in the list
-        :param list_documents: list of ht_id
+        :param list_documents: ht_ids to process. The membership of each item of the record is checked, so pass
+        a set when the same ht_ids are used for several records (see generate_chunk_metadata)
         :param record: dict with catalog record (retrieve from Solr)
         :param catalog_record_metadata: CatalogRecordMetadata object
         """
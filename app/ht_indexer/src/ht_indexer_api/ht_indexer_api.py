@@ -1,49 +1,196 @@
+import threading
+from collections.abc import Generator, Iterable
 from pathlib import Path
 
 import orjson
 import requests
 from ht_utils.ht_logger import get_ht_logger
+from ht_utils.solr_client import get_solr_client
 from requests.auth import HTTPBasicAuth
 
 logger = get_ht_logger(name=__name__)
 
+# Commit policies of the update requests.
+# none: The documents are not committed by the requests, Solr commits them following its autoCommit configuration
+# commit_within: Solr commits the documents in less than commit_within_ms milliseconds
+# soft_commit: Each request opens a new searcher, the documents are visible but not durable until a hard commit
+# hard_commit: A hard commit is sent every commit_every_documents documents
+NO_COMMIT = "none"
+COMMIT_WITHIN = "commit_within"
+SOFT_COMMIT = "soft_commit"
+HARD_COMMIT = "hard_commit"
+COMMIT_POLICIES = (NO_COMMIT, COMMIT_WITHIN, SOFT_COMMIT, HARD_COMMIT)
+
+
+def split_documents_by_size(documents: Iterable[tuple[int, Iterable[bytes]]],
+                            max_bytes: int) -> Generator[list[tuple[int, Iterable[bytes]]], None, None]:
+    """
+    Group the serialized documents in lists of at most max_bytes bytes, counting the brackets and
+    the commas of the JSON array. A document bigger than max_bytes is returned in a list alone.
+    :param documents: Iterable of documents, each document is a tuple (size, iterable of chunks of bytes)
+    :param max_bytes: Maximum size of the JSON array of each group
+    """
+    group = []
+    group_size = 2  # []
+    for size, document in documents:
+        if group and group_size + size + 1 > max_bytes:
+            yield group
+            group = []
+            group_size = 2
+        group_size += size + (1 if group else 0)
+        group.append((size, document))
+    if group:
+        yield group
+
 
 class HTSolrAPI:
-    def __init__(self, url, user=None, password=None):
+    def __init__(self, url, user=None, password=None, max_bytes_per_request: int | None = None,
+                 commit_policy: str = NO_COMMIT, commit_within_ms: int = 60000, commit_every_documents: int = 10000):
+        """
+        :param url: Solr url
+        :param user: Solr user
+        :param password: Solr password
+        :param max_bytes_per_request: Maximum size of the body of an update request. A batch of documents bigger
+        than it is split in several requests. By default, the batch is sent in one request.
+        :param commit_policy: How the indexed documents are committed, one of COMMIT_POLICIES
+        :param commit_within_ms: Maximum time to commit the documents with the commit_within policy
+        :param commit_every_documents: Number of documents indexed between hard commits with the hard_commit policy
+        """
+        if commit_policy not in COMMIT_POLICIES:
+            raise ValueError(f"Commit policy {commit_policy} not supported. Use one of {COMMIT_POLICIES}")
         self.url = url
         self.auth = HTTPBasicAuth(user, password) if user and password else None
+        self.max_bytes_per_request = max_bytes_per_request
+        self.commit_policy = commit_policy
+        self.commit_within_ms = commit_within_ms
+        self.commit_every_documents = commit_every_documents
+        # Documents indexed since the last hard commit. The indexer could send requests from several threads
+        self.uncommitted_documents = 0
+        self.commit_lock = threading.Lock()
+        # Connections are reused by all the requests to the Solr host
+        self.solr_client = get_solr_client(url)
 
     def get_solr_status(self):
-        response = requests.get(self.url)
+        response = self.solr_client.get(self.url)
         return response
 
+    def get_update_params(self) -> dict:
+        """Return the parameters of the update requests following the commit policy"""
+        if self.commit_policy == COMMIT_WITHIN:
+            return {"commitWithin": self.commit_within_ms}
+        if self.commit_policy == SOFT_COMMIT:
+            return {"softCommit": "true"}
+        return {}
+
+    def count_indexed_documents(self, total_documents: int) -> None:
+        """Count the indexed documents and send a hard commit every commit_every_documents documents
+        if the commit policy is hard_commit"""
+        with self.commit_lock:
+            self.uncommitted_documents += total_documents
+            if self.commit_policy != HARD_COMMIT or self.uncommitted_documents < self.commit_every_documents:
+                return
+            # The documents are already indexed, if the commit fails it is sent again with the next documents
+            try:
+                self.commit()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error in commit: {e}")
+
+    def commit(self):
+        """Send a hard commit to Solr, the indexed documents become durable and visible. The caller must hold
+        commit_lock, because it resets the counter of uncommitted documents"""
+        response = self.solr_client.post(
+            f"{self.url.replace('#/', '')}update",
+            headers={"Content-Type": "application/json"},
+            auth=self.auth,
+            params={"commit": "true"}
+        )
+        response.raise_for_status()
+        logger.info(f"Committed total_documents={self.uncommitted_documents} in Solr")
+        self.uncommitted_documents = 0
+        return response
+
+    def commit_pending_documents(self) -> None:
+        """Send a hard commit if there are documents indexed since the last hard commit, e.g. when the
+        indexer stops"""
+        with self.commit_lock:
+            if self.uncommitted_documents:
+                self.commit()
+
     def index_document(self, xml_data: dict, content_type: str = "application/json"):
         """Feed a JSON object, create an XML string to index the document into SOLR
         "Content-Type": "application/json"
         """
         try:
-            response = requests.post(
+            response = self.solr_client.post(
                 f"{self.url.replace('#/', '')}update/json/docs",
                 headers={"Content-Type": content_type},
                 json=xml_data,
                 auth=self.auth,
-                params={
-                    "commit": "true",
-                }, )
+                params=self.get_update_params())
             response.raise_for_status()
+            self.count_indexed_documents(1)
         except requests.exceptions.RequestException as e:
             logger.error(f"Error in indexing document: {e}")
             raise e
         return response
 
     def index_documents(self, list_documents: list = None, solr_url_json: str = 'update/json/docs'):
-        """Read an XML and feed into SOLR for indexing"""
-        response = requests.post(
+        """
+        Index a list of documents into Solr.
+        The documents are serialized one at a time while the request body is streamed, instead of serializing
+        the whole list at once. If max_bytes_per_request is defined, the list is split in several requests.
+        """
+        return self.index_serialized_documents(
+            ((len(body), (body,)) for body in map(orjson.dumps, list_documents)),
+            solr_url_json
+        )
+
+    def index_serialized_documents(self, documents: Iterable[tuple[int, Iterable[bytes]]],
+                                   solr_url_json: str = 'update/json/docs'):
+        """
+        Index a list of JSON documents already serialized, e.g. the documents stored in the claim-check store.
+        The documents are streamed in the body of the request (chunked transfer encoding) as a JSON array,
+        so they are not loaded in memory at once.
+        If max_bytes_per_request is defined, the documents are sent in several requests of at most
+        max_bytes_per_request bytes (a document bigger than the limit is sent alone). The process stops
+        at the first failed request.
+        :param documents: Iterable of documents, each document is a tuple (size, iterable of chunks of bytes)
+        :param solr_url_json: Solr update handler
+        :return: The response of the last request, or the response of the failed one
+        """
+        if not self.max_bytes_per_request:
+            return self.post_json_array(documents, solr_url_json)
+
+        response = None
+        for request_documents in split_documents_by_size(documents, self.max_bytes_per_request):
+            response = self.post_json_array(request_documents, solr_url_json)
+            if not response.ok:
+                break
+        return response
+
+    def post_json_array(self, documents: Iterable[tuple[int, Iterable[bytes]]], solr_url_json: str):
+        """Send the documents to Solr in a request streaming the JSON array [doc,doc,...]"""
+        total_documents = 0
+
+        def json_array() -> Generator[bytes, None, None]:
+            nonlocal total_documents
+            yield b"["
+            for position, (_, document) in enumerate(documents):
+                if position:
+                    yield b","
+                yield from document
+                total_documents += 1
+            yield b"]"
+
+        response = self.solr_client.post(
             f"{self.url.replace('#/', '')}{solr_url_json}",
             headers={"Content-Type": "application/json"},
             auth=self.auth,
-            data=orjson.dumps(list_documents)
+            params=self.get_update_params(),
+            data=json_array()
         )
+        if response.ok:
+            self.count_indexed_documents(total_documents)
         return response
 
     def index_documents_by_file(self, path: Path, list_documents: list = None, solr_url_json: str = 'update/json/docs'):
@@ -55,15 +202,15 @@ class HTSolrAPI:
             logger.info(f"Indexing {doc_path}")
             with open(doc_path, "rb") as xml_file:
                 data_dict = xml_file.read()
-                response = requests.post(
-                    f"{self.url.replace('#/', '')}{solr_url_json}?commit=true",
+                response = self.solr_client.post(
+                    f"{self.url.replace('#/', '')}{solr_url_json}",
                     headers={"Content-Type": "application/json"},
                     auth=self.auth,
                     data=data_dict,
-                    params={
-                        "commit": "true",
-                    },
+                    params=self.get_update_params(),
                 )
+                if response.ok:
+                    self.count_indexed_documents(1)
 
         return response
 
@@ -73,7 +220,7 @@ class HTSolrAPI:
         """
         # try ... except block to catch any exception raised by the Solr connection
         try:
-            response = requests.post(
+            response = self.solr_client.post(
                 f"{solr_host}",
                 params=solr_params,
                 auth=self.auth,
@@ -83,4 +230,22 @@ class HTSolrAPI:
             return response
         except requests.exceptions.RequestException as e:
             logger.info(f"Error {e} in query: {solr_params}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def send_solr_json_request(self, solr_host: str, solr_params: dict):
+        """
+        Send a request to Solr with the parameters in the JSON body of the request (JSON Request API), instead of
+        the URL. The size of the parameters, e.g. a terms query with thousands of ids, is not limited by the
+        length of the URL (Solr answers 414).
+        """
+        try:
+            response = self.solr_client.post(
+                f"{solr_host}",
+                json={"params": solr_params},
+                auth=self.auth,
+            )
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            logger.info(f"Error {e} in query with params: {list(solr_params)}")
+            raise e
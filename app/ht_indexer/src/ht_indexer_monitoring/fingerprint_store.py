@@ -0,0 +1,96 @@
+from ht_indexer_monitoring.ht_indexer_tracktable import HTIndexerTracktable
+from ht_utils.ht_logger import get_ht_logger
+from ht_utils.ht_mysql import HtMysql
+from ht_utils.ht_utils import split_into_batches
+
+logger = get_ht_logger(name=__name__)
+
+# MySQL table with the fingerprint of the inputs of the last document indexed for each item (fingerprint), and of
+# the last document published to the indexer, not indexed yet (pending_fingerprint)
+FINGERPRINT_TABLE_NAME = "fulltext_item_fingerprint"
+HT_INDEXER_FINGERPRINT_TABLE = f"""
+        CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE_NAME} (
+            ht_id VARCHAR(255) PRIMARY KEY,
+            fingerprint CHAR(64) NULL DEFAULT NULL,
+            pending_fingerprint CHAR(64) NULL DEFAULT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        );
+        """
+SAVE_PENDING_FINGERPRINT_STATEMENT = f"INSERT INTO {FINGERPRINT_TABLE_NAME} (ht_id, pending_fingerprint)"
+SAVE_PENDING_FINGERPRINT_COLUMNS = ["ht_id", "pending_fingerprint"]
+SAVE_PENDING_FINGERPRINT_ON_DUPLICATE = "ON DUPLICATE KEY UPDATE pending_fingerprint = VALUES(pending_fingerprint)"
+# The fingerprint of a document is confirmed when the indexer indexes it
+CONFIRM_FINGERPRINT_QUERY = (f"UPDATE {FINGERPRINT_TABLE_NAME} SET fingerprint = pending_fingerprint, "
+                             f"pending_fingerprint = NULL WHERE pending_fingerprint IS NOT NULL AND ht_id IN :keys")
+REMOVE_FINGERPRINT_QUERY = f"DELETE FROM {FINGERPRINT_TABLE_NAME} WHERE ht_id IN :keys"
+# The items skipped because they did not change are completed by all the services
+COMPLETED_STATUS = {"status": "completed", "generator_status": "completed", "indexer_status": "completed",
+                    "error": None}
+# Maximum number of ht_ids included in the IN (...) clause of a single query
+FINGERPRINT_QUERY_BATCH_SIZE = 500
+
+
+class FingerprintStore:
+    """
+    Store of the fingerprints of the inputs of the indexed documents (see document_generator.fingerprint).
+
+    Most of the reindex runs are triggered by changes in the metadata of a few items, so the generator checks the
+    fingerprint of an item before generating its document. If the inputs did not change since the last document
+    indexed in Solr, the message is acknowledged and the item is marked as completed in the tracktable without
+    reading the zip file again.
+
+    The generator saves the fingerprint as pending before publishing the document in the indexer queue. The indexer
+    confirms it once Solr accepts the document, and removes the fingerprint of the documents sent to the Dead Letter
+    Queue, so they are generated again when they are requeued.
+    """
+
+    def __init__(self, db_conn: HtMysql):
+        self.mysql_obj = db_conn
+        self.tracktable = HTIndexerTracktable(db_conn)
+
+    def create_table(self):
+        """Create the table of fingerprints if it does not exist"""
+        self.mysql_obj.create_table(HT_INDEXER_FINGERPRINT_TABLE)
+
+    def get_fingerprints(self, ht_ids: list[str]) -> dict[str, str]:
+        """
+        Get the confirmed fingerprints of a list of items.
+        :param ht_ids: List of ht_ids
+        :return: Dictionary {ht_id: fingerprint}, the items never indexed are not included
+        """
+        fingerprints = {}
+        for batch in split_into_batches(list(dict.fromkeys(ht_ids)), FINGERPRINT_QUERY_BATCH_SIZE):
+            params = {f"ht_id_{position}": ht_id for position, ht_id in enumerate(batch)}
+            query = (f"SELECT ht_id, fingerprint FROM {FINGERPRINT_TABLE_NAME} WHERE fingerprint IS NOT NULL "
+                     f"AND ht_id IN ({', '.join(f':{name}' for name in params)})")
+            for row in self.mysql_obj.query_mysql(query, params):
+                fingerprints[row.get("ht_id")] = row.get("fingerprint")
+        return fingerprints
+
+    def save_pending_fingerprints(self, fingerprints: dict[str, str]) -> None:
+        """Save the fingerprints of the documents published to the indexer {ht_id: fingerprint}. They are not used
+        to skip the items until the indexer confirms them (see confirm_fingerprints)"""
+        self.mysql_obj.insert_rows(SAVE_PENDING_FINGERPRINT_STATEMENT, SAVE_PENDING_FINGERPRINT_COLUMNS,
+                                   [{"ht_id": ht_id, "pending_fingerprint": fingerprint}
+                                    for ht_id, fingerprint in fingerprints.items()],
+                                   on_duplicate=SAVE_PENDING_FINGERPRINT_ON_DUPLICATE)
+
+    def update_by_ht_ids(self, query: str, ht_ids: list[str]) -> None:
+        """Run a query with an IN :keys clause for a list of items, in batches of FINGERPRINT_QUERY_BATCH_SIZE
+        ht_ids"""
+        batches = [{"keys": batch} for batch in split_into_batches(list(dict.fromkeys(ht_ids)),
+                                                                     FINGERPRINT_QUERY_BATCH_SIZE)]
+        if batches:
+            self.mysql_obj.update_by_keys(query, batches)
+
+    def confirm_fingerprints(self, ht_ids: list[str]) -> None:
+        """Confirm the pending fingerprints of the documents indexed in Solr"""
+        self.update_by_ht_ids(CONFIRM_FINGERPRINT_QUERY, ht_ids)
+
+    def remove(self, ht_ids: list[str]) -> None:
+        """Remove the fingerprints of a list of items, so their documents are generated again"""
+        self.update_by_ht_ids(REMOVE_FINGERPRINT_QUERY, ht_ids)
+
+    def mark_completed(self, ht_ids: list[str]) -> None:
+        """Mark in the tracktable the items skipped because their inputs did not change"""
+        self.tracktable.update_items_status([{"ht_id": ht_id, **COMPLETED_STATUS} for ht_id in dict.fromkeys(ht_ids)])
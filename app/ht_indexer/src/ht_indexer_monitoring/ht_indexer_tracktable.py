@@ -1,9 +1,12 @@
 import argparse
 import inspect
-import json
 import os
 import sys
+import threading
+import time
+from collections import defaultdict
 from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
@@ -22,10 +25,28 @@ logger = get_ht_logger(name=__name__)
 
 # MySQL table to track the status of the indexer
 PROCESSING_STATUS_TABLE_NAME = "fulltext_item_processing_status"
-MYSQL_INSERT_BATCH_SIZE = 500
+MYSQL_INSERT_BATCH_SIZE = 1000
+TRACKTABLE_INSERT_COLUMNS = ["ht_id", "record_id", "status", "retriever_status", "generator_status", "indexer_status",
+                             "error"]
+
+MYSQL_UPDATE_BATCH_SIZE = 1000
+
+# Indexes of the table. Each service filters the table by its status column, and the retriever claims the pending
+# items in ht_id order (see CLAIM_PENDING_ITEMS_QUERY)
+TRACKTABLE_INDEXES = {
+    "idx_retriever_status_ht_id": "(retriever_status, ht_id)",
+    "idx_generator_status_updated_at": "(generator_status, updated_at)",
+    "idx_indexer_status_updated_at": "(indexer_status, updated_at)",
+    "idx_status_updated_at": "(status, updated_at)",
+}
+
+TRACKTABLE_INDEXES_DEFINITION = ",\n            ".join(
+    f"INDEX {name} {columns}" for name, columns in TRACKTABLE_INDEXES.items()
+)
 
 HT_INDEXER_TRACKTABLE = f"""
         CREATE TABLE IF NOT EXISTS {PROCESSING_STATUS_TABLE_NAME} (
+            id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
             ht_id VARCHAR(255) UNIQUE NOT NULL,
             record_id VARCHAR(255) NOT NULL,
             status ENUM('pending', 'processing', 'failed', 'completed', 'requeued') NOT NULL DEFAULT 'Pending',
@@ -35,9 +56,68 @@ HT_INDEXER_TRACKTABLE = f"""
             error TEXT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            processed_at TIMESTAMP NULL DEFAULT NULL
+            processed_at TIMESTAMP NULL DEFAULT NULL,
+            claimed_at TIMESTAMP NULL DEFAULT NULL,
+            {TRACKTABLE_INDEXES_DEFINITION}
+        );
+        """
+
+# High-water mark of the incremental syncs of the table with the catalog (see sync_catalog_data)
+SYNC_STATE_TABLE_NAME = "fulltext_item_sync_state"
+HT_INDEXER_SYNC_STATE_TABLE = f"""
+        CREATE TABLE IF NOT EXISTS {SYNC_STATE_TABLE_NAME} (
+            sync_name VARCHAR(255) PRIMARY KEY,
+            high_water_mark VARCHAR(64) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
         );
         """
+# Catalog field with the time the record was indexed, used as high-water mark
+CATALOG_INDEX_TIME_FIELD = "time_of_index"
+# The records indexed in the catalog some minutes before the high-water mark are fetched again, because they could
+# be committed in Solr after the last sync
+SYNC_OVERLAP_MINUTES = 60
+# The items of the changed records are processed again
+RESET_ITEM_STATUS = ("ON DUPLICATE KEY UPDATE record_id = VALUES(record_id), status = VALUES(status), "
+                     "retriever_status = VALUES(retriever_status), generator_status = VALUES(generator_status), "
+                     "indexer_status = VALUES(indexer_status), error = NULL, claimed_at = NULL")
+
+# Columns and indexes of an existing table, to migrate the tables created before the surrogate key and the indexes
+TRACKTABLE_COLUMNS_QUERY = """
+        SELECT COLUMN_NAME AS column_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = :table_name
+        """
+TRACKTABLE_INDEXES_QUERY = """
+        SELECT DISTINCT INDEX_NAME AS index_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = :table_name
+        """
+
+# Claim the next pending items. The rows are read in ht_id order from the last claimed ht_id (keyset pagination),
+# and the rows locked by other processes are skipped, so several retrievers never claim the same items
+CLAIM_PENDING_ITEMS_QUERY = f"""
+        SELECT ht_id, record_id FROM {PROCESSING_STATUS_TABLE_NAME}
+        WHERE retriever_status = :status AND ht_id > :last_ht_id
+        ORDER BY ht_id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+        """
+CLAIM_ITEMS_UPDATE = (f"UPDATE {PROCESSING_STATUS_TABLE_NAME} SET retriever_status = :claimed_status, "
+                      f"claimed_at = CURRENT_TIMESTAMP WHERE ht_id IN :keys")
+# Seconds an item is claimed by a retriever. If the item is not completed or failed before (e.g. the retriever
+# crashed or Solr was not available), it is set as pending again (see release_expired_claims)
+CLAIM_LEASE_SECONDS = 3600
+# The items claimed before the claimed_at column was added do not have claimed_at, they are expired too
+RELEASE_EXPIRED_CLAIMS_QUERY = f"""
+        UPDATE {PROCESSING_STATUS_TABLE_NAME} SET retriever_status = 'pending', claimed_at = NULL
+        WHERE retriever_status = 'processing'
+        AND (claimed_at IS NULL OR claimed_at < NOW() - INTERVAL :lease_seconds SECOND)
+        """
+# The claimed items that cannot be published (e.g. their record is not in the catalog) are failed
+FAIL_CLAIMED_ITEMS_QUERY = """
+        UPDATE {table_name} SET status = 'failed', retriever_status = 'failed', error = :error,
+        processed_at = CURRENT_TIMESTAMP
+        WHERE retriever_status = 'processing' AND {column} IN :keys
+        """
+
 
 @dataclass
 class HTIndexerTrackData:
@@ -60,37 +140,236 @@ class HTIndexerTracktable:
         self.mysql_obj = db_conn
         self.solr_exporter = solr_exporter
 
+        # Items inserted by the cursors loading the catalog data (see load_catalog_data), and the last time of
+        # index of the loaded records (see sync_catalog_data)
+        self.loaded_items = 0
+        self.high_water_mark: str | None = None
+        self.loaded_items_lock = threading.Lock()
+
     def get_catalog_data(self, query: str,
                          query_config_file_path: Path,
                          conf_query: str,
-                         list_output_fields: list[str]) -> Generator[list[HTIndexerTrackData], Any, None]:
+                         list_output_fields: list[str],
+                         filter_query: str = None) -> Generator[list[HTIndexerTrackData], Any, None]:
         """
-        Get the data from the catalog.
-        :return: List of data
+        Get the data from the catalog, one list of items by page of the Solr cursor.
+        :param filter_query: Optional Solr filter query, e.g. a range of record ids
+        :return: Generator of lists of items
         """
 
         # '"good"'
-        data = []
-        for x in self.solr_exporter.run_cursor(query, query_config_file_path, conf_query=conf_query,
-                                          list_output_fields=list_output_fields):
-            dict_x = json.loads(x)
-            if "ht_id" in dict_x:
-                if dict_x["ht_id"] is not None:
-                    for ht_id in dict_x["ht_id"]:
-                        record = {
-                            "ht_id": ht_id,
-                            "record_id": dict_x["id"],
-                            "status": "pending"
-                        }
-                        data.append(HTIndexerTrackData(ht_id=record['ht_id'], record_id=record['record_id'],
-                                                       status=record['status']))
-
-            # Insert in MySQL a batch size of 500 records
-            if len(data) >= MYSQL_INSERT_BATCH_SIZE:
-                yield data
-                data = []
-        if len(data) > 0:
-            yield data
+        for docs in self.solr_exporter.run_cursor_pages(query, query_config_file_path, conf_query=conf_query,
+                                                        list_output_fields=list_output_fields,
+                                                        filter_query=filter_query):
+            self.update_high_water_mark(docs)
+            yield [HTIndexerTrackData(ht_id=ht_id, record_id=doc["id"], status="pending")
+                   for doc in docs for ht_id in doc.get("ht_id") or []]
+
+    def update_high_water_mark(self, docs: list[dict]) -> None:
+        """Keep the last time of index of the records (ISO-8601 dates, so they are compared as strings)"""
+        index_times = [doc[CATALOG_INDEX_TIME_FIELD] for doc in docs if doc.get(CATALOG_INDEX_TIME_FIELD)]
+        if not index_times:
+            return
+        with self.loaded_items_lock:
+            self.high_water_mark = max(index_times + ([self.high_water_mark] if self.high_water_mark else []))
+
+    def get_id_range_filters(self, query: str, query_config_file_path: Path, conf_query: str,
+                             total_ranges: int) -> list[str | None]:
+        """
+        Split the record ids of the query results in ranges, so they can be exported by parallel cursors.
+        :return: List of Solr filter queries, [None] if the ids cannot be split
+        """
+        if total_ranges < 2:
+            return [None]
+        first_id = self.solr_exporter.get_first_id(query, query_config_file_path, conf_query=conf_query)
+        last_id = self.solr_exporter.get_first_id(query, query_config_file_path, conf_query=conf_query,
+                                                  descending=True)
+        return split_id_range(first_id, last_id, total_ranges)
+
+    def load_catalog_range(self, query: str, query_config_file_path: Path, conf_query: str,
+                           list_output_fields: list[str], filter_query: str = None,
+                           max_items: int | None = None, reset_existing: bool = False) -> int:
+        """
+        Insert in the table the items of the query results. The insert of a page is pipelined with the request
+        of the next page to Solr.
+        :param filter_query: Optional Solr filter query, e.g. a range of record ids
+        :param max_items: Stop when the items inserted by all the cursors reach this number
+        :param reset_existing: The items already in the table are set as pending again
+        :return: Number of items inserted by this cursor
+        """
+        total_items = 0
+        pending_insert = None
+        with ThreadPoolExecutor(max_workers=1) as insert_executor:
+            for items in self.get_catalog_data(query, query_config_file_path, conf_query, list_output_fields,
+                                               filter_query=filter_query):
+                if pending_insert:
+                    pending_insert.result()
+                pending_insert = insert_executor.submit(self.insert_batch, items, reset_existing)
+                total_items += len(items)
+
+                with self.loaded_items_lock:
+                    self.loaded_items += len(items)
+                    if max_items is not None and self.loaded_items >= max_items:
+                        break
+            if pending_insert:
+                pending_insert.result()
+        logger.info(f"Loaded total_items={total_items} filter_query={filter_query}")
+        return total_items
+
+    def load_catalog_data(self, query: str, query_config_file_path: Path, conf_query: str,
+                          list_output_fields: list[str], parallel_cursors: int = 1,
+                          max_items: int | None = None, filter_query: str = None,
+                          reset_existing: bool = False) -> int:
+        """
+        Populate the table with the items of the query results. The record ids are split in ranges exported by
+        parallel cursors (see get_id_range_filters).
+        :param parallel_cursors: Number of cursors running at the same time
+        :param max_items: Stop when the inserted items reach this number
+        :param filter_query: Optional Solr filter query, e.g. the records indexed after a date
+        :param reset_existing: The items already in the table are set as pending again
+        :return: Number of inserted items
+        """
+        range_filters = self.get_id_range_filters(query, query_config_file_path, conf_query, parallel_cursors)
+        filter_queries = [" AND ".join(fq for fq in (filter_query, range_filter) if fq) or None
+                          for range_filter in range_filters]
+        with ThreadPoolExecutor(max_workers=len(filter_queries)) as executor:
+            futures = [
+                executor.submit(self.load_catalog_range, query, query_config_file_path, conf_query,
+                                list_output_fields, range_filter_query, max_items, reset_existing)
+                for range_filter_query in filter_queries
+            ]
+            return sum(future.result() for future in futures)
+
+    def sync_catalog_data(self, query: str, query_config_file_path: Path, conf_query: str,
+                          list_output_fields: list[str], parallel_cursors: int = 1,
+                          overlap_minutes: int = SYNC_OVERLAP_MINUTES) -> int:
+        """
+        Incremental sync of the table with the catalog. Only the records indexed in the catalog after the
+        high-water mark of the last sync (time_of_index) are fetched. Their new items are inserted and their
+        existing items are set as pending again, the items of the other records are not changed.
+        The first sync fetches all the records, without changing the existing items.
+        The high-water mark is only stored if all the records are loaded, if an insert fails the exception is
+        raised and the next sync fetches the records again.
+        :param overlap_minutes: The records indexed these minutes before the high-water mark are fetched again
+        :return: Number of inserted or updated items
+        """
+        sync_name = f"catalog:{query}"
+        high_water_mark = self.get_high_water_mark(sync_name)
+        self.high_water_mark = high_water_mark
+
+        filter_query = None
+        if high_water_mark:
+            filter_query = f"{CATALOG_INDEX_TIME_FIELD}:[{high_water_mark}-{overlap_minutes}MINUTES TO *]"
+        logger.info(f"Sync {sync_name} from high_water_mark={high_water_mark}")
+
+        if CATALOG_INDEX_TIME_FIELD not in list_output_fields:
+            list_output_fields = list_output_fields + [CATALOG_INDEX_TIME_FIELD]
+        total_items = self.load_catalog_data(query, query_config_file_path, conf_query, list_output_fields,
+                                             parallel_cursors=parallel_cursors, filter_query=filter_query,
+                                             reset_existing=high_water_mark is not None)
+
+        if self.high_water_mark and self.high_water_mark != high_water_mark:
+            self.set_high_water_mark(sync_name, self.high_water_mark)
+        return total_items
+
+    def get_high_water_mark(self, sync_name: str) -> str | None:
+        """Return the high-water mark of the last sync, None if it is the first one"""
+        rows = self.mysql_obj.query_mysql(
+            f"SELECT high_water_mark FROM {SYNC_STATE_TABLE_NAME} WHERE sync_name = :sync_name",
+            {"sync_name": sync_name}
+        )
+        return rows[0]["high_water_mark"] if rows else None
+
+    def set_high_water_mark(self, sync_name: str, high_water_mark: str) -> None:
+        logger.info(f"Sync {sync_name} new high_water_mark={high_water_mark}")
+        self.mysql_obj.insert_batch(
+            f"INSERT INTO {SYNC_STATE_TABLE_NAME} (sync_name, high_water_mark) VALUES (:sync_name, :high_water_mark) "
+            f"ON DUPLICATE KEY UPDATE high_water_mark = VALUES(high_water_mark)",
+            [{"sync_name": sync_name, "high_water_mark": high_water_mark}]
+        )
+
+    def claim_pending_items(self, limit: int, last_ht_id: str = "") -> list[dict]:
+        """
+        Claim the next pending items of the table, setting their retriever_status to processing in the same
+        transaction, so they are not claimed again by this or other retrievers.
+        :param limit: Maximum number of items to claim
+        :param last_ht_id: The last ht_id claimed, the items are claimed in ht_id order after it
+        :return: List of claimed items {ht_id, record_id}
+        """
+        return self.mysql_obj.claim_rows(CLAIM_PENDING_ITEMS_QUERY, CLAIM_ITEMS_UPDATE,
+                                         params={"status": "pending", "last_ht_id": last_ht_id, "limit": limit,
+                                                 "claimed_status": "processing"})
+
+    def release_expired_claims(self, lease_seconds: int = CLAIM_LEASE_SECONDS) -> None:
+        """
+        Set as pending again the items claimed more than lease_seconds ago that are still processing, so the items
+        of a retriever that crashed or failed before publishing them are claimed again.
+        :param lease_seconds: Seconds an item is claimed by a retriever
+        """
+        self.mysql_obj.update_status(RELEASE_EXPIRED_CLAIMS_QUERY, [{"lease_seconds": lease_seconds}])
+
+    def fail_claimed_items(self, keys: list[str], error: str, by_field: str = "item") -> None:
+        """
+        Set as failed the claimed items that cannot be published, e.g. their record is not in the catalog or its
+        metadata cannot be generated. They are not claimed again until they are set as pending.
+        :param keys: ht_ids or record ids of the items
+        :param error: Error message stored in the table
+        :param by_field: item if the keys are ht_ids, record if they are record ids
+        """
+        if not keys:
+            return
+        column = "ht_id" if by_field == "item" else "record_id"
+        query = FAIL_CLAIMED_ITEMS_QUERY.format(table_name=PROCESSING_STATUS_TABLE_NAME, column=column)
+        self.mysql_obj.update_by_keys(query, [
+            {"error": error, "keys": keys[start:start + MYSQL_UPDATE_BATCH_SIZE]}
+            for start in range(0, len(keys), MYSQL_UPDATE_BATCH_SIZE)
+        ])
+
+    def migrate_table(self) -> list[str]:
+        """
+        Add to an existing table the surrogate primary key and the indexes of the current schema
+        (see HT_INDEXER_TRACKTABLE). All the changes are applied in one ALTER TABLE, so the table is rebuilt once.
+        :return: List of the applied changes, empty if the table is up to date
+        :raises SQLAlchemyError: If the table is not altered
+        """
+        params = {"table_name": PROCESSING_STATUS_TABLE_NAME}
+        columns = {row["column_name"] for row in self.mysql_obj.query_mysql(TRACKTABLE_COLUMNS_QUERY, params)}
+        indexes = {row["index_name"] for row in self.mysql_obj.query_mysql(TRACKTABLE_INDEXES_QUERY, params)}
+
+        changes = []
+        if "id" not in columns:
+            changes.append("ADD COLUMN id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY FIRST")
+        if "claimed_at" not in columns:
+            changes.append("ADD COLUMN claimed_at TIMESTAMP NULL DEFAULT NULL")
+        changes.extend(f"ADD INDEX {name} {index_columns}" for name, index_columns in TRACKTABLE_INDEXES.items()
+                       if name not in indexes)
+
+        if changes:
+            logger.info(f"Migrating {PROCESSING_STATUS_TABLE_NAME}: {changes}")
+            self.mysql_obj.alter_table(f"ALTER TABLE {PROCESSING_STATUS_TABLE_NAME} {', '.join(changes)}")
+        return changes
+
+    def update_items_status(self, items: list[dict], batch_size: int = MYSQL_UPDATE_BATCH_SIZE) -> None:
+        """
+        Update the status of a list of items. The items with the same values (e.g. status, retriever_status,
+        processed_at and error) are updated together with UPDATE ... WHERE ht_id IN (...), instead of one UPDATE
+        by item.
+        :param items: List of dictionaries with the ht_id of the item and the columns to update
+        :param batch_size: Maximum number of ht_ids updated by query
+        """
+        groups = defaultdict(list)
+        for item in items:
+            values = tuple((column, value) for column, value in item.items() if column != "ht_id")
+            groups[values].append(item["ht_id"])
+
+        for values, ht_ids in groups.items():
+            update_query = (f"UPDATE {PROCESSING_STATUS_TABLE_NAME} "
+                            f"SET {', '.join(f'{column} = :{column}' for column, _ in values)} WHERE ht_id IN :keys")
+            self.mysql_obj.update_by_keys(update_query, [
+                {**dict(values), "keys": ht_ids[start:start + batch_size]}
+                for start in range(0, len(ht_ids), batch_size)
+            ])
+
     def create_table(self):
         """
         Create the table fulltext_item_processing_status if it does not exist.
@@ -99,28 +378,51 @@ class HTIndexerTracktable:
 
         self.mysql_obj.create_table(HT_INDEXER_TRACKTABLE)
 
-    def insert_batch(self, list_items: list[HTIndexerTrackData]):
-        """Inserts a batch of HTIndexerTrackData objects into the database."""
+    def create_sync_state_table(self):
+        """Create the table with the high-water marks of the incremental syncs if it does not exist."""
+        self.mysql_obj.create_table(HT_INDEXER_SYNC_STATE_TABLE)
+
+    def insert_batch(self, list_items: list[HTIndexerTrackData], reset_existing: bool = False):
+        """Inserts a batch of HTIndexerTrackData objects into the database, with multi-row INSERT statements of
+        MYSQL_INSERT_BATCH_SIZE rows. The items already in the table are ignored, or set as pending again if
+        reset_existing is True."""
         if not list_items:
             logger.info("No data to insert.")
             return
 
-        insert_query = f"""INSERT IGNORE INTO {PROCESSING_STATUS_TABLE_NAME} (ht_id, record_id,  status, retriever_status, generator_status, indexer_status, error) 
-            VALUES (:ht_id, :record_id,  :status, :retriever_status, :generator_status, :indexer_status, :error);
-            """
-        batch_values = [
-            {
-                "ht_id": item.ht_id,
-                "record_id": item.record_id,
-                "status": item.status,
-                "retriever_status": item.retriever_status,
-                "generator_status": item.generator_status,
-                "indexer_status": item.indexer_status,
-                "error": item.error
-             }
-            for item in list_items
-    ]
-        self.mysql_obj.insert_batch(insert_query, batch_values)
+        insert_statement = (f"INSERT {'' if reset_existing else 'IGNORE '}INTO {PROCESSING_STATUS_TABLE_NAME} "
+                            f"({', '.join(TRACKTABLE_INSERT_COLUMNS)})")
+        for start in range(0, len(list_items), MYSQL_INSERT_BATCH_SIZE):
+            rows = [
+                {column: getattr(item, column) for column in TRACKTABLE_INSERT_COLUMNS}
+                for item in list_items[start:start + MYSQL_INSERT_BATCH_SIZE]
+            ]
+            self.mysql_obj.insert_rows(insert_statement, TRACKTABLE_INSERT_COLUMNS, rows,
+                                       on_duplicate=RESET_ITEM_STATUS if reset_existing else "")
+
+
+def split_id_range(first_id: str | None, last_id: str | None, total_ranges: int) -> list[str | None]:
+    """
+    Split the ids between first_id and last_id in total_ranges ranges of the same size, e.g. the catalog record ids
+    are numbers of 9 digits. The first and the last ranges are open, so all the ids are in some range.
+    :return: List of Solr filter queries, [None] if the ids are not numbers of the same length
+    """
+    if (total_ranges < 2 or not first_id or not last_id or not first_id.isdigit() or not last_id.isdigit()
+            or len(first_id) != len(last_id)):
+        return [None]
+
+    first, last = int(first_id), int(last_id)
+    step = max((last - first) // total_ranges, 1)
+    bounds = sorted({str(first + step * position).zfill(len(first_id)) for position in range(1, total_ranges)
+                     if first + step * position <= last})
+    if not bounds:
+        return [None]
+
+    lower_bounds = ["*"] + [f'"{bound}"' for bound in bounds]
+    upper_bounds = [f'"{bound}"' for bound in bounds] + ["*"]
+    return [f"id:[{lower} TO {upper}{'}' if upper != '*' else ']'}"
+            for lower, upper in zip(lower_bounds, upper_bounds, strict=True)]
+
 
 def main():
 
@@ -129,27 +431,33 @@ def main():
 
     init_args_obj = MonitoringServiceArguments(parser)
 
-    # MySQL connection to retrieve documents from the ht database
-    db_conn = get_mysql_conn()
+    # MySQL connection to retrieve documents from the ht database, one connection by cursor
+    db_conn = get_mysql_conn(pool_size=init_args_obj.parallel_cursors)
     ht_indexer_tracktable = HTIndexerTracktable(db_conn, solr_exporter=init_args_obj.solr_exporter)
 
     if not ht_indexer_tracktable.mysql_obj.table_exists(PROCESSING_STATUS_TABLE_NAME):
         logger.info(f"Creating {PROCESSING_STATUS_TABLE_NAME} table.")
         ht_indexer_tracktable.create_table()
+    else:
+        ht_indexer_tracktable.migrate_table()
 
-    total_documents = 0
-    for item in ht_indexer_tracktable.get_catalog_data(init_args_obj.query,
-                                                    init_args_obj.query_config_file_path,
-                                                       init_args_obj.conf_query,
-                                                       init_args_obj.output_fields):
-
-        total_documents += len(item)
-
-        # Add data to the table
-        ht_indexer_tracktable.insert_batch(item)
-
-        if total_documents >= int(init_args_obj.args.num_found):
-            break
+    start_time = time.time()
+    if init_args_obj.incremental:
+        ht_indexer_tracktable.create_sync_state_table()
+        total_documents = ht_indexer_tracktable.sync_catalog_data(init_args_obj.query,
+                                                                  init_args_obj.query_config_file_path,
+                                                                  init_args_obj.conf_query,
+                                                                  init_args_obj.output_fields,
+                                                                  parallel_cursors=init_args_obj.parallel_cursors)
+    else:
+        total_documents = ht_indexer_tracktable.load_catalog_data(init_args_obj.query,
+                                                                  init_args_obj.query_config_file_path,
+                                                                  init_args_obj.conf_query,
+                                                                  init_args_obj.output_fields,
+                                                                  parallel_cursors=init_args_obj.parallel_cursors,
+                                                                  max_items=int(init_args_obj.args.num_found))
+    logger.info(f"Loaded total_documents={total_documents} in {PROCESSING_STATUS_TABLE_NAME}. "
+                f"Time={time.time() - start_time:.10f}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
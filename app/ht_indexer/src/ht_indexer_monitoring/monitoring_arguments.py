@@ -22,11 +22,18 @@ class MonitoringServiceArguments:
 
         parser.add_argument("--fl", help="Fields to return", default=["ht_id", "id"])
         parser.add_argument("--num_found", help="Total number of documents found", default=1000000)
+        parser.add_argument("--incremental", help="Fetch only the records indexed in the catalog since the last "
+                                                  "incremental run, and set their items as pending",
+                            action="store_true", default=False)
+        parser.add_argument("--parallel_cursors", help="Number of Solr cursors exporting ranges of record ids "
+                                                       "at the same time", default=4, type=int)
 
         self.args = parser.parse_args()
 
         self.query = self.args.query
         self.output_fields = self.args.fl
+        self.parallel_cursors = self.args.parallel_cursors
+        self.incremental = self.args.incremental
 
         self.solr_host = get_solr_url()
 
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from collections.abc import Generator
+from pathlib import Path
+from typing import Any
+
+import orjson
+from ht_utils.ht_logger import get_ht_logger
+
+logger = get_ht_logger(name=__name__)
+
+# Size of the chunks used to stream a stored document into the Solr request
+READ_CHUNK_SIZE = 1024 * 1024
+CLAIM_CHECK_KEYS = {"id", "path", "size", "checksum"}
+
+
+class ClaimCheckStore:
+    """
+    Store of documents for the claim-check pattern.
+
+    Instead of publishing a multi-megabyte document in the queue, the producer writes the document in the store
+    and publishes a small reference {id, path, size, checksum}. The consumer uses the reference to read the
+    document from its own store. So, the number of documents in the queue does not depend on their size.
+
+    The documents are stored in a local folder, shared by the producer and the consumer (e.g. a volume mounted
+    in both pods, not necessarily in the same path). The path of the reference is relative to the folder, and the
+    consumer only reads and deletes the files inside its folder. Each reference has its own file, named with the
+    SHA-256 of the content and a unique suffix, so the document of a reference can be deleted once it is indexed
+    without breaking other references to the same content (e.g. a document generated twice before it is indexed).
+
+    The documents of the messages sent to the Dead Letter Queue are kept, so the messages can be requeued.
+    The documents older than the retention period of the Dead Letter Queue are deleted by remove_expired.
+    """
+
+    def __init__(self, spool_path: str):
+        """
+        :param spool_path: Path of the folder where the documents are stored. It is created if it does not exist.
+        """
+        self.spool_path = Path(spool_path).resolve()
+        self.spool_path.mkdir(parents=True, exist_ok=True)
+
+    def store(self, document: dict[str, Any]) -> dict[str, Any]:
+        """
+        Serialize the document and write it in the store.
+        The file is written in a temporary file and renamed, so a consumer never reads a partial document.
+        :param document: The document to store, it must have an id
+        :return: The reference to the document {id, path, size, checksum}, the path is relative to the store
+        """
+        body = orjson.dumps(document)
+        checksum = hashlib.sha256(body).hexdigest()
+        relative_path = Path(checksum[:2], f"{checksum}.{uuid.uuid4().hex}.json")
+        document_path = self.spool_path / relative_path
+
+        document_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=document_path.parent, suffix=".tmp", delete=False) as tmp_file:
+            tmp_file.write(body)
+        os.replace(tmp_file.name, document_path)
+
+        logger.info(f"Stored document {document.get('id')} in {document_path} Size={len(body)} bytes")
+        return {"id": document.get("id"), "path": relative_path.as_posix(), "size": len(body), "checksum": checksum}
+
+    @staticmethod
+    def is_reference(message: dict[str, Any]) -> bool:
+        """Check if the message is a reference to a stored document instead of the document itself"""
+        return message.keys() == CLAIM_CHECK_KEYS
+
+    def get_document_path(self, reference: dict[str, Any]) -> Path:
+        """
+        Resolve the path of the reference in the store.
+        :param reference: The reference to the document {id, path, size, checksum}
+        :return: Absolute path of the stored document
+        :raises ValueError: If the path is not relative or it is outside the store (e.g. ../)
+        """
+        relative_path = Path(reference["path"])
+        document_path = (self.spool_path / relative_path).resolve()
+        if relative_path.is_absolute() or not document_path.is_relative_to(self.spool_path):
+            raise ValueError(f"Document {reference['id']} path {reference['path']} is outside the store "
+                             f"{self.spool_path}")
+        return document_path
+
+    def verify(self, reference: dict[str, Any]) -> None:
+        """
+        Check the size and the checksum of the stored document.
+        :param reference: The reference to the document {id, path, size, checksum}
+        :raises FileNotFoundError: If the document is not in the store
+        :raises ValueError: If the path is outside the store, or the size or the checksum of the document do not
+        match the reference
+        """
+        document_path = self.get_document_path(reference)
+        if document_path.stat().st_size != reference["size"]:
+            raise ValueError(f"Document {reference['id']} in {document_path} does not have the expected size")
+
+        checksum = hashlib.sha256()
+        with document_path.open("rb") as document_file:
+            while chunk := document_file.read(READ_CHUNK_SIZE):
+                checksum.update(chunk)
+
+        if checksum.hexdigest() != reference["checksum"]:
+            raise ValueError(f"Document {reference['id']} in {document_path} does not match its checksum")
+
+    def read_chunks(self, reference: dict[str, Any]) -> Generator[bytes, None, None]:
+        """
+        Read the stored document in chunks, to stream it without loading it in memory.
+        The document is verified before its first chunk is returned, so a corrupted document is never sent to Solr.
+        The second read of the file is served from the page cache.
+        :param reference: The reference to the document {id, path, size, checksum}
+        :return: Generator of chunks of the serialized document
+        :raises FileNotFoundError: If the document is not in the store
+        :raises ValueError: If the path is outside the store, or the size or the checksum of the document do not
+        match the reference
+        """
+        self.verify(reference)
+
+        with self.get_document_path(reference).open("rb") as document_file:
+            while chunk := document_file.read(READ_CHUNK_SIZE):
+                yield chunk
+
+    def remove(self, reference: dict[str, Any]) -> None:
+        """Delete the stored document once it is indexed. The references outside the store are ignored"""
+        try:
+            self.get_document_path(reference).unlink()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Document {reference['id']} could not be deleted from {reference['path']}: {e}")
+    def remove_expired(self, max_age_seconds: float) -> int:
+        """
+        Delete the documents (and the temporary files of interrupted writes) stored more than max_age_seconds ago.
+        The documents of the indexed messages are deleted by the indexer, so the remaining ones are the documents of
+        the messages in the Dead Letter Queue, or of messages lost before they were indexed. max_age_seconds must be
+        longer than the time the messages stay in the queues.
+        :param max_age_seconds: Age of the documents to delete
+        :return: Number of deleted files
+        """
+        expiration_time = time.time() - max_age_seconds
+        removed_files = 0
+        for file_path in self.spool_path.glob("*/*"):
+            try:
+                if file_path.suffix in (".json", ".tmp") and file_path.stat().st_mtime < expiration_time:
+                    file_path.unlink()
+                    removed_files += 1
+            except OSError as e:
+                logger.warning(f"File {file_path} could not be deleted: {e}")
+        logger.info(f"Deleted {removed_files} expired documents from {self.spool_path}")
+        return removed_files
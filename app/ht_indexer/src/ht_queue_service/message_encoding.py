@@ -0,0 +1,66 @@
+import gzip
+from typing import Any
+
+import orjson
+
+# compression.zstd is in the standard library since Python 3.14, ruff (target-version py312) sorts it as a
+# third-party module
+from compression import zstd
+from ht_utils.ht_logger import get_ht_logger
+
+logger = get_ht_logger(name=__name__)
+
+# Compression algorithms that can be used to encode the body of the messages. The algorithm is sent in the
+# content_encoding property of the AMQP message, so the consumer knows how to decode it.
+# The messages of the document_generator are mostly OCR text, that shrinks several times when it is compressed.
+GZIP_ENCODING = "gzip"
+ZSTD_ENCODING = "zstd"
+SUPPORTED_CONTENT_ENCODINGS = (GZIP_ENCODING, ZSTD_ENCODING)
+
+
+def validate_content_encoding(content_encoding: str | None) -> str | None:
+    """
+    Check the content encoding is supported
+    :param content_encoding: None (plain JSON), gzip or zstd
+    :return: The content encoding
+    :raises ValueError: If the content encoding is not supported
+    """
+    if content_encoding and content_encoding not in SUPPORTED_CONTENT_ENCODINGS:
+        raise ValueError(f"Content encoding {content_encoding} not supported. "
+                         f"Use one of {SUPPORTED_CONTENT_ENCODINGS}")
+    return content_encoding or None
+
+
+def encode_message(queue_message: dict[str, Any], content_encoding: str | None = None) -> bytes:
+    """
+    Serialize the message to JSON with orjson and compress it if a content encoding is defined.
+    :param queue_message: The message to publish
+    :param content_encoding: None (plain JSON), gzip or zstd
+    :return: The body of the message
+    :raises TypeError: If the message cannot be serialized
+    """
+    body = orjson.dumps(queue_message)
+    if content_encoding == ZSTD_ENCODING:
+        return zstd.compress(body)
+    if content_encoding == GZIP_ENCODING:
+        # Level 6 is a good balance between the compression ratio and the time to compress
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def decode_message(body: bytes, content_encoding: str | None = None) -> Any:
+    """
+    Decompress the body of the message, if it is compressed, and deserialize the JSON.
+    Plain messages (without content encoding) published before the compression was enabled are also accepted.
+    :param body: The body of the message
+    :param content_encoding: The content_encoding property of the message
+    :return: The message
+    :raises ValueError: If the content encoding is not supported
+    """
+    if content_encoding == ZSTD_ENCODING:
+        body = zstd.decompress(body)
+    elif content_encoding == GZIP_ENCODING:
+        body = gzip.decompress(body)
+    elif content_encoding:
+        raise ValueError(f"Content encoding {content_encoding} not supported")
+    return orjson.loads(body)
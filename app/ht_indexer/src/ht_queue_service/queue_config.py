@@ -31,6 +31,12 @@ class QueueParams:
     dlx_routing_key: str # Dead-letter routing key
     dlx_queue_name: str # Dead-letter queue name
     arguments: dict[str, Any] # Can be provided by the user or generated by the QueueConfig
+    # Compression of the published messages (gzip or zstd). None publishes plain JSON messages
+    content_encoding: str | None = None
+    # Number of batches prefetched by the consumer using basic_consume. 0 retrieves the messages with basic_get
+    prefetch_batches: int = 0
+    # Maximum time in seconds to wait for a batch to be full before processing it (prefetching consumer)
+    max_linger_time: float = 1.0
 
 def _load_config(config_path: Path) -> dict[str, Any]:
     with open(config_path) as file:
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pika.exceptions
+from ht_queue_service.queue_connection import MAX_DOCUMENT_IN_QUEUE
+from ht_queue_service.queue_producer import QueueProducer
+from ht_utils.ht_logger import get_ht_logger
+
+logger = get_ht_logger(name=__name__)
+
+# Maximum size of the messages waiting in the queue. 200000 retriever messages of 0.16 MB (see queue_connection)
+MAX_QUEUE_BYTES = 32 * 1024 ** 3
+# Size of a message used before the size of the published messages is known
+DEFAULT_MESSAGE_SIZE = 160 * 1024
+# The producer keeps in the queue the messages the consumers drain in buffer_seconds
+DEFAULT_BUFFER_SECONDS = 900
+# Minimum number of messages kept in the queue, so the consumers do not wait when the drain rate is low
+DEFAULT_MIN_QUEUE_MESSAGES = 24000
+# Seconds between two checks of the queue while there are no credits
+DEFAULT_POLL_INTERVAL = 5
+# Weight of the last measure in the moving average of the drain rate
+DRAIN_RATE_SMOOTHING = 0.3
+
+
+class QueueFlowController:
+    """
+    Credit-based flow control of a producer.
+
+    Instead of publishing until the queue is full and then sleeping several minutes, the producer asks for credits
+    (the number of messages it can publish) before fetching the next items to process. The credits are computed
+    reading the depth of the queue (passive declare) and the rate the consumers drain it, so the producer
+    keeps in the queue about buffer_seconds of work for the consumers, and the pipeline runs at the drain rate.
+
+    The credits are limited by:
+    - The target depth of the queue, drain_rate * buffer_seconds, between min_queue_messages and max_queue_messages.
+    If the drain rate is still unknown, the target is max_queue_messages.
+    - The size of the messages in the queue, max_queue_bytes, estimated with the average size of the published
+    messages.
+    - max_credits, the maximum number of items fetched at once.
+
+    The drain rate is measured between two checks of the queue as
+    (depth of the previous check + messages published since then - current depth) / elapsed time,
+    so the producer must report the published messages (see record_published).
+    """
+
+    def __init__(self, queue_producer: QueueProducer, max_credits: int, min_credits: int = 1,
+                 max_queue_messages: int = MAX_DOCUMENT_IN_QUEUE, max_queue_bytes: int = MAX_QUEUE_BYTES,
+                 buffer_seconds: float = DEFAULT_BUFFER_SECONDS,
+                 min_queue_messages: int = DEFAULT_MIN_QUEUE_MESSAGES,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        """
+        :param queue_producer: Producer whose channel is used to check the queue
+        :param max_credits: Maximum number of credits given at once
+        :param min_credits: Minimum number of credits worth fetching items, the producer waits for them
+        :param max_queue_messages: Maximum number of messages in the queue
+        :param max_queue_bytes: Maximum size of the messages in the queue
+        :param buffer_seconds: Seconds of work for the consumers kept in the queue
+        :param min_queue_messages: Minimum target depth of the queue
+        :param poll_interval: Seconds between two checks of the queue while there are no credits
+        """
+        # The credits are computed reading the queue, it fails at construction instead of at the first get_credits
+        if queue_producer is None:
+            raise ValueError("QueueFlowController requires a queue producer")
+        self.queue_producer = queue_producer
+        self.max_credits = max_credits
+        self.min_credits = min(min_credits, max_credits)
+        self.max_queue_messages = max_queue_messages
+        self.max_queue_bytes = max_queue_bytes
+        self.buffer_seconds = buffer_seconds
+        self.min_queue_messages = min(min_queue_messages, max_queue_messages)
+        self.poll_interval = poll_interval
+
+        # Messages published by the producer threads
+        self.published_lock = threading.Lock()
+        self.published_messages = 0
+        self.published_bytes = 0
+
+        # Last check of the queue, to measure the drain rate
+        self.drain_rate: float | None = None
+        self.last_depth: int | None = None
+        self.last_check_time: float | None = None
+        self.last_published_messages = 0
+
+    def record_published(self, total_messages: int, total_bytes: int) -> None:
+        """Report the messages published in the queue"""
+        with self.published_lock:
+            self.published_messages += total_messages
+            self.published_bytes += total_bytes
+
+    def get_message_size(self) -> float:
+        """Average size of the published messages"""
+        with self.published_lock:
+            if not self.published_messages:
+                return DEFAULT_MESSAGE_SIZE
+            return self.published_bytes / self.published_messages
+
+    def update_drain_rate(self, depth: int, check_time: float) -> None:
+        """Update the moving average of the messages per second consumed from the queue"""
+        with self.published_lock:
+            published_messages = self.published_messages
+
+        if self.last_depth is not None and check_time > self.last_check_time:
+            drained_messages = self.last_depth + published_messages - self.last_published_messages - depth
+            rate = max(drained_messages, 0) / (check_time - self.last_check_time)
+            self.drain_rate = rate if self.drain_rate is None else (
+                DRAIN_RATE_SMOOTHING * rate + (1 - DRAIN_RATE_SMOOTHING) * self.drain_rate)
+
+        self.last_depth = depth
+        self.last_check_time = check_time
+        self.last_published_messages = published_messages
+
+    def get_target_depth(self) -> int:
+        """Number of messages the queue should have to keep the consumers busy for buffer_seconds"""
+        if self.drain_rate is None:
+            return self.max_queue_messages
+        return int(min(max(self.drain_rate * self.buffer_seconds, self.min_queue_messages), self.max_queue_messages))
+
+    def compute_credits(self, depth: int) -> int:
+        """Number of messages that can be published given the depth of the queue"""
+        message_size = self.get_message_size()
+        credits_by_messages = self.get_target_depth() - depth
+        credits_by_bytes = int((self.max_queue_bytes - depth * message_size) / message_size)
+        return max(min(credits_by_messages, credits_by_bytes, self.max_credits), 0)
+
+    def get_credits(self) -> int:
+        """
+        Check the queue and return the number of messages that can be published.
+        :return: The credits, 0 if the queue could not be checked
+        """
+        channel = self.queue_producer.channel
+        try:
+            if not channel or channel.is_closed:
+                self.queue_producer.queue_reconnect()
+                channel = self.queue_producer.channel
+            depth, total_consumers = self.queue_producer.queue_manager.get_queue_status(channel)
+        except pika.exceptions.AMQPError as e:
+            logger.error(f"Failed to check the queue {self.queue_producer.queue_manager.queue_name}: {e}")
+            return 0
+
+        self.update_drain_rate(depth, time.monotonic())
+        credits = self.compute_credits(depth)
+        logger.info(f"Flow control queue={self.queue_producer.queue_manager.queue_name} depth={depth} "
+                    f"consumers={total_consumers} drain_rate={self.drain_rate} "
+                    f"target_depth={self.get_target_depth()} credits={credits}")
+        return credits
+
+    def wait_for_credits(self) -> int:
+        """
+        Wait until there are at least min_credits credits, checking the queue every poll_interval seconds.
+        :return: The credits, the number of items the producer can fetch and publish
+        """
+        while (credits := self.get_credits()) < self.min_credits:
+            time.sleep(self.poll_interval)
+        return credits
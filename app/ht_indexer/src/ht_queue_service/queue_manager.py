@@ -124,6 +124,17 @@ class QueueManager:
         logger.info(f"Queue {self.queue_name} set up successfully with exchange {self.main_exchange_name} "
                     f"and DLX {self.dlx_exchange}.")
 
+    def get_queue_status(self, channel: pika.adapters.blocking_connection.BlockingChannel) -> tuple[int, int]:
+        """Get the number of messages and the number of consumers of the queue.
+        :param channel: The RabbitMQ channel
+        :return: The number of messages ready in the queue and the number of consumers
+        :raises ChannelClosedByBroker: If the queue does not exist or is declared with different options.
+        :raises AMQPError: If there is an error related to the AMQP protocol
+        """
+        # Use passive=True to avoid creating a queue if it doesn't exist
+        status = channel.queue_declare(queue=self.queue_name, durable=True, passive=True)
+        return status.method.message_count, status.method.consumer_count
+
     def get_total_messages(self, channel: pika.adapters.blocking_connection.BlockingChannel) -> int:
 
         """Get the total number of messages in the queue.
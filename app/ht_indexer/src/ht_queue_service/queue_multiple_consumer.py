@@ -4,9 +4,9 @@ from abc import ABC, abstractmethod
 from collections.abc import Generator
 from typing import Any
 
-import orjson
 import pika
 from ht_queue_service.channel_creator import ChannelCreator
+from ht_queue_service.message_encoding import decode_message
 from ht_queue_service.queue_config import QueueParams
 from ht_queue_service.queue_manager import QueueManager
 from ht_utils.ht_logger import get_ht_logger
@@ -39,6 +39,13 @@ class QueueMultipleConsumer(ABC):
         # shutdown_on_empty_queue is a boolean to stop consuming messages when the queue is empty.
         # It is used for testing purposes.
         self.shutdown_on_empty_queue = queue_params.shutdown_on_empty_queue
+        # If prefetch_batches is greater than 0, the messages are pushed by the broker (basic_consume) instead
+        # of retrieved one by one (basic_get). See consume_prefetched_batches
+        self.prefetch_batches = queue_params.prefetch_batches
+        self.max_linger_time = queue_params.max_linger_time
+        # stop_requested is set by request_stop (e.g. from a SIGTERM handler). The consume loops stop after the
+        # batch being processed, so the service stops with the channel open and the processed messages settled
+        self.stop_requested = False
 
         # Ensure the queue is ready when the consumer is initialized
         if not self.queue_manager.is_ready(self.channel):
@@ -94,9 +101,14 @@ class QueueMultipleConsumer(ABC):
             self.channel = self.channel_creator.get_channel()
             self.queue_reconnect()
 
+        if self.prefetch_batches:
+            self.consume_prefetched_batches()
+            return
+
         """ Retrieves a full batch of messages before processing """
-        while True:
+        while not self.stop_requested:
             batch = [] # It stores messages for batch processing
+            content_encodings = [] # It stores the content encoding of each message to decode them
             delivery_tag = [] # It stores delivery tags for acknowledging messages
             for _ in range(self.queue_manager.batch_size):
                 # Use basic_get to retrieve a batch of messages and auto_ack=False to tell RabbitMQ to not wait for
@@ -105,6 +117,7 @@ class QueueMultipleConsumer(ABC):
                                                                         auto_ack=False)
                 if method_frame:
                     batch.append(body)
+                    content_encodings.append(properties.content_encoding if properties else None)
                     delivery_tag.append(method_frame.delivery_tag)
                 else:
                     break  # Stop if no more messages in the queue
@@ -118,7 +131,9 @@ class QueueMultipleConsumer(ABC):
                     logger.info("No messages in the queue. Waiting for more messages...")
                     continue
             try:
-                batch_data = [orjson.loads(body) for body in batch]
+                # Compressed and plain messages are both accepted
+                batch_data = [decode_message(body, content_encoding)
+                              for body, content_encoding in zip(batch, content_encodings, strict=True)]
                 # Process batch of messages and acknowledge them if successful
                 # If the process_batch method returns False, stop consuming messages from the queue.
                 # We use it for testing purposes. However, we could add a flag to the service to stop consuming messages.
@@ -130,6 +145,60 @@ class QueueMultipleConsumer(ABC):
                 logger.error(f"[!] Error processing batch: {e}")
                 raise e
 
+    def consume_prefetched_batches(self) -> None:
+        """Consume the messages pushed by the broker and process them in batches.
+
+        The broker sends up to prefetch_batches * batch_size unacknowledged messages to the consumer, so the next
+        batch is already in the client while the current one is processed, instead of one basic_get round-trip
+        per message. The batch is processed when it is full or when max_linger_time seconds passed since
+        its first message arrived.
+        """
+        self.channel.basic_qos(prefetch_count=self.prefetch_batches * self.queue_manager.batch_size)
+
+        batch, content_encodings, delivery_tags = [], [], []
+        batch_start_time = time.time()
+        try:
+            for method_frame, properties, body in self.channel.consume(queue=self.queue_manager.queue_name,
+                                                                       auto_ack=False,
+                                                                       inactivity_timeout=self.max_linger_time):
+                if method_frame:
+                    if not batch:
+                        batch_start_time = time.time()
+                    batch.append(body)
+                    content_encodings.append(properties.content_encoding if properties else None)
+                    delivery_tags.append(method_frame.delivery_tag)
+                elif not batch:
+                    if self.shutdown_on_empty_queue or self.stop_requested:
+                        logger.info("Queue is empty or stop requested. Stopping consumer...")
+                        break
+                    logger.info("No messages in the queue. Waiting for more messages...")
+                    continue
+
+                # No message arrived during max_linger_time (method_frame is None), or the batch is full, or
+                # the first message of the batch has waited max_linger_time, or the consumer must stop
+                if (method_frame and len(batch) < self.queue_manager.batch_size
+                        and time.time() - batch_start_time < self.max_linger_time and not self.stop_requested):
+                    continue
+
+                batch_data = [decode_message(body, content_encoding)
+                              for body, content_encoding in zip(batch, content_encodings, strict=True)]
+                # New lists for the next batch, process_batch could keep a reference to the current ones
+                current_delivery_tags = delivery_tags
+                batch, content_encodings, delivery_tags = [], [], []
+                if not self.process_batch(batch_data, current_delivery_tags):
+                    logger.info("Batch processing returned False. Stopping consumption.")
+                    break
+                if self.stop_requested:
+                    logger.info("Stop requested. Stopping consumer...")
+                    break
+        except Exception as e:
+            logger.error(f"[!] Error processing batch: {e}")
+            raise e
+        finally:
+            # The prefetched messages that were not processed are returned to the queue
+            if self.channel.is_open:
+                self.channel.cancel()
+
     def consume_dead_letter_messages(self, channel: pika.adapters.blocking_connection.BlockingChannel,
                                      inactivity_timeout: int = 3, queue_name: str = '') -> Generator[tuple[Any, Any, None], None, None]:
         """
@@ -180,14 +249,22 @@ class QueueMultipleConsumer(ABC):
         """
         used_channel.basic_reject(delivery_tag=basic_deliver, requeue=self.requeue_message)
 
-    def positive_acknowledge(self, used_channel: pika.adapters.blocking_connection.BlockingChannel, delivery_tag: int) -> None:
+    def positive_acknowledge(self, used_channel: pika.adapters.blocking_connection.BlockingChannel, delivery_tag: int,
+                             multiple: bool = False) -> None:
         """Acknowledges a message as successfully processed.
 
         :param used_channel: The RabbitMQ channel to acknowledge the message on
         :param delivery_tag: The delivery tag of the message to acknowledge
+        :param multiple: If True, all the unacknowledged messages up to delivery_tag are acknowledged
         :return: None
         """
-        used_channel.basic_ack(delivery_tag=delivery_tag)
+        used_channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+
+    def request_stop(self) -> None:
+        """Ask the consumer to stop after the batch being processed. It only sets a flag checked by the consume
+        loops, so it is safe to call from a signal handler while a batch is being processed.
+        """
+        self.stop_requested = True
 
     def stop(self) -> None:
         """Stop consuming messages
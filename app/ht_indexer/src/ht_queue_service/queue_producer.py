@@ -1,18 +1,23 @@
 # producer
-import json
 import threading
+import weakref
+from collections import Counter
 from typing import Any
 
 import pika.exceptions
 from ht_queue_service.channel_creator import ChannelCreator
+from ht_queue_service.message_encoding import encode_message, validate_content_encoding
 from ht_queue_service.queue_config import QueueParams
 from ht_queue_service.queue_manager import QueueManager
 from ht_utils.ht_logger import get_ht_logger
 from ht_utils.ht_utils import get_queue_message_id
+from pika.adapters.blocking_connection import ReturnedMessage
 
 logger = get_ht_logger(name=__name__)
 
 DELIVERY_MODE_PERSISTENT = 2  # Make message persistent
+# Number of messages published by publish_many before waiting for the broker (one transaction)
+PUBLISH_WINDOW_SIZE = 100
 
 class QueueProducer:
     """
@@ -23,14 +28,20 @@ class QueueProducer:
       and ready via `QueueManager`.
     - Uses a thread-local channel for each non-main thread to avoid sharing non-thread-safe
       Pika channels across threads.
-    - Makes published messages persistent (delivery mode = 2) and JSON-encodes payloads.
+    - Makes published messages persistent (delivery mode = 2) and JSON-encodes payloads with orjson.
+    - Optionally compresses the payloads (gzip or zstd) and sets the AMQP `content_encoding` property,
+      so consumers know how to decode them.
     - Detects closed channels/connections, reconnects, and retries the publish once.
+    - Publishes lists of messages in windows of PUBLISH_WINDOW_SIZE messages (`publish_many`), waiting
+      once per window for the broker, and reports which messages are persisted, so the callers only mark
+      as published the messages that are in the queue.
 
     Attributes:
         channel_creator: Factory that manages the underlying connection and creates channels.
         channel: The primary channel used by the main thread.
         _thread_local: Thread-local storage where per-thread channels are cached.
         queue_manager: Manages queue/exchange declaration and readiness checks.
+        content_encoding: Compression of the messages (gzip, zstd or None for plain JSON).
 
     Notes:
         - Channels are not thread-safe. Each non-main thread gets its own channel.
@@ -67,6 +78,21 @@ class QueueProducer:
         # Object to create the queue and manage its setup and attributes
         self.queue_manager = QueueManager(queue_params)
 
+        # Compression of the published messages
+        self.content_encoding = validate_content_encoding(queue_params.content_encoding)
+
+        # The properties are the same for all the messages, so they are created once and shared
+        self.message_properties = pika.BasicProperties(delivery_mode=DELIVERY_MODE_PERSISTENT,
+                                                       content_type="application/json",
+                                                       content_encoding=self.content_encoding)
+
+        # Channels already in transaction mode (see publish_many)
+        self._transaction_channels = weakref.WeakSet()
+
+        # Messages confirmed by publish_many, used to measure the size of the messages (see QueueFlowController)
+        self.published_messages = 0
+        self.published_bytes = 0
+
         # Ensure the queue is ready when the producer is initialized
         if not self.queue_manager.is_ready(self.channel):
             logger.warning("Queue setup not ready. Initializing channel and setup.")
@@ -143,7 +169,8 @@ class QueueProducer:
         Behaviour:
          - If the channel is closed during publishing, it will attempt to reconnect and retry
         publishing.
-         - The message is serialized to JSON format before publishing.
+         - The message is serialized to JSON format before publishing, and compressed if the producer
+         has a content encoding.
 
         :param queue_message: The message to be published should be a dictionary.
         :return: None
@@ -170,7 +197,7 @@ class QueueProducer:
                 channel = self._get_thread_channel()
 
             try:
-                body = json.dumps(queue_message)
+                body = encode_message(queue_message, self.content_encoding)
             except (TypeError, ValueError) as json_err:
                 logger.error(
                     f"Failed to serialize message {queue_message.get('ht_id')}: {json_err}", exc_info=True
@@ -181,11 +208,14 @@ class QueueProducer:
                                 exchange=self.queue_manager.main_exchange_name,
                                 routing_key=self.queue_manager.queue_name,
                                 body=body,
-                                properties=pika.BasicProperties(delivery_mode=DELIVERY_MODE_PERSISTENT,
-                                                                content_type="application/json")  # make a message persistent
+                                properties=self.message_properties  # make a message persistent
                                 )
+            # The channel is shared with publish_many, the message is not delivered until it is committed
+            if channel in self._transaction_channels:
+                channel.tx_commit()
 
-            logger.info(f"Published message to {self.queue_manager.queue_name}. Message ID: {message_id}")
+            logger.info(f"Published message to {self.queue_manager.queue_name}. Message ID: {message_id} "
+                        f"Size={len(body)} bytes")
 
         except (pika.exceptions.ChannelClosed, pika.exceptions.ConnectionClosed,
                 pika.exceptions.ChannelWrongStateError, pika.exceptions.StreamLostError) as err:
@@ -198,3 +228,123 @@ class QueueProducer:
                 f"Unexpected error publishing message {queue_message.get('ht_id')}: {err}", exc_info=True
             )
             raise
+
+    def _get_transaction_channel(self):
+        """
+        Get the channel of the current thread in transaction mode. Transaction mode is enabled once per channel,
+        so a new channel (e.g. after reconnecting) is set up again.
+        """
+        channel = self._get_thread_channel()
+        if not channel or channel.is_closed:
+            logger.warning(f"Channel closed before publish (queue: {self.queue_manager.queue_name}). Reconnecting.")
+            self._thread_reconnect()
+            channel = self._get_thread_channel()
+
+        if channel not in self._transaction_channels:
+            channel.tx_select()
+            channel.add_on_return_callback(self._on_message_returned)
+            self._transaction_channels.add(channel)
+        return channel
+
+    def _on_message_returned(self, channel, method, properties, body: bytes) -> None:
+        """Keep the messages the broker could not route to the queue, they are reported as failed by
+        publish_many. The callback runs in the thread of the channel."""
+        self._thread_local.returned_messages.append(ReturnedMessage(method, properties, body))
+
+    def _publish_window(self, bodies: list[bytes]) -> list[ReturnedMessage]:
+        """
+        Publish the bodies in one transaction and wait once for the broker. When the commit is confirmed, the
+        messages are persisted in the queue, except the ones returned because they cannot be routed to it
+        (the messages are mandatory). The returned messages are received before the commit is confirmed.
+        If the channel is closed while publishing, the transaction is lost, so it reconnects and publishes all
+        the messages again once.
+
+        :param bodies: Serialized messages
+        :return: The messages returned by the broker
+        :raises Exception: If the transaction fails, none of the messages is persisted
+        """
+        for attempt in range(2):
+            self._thread_local.returned_messages = []
+            try:
+                channel = self._get_transaction_channel()
+                for body in bodies:
+                    channel.basic_publish(exchange=self.queue_manager.main_exchange_name,
+                                          routing_key=self.queue_manager.queue_name,
+                                          body=body,
+                                          properties=self.message_properties,
+                                          mandatory=True)
+                channel.tx_commit()
+                # Dispatch the callbacks of the returned messages
+                channel.connection.process_data_events(time_limit=0)
+                return self._thread_local.returned_messages
+            except (pika.exceptions.ChannelClosed, pika.exceptions.ConnectionClosed,
+                    pika.exceptions.ChannelWrongStateError, pika.exceptions.StreamLostError) as err:
+                if attempt:
+                    raise
+                logger.warning(f"RabbitMQ connection/channel closed while publishing: {err}. "
+                               f"Reconnecting and retrying...")
+                self._thread_reconnect()
+
+    def publish_many(self, queue_messages: list[dict[str, Any]]) \
+            -> tuple[list[dict[str, Any]], list[tuple[dict[str, Any], Exception]]]:
+        """
+        Serialize and publish a list of messages, waiting once for the broker per window of messages.
+
+        Behaviour:
+         - Each message is serialized once, and the same bytes are used to log its size and as the body.
+         All the messages share the same properties.
+         - The messages are published in windows of PUBLISH_WINDOW_SIZE messages. Each window is a transaction
+         of the channel of the thread, so there is one round trip to the broker per window instead of one per
+         message, and the messages are only reported as published once the broker commits them (the messages
+         are persisted in the queue). BlockingChannel waits for the confirm of each message in confirm mode, so
+         the window cannot use publisher confirms.
+         - A message that cannot be serialized or cannot be routed to the queue is reported as failed. If the
+         broker does not commit a window, all its messages are reported as failed. The next messages are published.
+         - If the channel is closed during publishing, it reconnects and retries the window once.
+
+        :param queue_messages: List of messages to be published, each message should be a dictionary.
+        :return: The list of confirmed messages, and the list of (message, error) of the failed messages
+        """
+        confirmed_messages = []
+        failed_messages = []
+        published_bytes = 0
+
+        window = []
+        for position, queue_message in enumerate(queue_messages):
+            try:
+                window.append((queue_message, encode_message(queue_message, self.content_encoding)))
+            except Exception as err:
+                logger.error(f"Message {get_queue_message_id(queue_message)} not serialized: {err}")
+                failed_messages.append((queue_message, err))
+
+            if not window or (len(window) < PUBLISH_WINDOW_SIZE and position < len(queue_messages) - 1):
+                continue
+
+            try:
+                returned_messages = self._publish_window([body for _, body in window])
+            except Exception as err:
+                logger.error(f"Messages total_messages={len(window)} not confirmed by "
+                             f"{self.queue_manager.queue_name}: {err}")
+                failed_messages.extend((message, err) for message, _ in window)
+                window = []
+                continue
+
+            returned_bodies = Counter(returned_message.body for returned_message in returned_messages)
+            for message, body in window:
+                message_id = get_queue_message_id(message)
+                if returned_bodies[body]:
+                    returned_bodies[body] -= 1
+                    logger.error(f"Message {message_id} not routed to {self.queue_manager.queue_name}")
+                    failed_messages.append((message, pika.exceptions.UnroutableError(returned_messages)))
+                    continue
+                confirmed_messages.append(message)
+                published_bytes += len(body)
+                logger.info(f"Published message to {self.queue_manager.queue_name}. Message ID: {message_id} "
+                            f"Size={len(body)} bytes")
+            window = []
+
+        self.published_messages += len(confirmed_messages)
+        self.published_bytes += published_bytes
+        logger.info(f"Published total_messages={len(queue_messages)} to {self.queue_manager.queue_name} "
+                    f"confirmed={len(confirmed_messages)} failed={len(failed_messages)} Size={published_bytes} bytes")
+        return confirmed_messages, failed_messages
@@ -102,3 +102,22 @@ class TestCatalogMetadata:
     def test_extract_enum_publish_date(self, get_item_metadata):
         doc_json = get_item_metadata.get_data_ht_json_obj()
         assert len(doc_json) == 1
+
+    def test_record_indexes_shared_by_items(self, update_catalog_record_metadata):
+        """ht_json and the positions of the items are indexed once per record and used by all its items"""
+        record_metadata = CatalogRecordMetadata(update_catalog_record_metadata)
+        items = [CatalogItemMetadata(ht_id, record_metadata) for ht_id in update_catalog_record_metadata["ht_id"]]
+
+        assert record_metadata.item_positions == {"mdp.39015078560292": 0, "inu.30000108625017": 1}
+        assert [item.metadata["htsource"] for item in items] == ["University of Michigan", "Indiana University"]
+        assert items[1].get_data_ht_json_obj() == []
+        assert not hasattr(items[0], "__dict__")
+
+    def test_allfields_created_once_per_record(self, update_catalog_record_metadata):
+        """The allfields field is created from the MARC record and the items do not include the MARC record"""
+        record_metadata = CatalogRecordMetadata(update_catalog_record_metadata)
+        items = [CatalogItemMetadata(ht_id, record_metadata) for ht_id in update_catalog_record_metadata["ht_id"]]
+
+        assert "Robinson Crusoe" in record_metadata.metadata["allfields"]
+        assert all(item.metadata["allfields"] is record_metadata.metadata["allfields"] for item in items)
+        assert all("fullrecord" not in item.metadata for item in items)
@@ -0,0 +1,236 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+import orjson
+import pytest
+from document_generator.document_generator_service import DocumentGeneratorService
+from ht_queue_service.claim_check_store import ClaimCheckStore
+
+
+def make_future(result=None, exception: Exception = None) -> Future:
+    future = Future()
+    if exception:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+@pytest.fixture
+def document_generator_service():
+    return DocumentGeneratorService(Mock(), Mock(), Mock(), document_repository="local", workers=2)
+
+
+class TestDocumentGeneratorService:
+
+    def test_complete_documents_publish_and_acknowledge(self, document_generator_service):
+        """Use case: The document generated by the workers is published, and the message is acknowledged"""
+        message = {"ht_id": "mdp.39015078560292", "fullrecord": "<record/>", "title": ["Robinson Crusoe"]}
+        pending = {
+            make_future({"ocr": "text", "allfields": "fields"}): (message, 1,
+                                                                  make_future({"mdp.39015078560292": {"rights": 1}}))
+        }
+
+        document_generator_service.complete_documents(pending, block=True)
+
+        assert pending == {}
+        document_generator_service.tgt_queue_producer.publish_messages.assert_called_once_with(
+            {"id": "mdp.39015078560292", "ocr": "text", "allfields": "fields", "title": ["Robinson Crusoe"],
+             "rights": 1}
+        )
+        document_generator_service.src_queue_consumer.positive_acknowledge.assert_called_once()
+
+    def test_complete_documents_reject_failed_document(self, document_generator_service):
+        """Use case: The message is rejected if the worker failed to generate the document"""
+        message = {"ht_id": "mdp.39015078560292", "fullrecord": "<record/>"}
+        pending = {
+            make_future(exception=FileNotFoundError("zip not found")): (message, 1, make_future({}))
+        }
+
+        document_generator_service.complete_documents(pending, block=True)
+
+        document_generator_service.tgt_queue_producer.publish_messages.assert_not_called()
+        document_generator_service.src_queue_consumer.reject_message.assert_called_once()
+
+    def test_publish_document_claim_check(self, tmp_path):
+        """Use case: In claim-check mode, the document is stored and only its reference is published"""
+        claim_check_store = ClaimCheckStore(str(tmp_path))
+        service = DocumentGeneratorService(Mock(), Mock(), Mock(), document_repository="local",
+                                           claim_check_store=claim_check_store)
+        document = {"id": "mdp.39015078560292", "ocr": "text"}
+
+        service.publish_document(document)
+
+        reference = service.tgt_queue_producer.publish_messages.call_args.args[0]
+        assert reference["id"] == "mdp.39015078560292"
+        assert ClaimCheckStore.is_reference(reference)
+        assert orjson.loads(b"".join(claim_check_store.read_chunks(reference))) == document
+
+    def test_generate_documents_skip_unchanged(self):
+        """Use case: The items whose inputs did not change are acknowledged and marked as completed without
+        generating their documents, and the fingerprint of the generated documents is saved as pending until the
+        indexer confirms it"""
+        fingerprint_store = Mock()
+        fingerprint_store.get_fingerprints.return_value = {"mdp.001": "fingerprint_mdp.001", "mdp.002": "old"}
+        service = DocumentGeneratorService(Mock(), Mock(), Mock(), document_repository="local",
+                                           fingerprint_store=fingerprint_store)
+        service.document_generator.mysql_data_extractor = Mock()
+        service.document_generator.mysql_data_extractor.retrieve_mysql_data_batch.return_value = {}
+        messages = [{"ht_id": "mdp.001"}, {"ht_id": "mdp.002"}]
+
+        with patch("document_generator.document_generator_service.compute_fingerprint",
+                   side_effect=lambda source_path, message, mysql_metadata: f"fingerprint_{message['ht_id']}"), \
+                patch.object(service, "generate_full_text_entry", return_value={"id": "mdp.002"}) as generate:
+            service.generate_documents(messages, [1, 2])
+
+        generate.assert_called_once()
+        assert generate.call_args.args[0] == "mdp.002"
+        fingerprint_store.mark_completed.assert_called_once_with(["mdp.001"])
+        assert service.src_queue_consumer.positive_acknowledge.call_count == 2
+        fingerprint_store.save_pending_fingerprints.assert_called_once_with({"mdp.002": "fingerprint_mdp.002"})
+
+    def test_generate_documents_metadata_only(self):
+        """Use case: In metadata-only mode, an atomic update is published without generating the document"""
+        service = DocumentGeneratorService(Mock(), Mock(), Mock(), document_repository="local", metadata_only=True)
+        service.document_generator.mysql_data_extractor = Mock()
+        service.document_generator.mysql_data_extractor.retrieve_mysql_data_batch.return_value = {
+            "mdp.001": {"rights": 2, "ht_heldby": ["umich"], "coll_id": [0]}
+        }
+
+        with patch.object(service, "generate_full_text_entry") as generate:
+            service.generate_documents([{"ht_id": "mdp.001", "title": ["Robinson Crusoe"]}], [1])
+
+        generate.assert_not_called()
+        service.tgt_queue_producer.publish_messages.assert_called_once_with(
+            {"id": "mdp.001", "title": {"set": ["Robinson Crusoe"]}, "rights": {"set": 2},
+             "ht_heldby": {"set": ["umich"]}, "ht_heldby_brlm": {"set": None}, "coll_id": {"set": [0]}}
+        )
+        service.src_queue_consumer.positive_acknowledge.assert_called_once()
+
+    def test_generate_documents_metadata_only_ignore_fingerprints(self, tmp_path):
+        """Use case: The zip file changes after the last indexed document. The metadata-only run does not compute
+        or save the fingerprint, so the next full run generates the document again"""
+        (tmp_path / "mdp.001.zip").write_bytes(b"zip content")
+        stored_fingerprints = {}
+        fingerprint_store = Mock()
+        fingerprint_store.get_fingerprints.side_effect = lambda ht_ids: {
+            ht_id: stored_fingerprints[ht_id] for ht_id in ht_ids if ht_id in stored_fingerprints}
+        # The indexer confirms the fingerprints of the published documents
+        fingerprint_store.save_pending_fingerprints.side_effect = stored_fingerprints.update
+
+        def run_generator(metadata_only: bool):
+            service = DocumentGeneratorService(Mock(), Mock(), Mock(), document_repository="local",
+                                               fingerprint_store=fingerprint_store, metadata_only=metadata_only)
+            service.document_generator.mysql_data_extractor = Mock()
+            service.document_generator.mysql_data_extractor.retrieve_mysql_data_batch.return_value = {}
+            with patch("document_generator.document_generator_service.HtDocument",
+                       return_value=Mock(source_path=str(tmp_path / "mdp.001"))), \
+                    patch.object(service, "generate_full_text_entry", return_value={"id": "mdp.001"}) as generate:
+                service.generate_documents([{"ht_id": "mdp.001"}], [1])
+            return generate
+
+        assert run_generator(metadata_only=False).call_count == 1
+        assert run_generator(metadata_only=False).call_count == 0
+        fingerprint_store.reset_mock()
+
+        (tmp_path / "mdp.001.zip").write_bytes(b"new zip content")
+        run_generator(metadata_only=True)
+        fingerprint_store.get_fingerprints.assert_not_called()
+        fingerprint_store.save_pending_fingerprints.assert_not_called()
+
+        assert run_generator(metadata_only=False).call_count == 1
+
+    def test_generate_documents_reject_batch_mysql_error(self):
+        """Use case: If the MySQL fields of the batch could not be retrieved, all the messages are rejected and the
+        service keeps consuming messages"""
+        service = DocumentGeneratorService(Mock(), Mock(), Mock(), document_repository="local")
+        service.document_generator.mysql_data_extractor = Mock()
+        service.document_generator.mysql_data_extractor.retrieve_mysql_data_batch.side_effect = Exception("timeout")
+
+        with patch.object(service, "generate_full_text_entry") as generate:
+            service.generate_documents([{"ht_id": "mdp.001"}, {"ht_id": "mdp.002"}], [1, 2])
+
+        generate.assert_not_called()
+        assert [call.args[1] for call in service.src_queue_consumer.reject_message.call_args_list] == [1, 2]
+        service.src_queue_consumer.positive_acknowledge.assert_not_called()
+
+    def test_submit_documents_retrieve_mysql_fields_by_batch(self, document_generator_service):
+        """Use case: The MySQL fields of a batch of messages are retrieved with one call, shared by its documents"""
+        document_generator_service.document_generator.mysql_data_extractor = Mock()
+        extractor = document_generator_service.document_generator.mysql_data_extractor
+        extractor.retrieve_mysql_data_batch.return_value = {"mdp.001": {"rights": 1}, "mdp.002": {"rights": 2}}
+        process_pool = Mock()
+        process_pool.submit.side_effect = lambda *args: make_future({"ocr": "text"})
+        pending = {}
+
+        with ThreadPoolExecutor(max_workers=1) as thread_pool:
+            document_generator_service.submit_documents([({"ht_id": "mdp.001"}, 1), ({"ht_id": "mdp.002"}, 2)],
+                                                        pending, {}, process_pool, thread_pool)
+            document_generator_service.complete_documents(pending, block=True)
+
+        extractor.retrieve_mysql_data_batch.assert_called_once_with(["mdp.001", "mdp.002"])
+        extractor.retrieve_mysql_data.assert_not_called()
+        published = [call.args[0] for call in
+                     document_generator_service.tgt_queue_producer.publish_messages.call_args_list]
+        assert sorted(published, key=lambda document: document["id"]) == [
+            {"id": "mdp.001", "ocr": "text", "rights": 1}, {"id": "mdp.002", "ocr": "text", "rights": 2}]
+
+    def test_consume_messages_concurrently_drain_pending_documents(self, document_generator_service):
+        """Use case: When the consumer stops, the documents in flight are published and their messages are
+        acknowledged"""
+        document_generator_service.src_queue_consumer.queue_manager.batch_size = 10
+        document_generator_service.document_generator.mysql_data_extractor = Mock()
+        document_generator_service.document_generator.mysql_data_extractor.retrieve_mysql_data_batch.return_value = {}
+        frames = [(Mock(delivery_tag=tag), Mock(content_encoding=None), orjson.dumps({"ht_id": f"mdp.00{tag}"}))
+                  for tag in (1, 2)]
+        document_generator_service.src_queue_consumer.consume_message.return_value = iter(frames)
+
+        with patch("document_generator.document_generator_service.ProcessPoolExecutor", ThreadPoolExecutor), \
+                patch("document_generator.document_generator_service.generate_document_text_fields",
+                      return_value={"ocr": "text"}):
+            document_generator_service.consume_messages_concurrently()
+
+        assert document_generator_service.tgt_queue_producer.publish_messages.call_count == 2
+        acknowledged = [call.args[1] for call in
+                        document_generator_service.src_queue_consumer.positive_acknowledge.call_args_list]
+        assert sorted(acknowledged) == [1, 2]
+
+    def test_submit_documents_check_fingerprints_without_blocking(self):
+        """Use case: The fingerprints of a batch are checked by the thread pool, so submit_documents does not wait
+        for MySQL. Once the check is done, the unchanged items are skipped and the rest of them are generated"""
+        fingerprint_store = Mock()
+        fingerprint_store.get_fingerprints.return_value = {"mdp.001": "fingerprint_mdp.001"}
+        service = DocumentGeneratorService(Mock(), Mock(), Mock(), document_repository="local", workers=2,
+                                           fingerprint_store=fingerprint_store)
+        service.document_generator.mysql_data_extractor = Mock()
+        mysql_called = threading.Event()
+        release_mysql = threading.Event()
+
+        def retrieve_mysql_data_batch(ht_ids):
+            mysql_called.set()
+            release_mysql.wait(timeout=5)
+            return {"mdp.002": {"rights": 2}}
+
+        service.document_generator.mysql_data_extractor.retrieve_mysql_data_batch.side_effect = (
+            retrieve_mysql_data_batch)
+        process_pool = Mock()
+        process_pool.submit.side_effect = lambda *args: make_future({"ocr": "text"})
+        pending, pending_batches = {}, {}
+
+        with patch("document_generator.document_generator_service.compute_fingerprint",
+                   side_effect=lambda source_path, message, mysql_metadata: f"fingerprint_{message['ht_id']}"), \
+                ThreadPoolExecutor(max_workers=1) as thread_pool:
+            service.submit_documents([({"ht_id": "mdp.001"}, 1), ({"ht_id": "mdp.002"}, 2)], pending,
+                                     pending_batches, process_pool, thread_pool)
+            assert mysql_called.wait(timeout=5)
+            assert len(pending_batches) == 1 and pending == {}
+            release_mysql.set()
+            service.drain_documents(pending, pending_batches, process_pool)
+
+        fingerprint_store.mark_completed.assert_called_once_with(["mdp.001"])
+        service.tgt_queue_producer.publish_messages.assert_called_once_with(
+            {"id": "mdp.002", "ocr": "text", "rights": 2})
+        fingerprint_store.save_pending_fingerprints.assert_called_once_with({"mdp.002": "fingerprint_mdp.002"})
+        acknowledged = [call.args[1] for call in service.src_queue_consumer.positive_acknowledge.call_args_list]
+        assert sorted(acknowledged) == [1, 2]
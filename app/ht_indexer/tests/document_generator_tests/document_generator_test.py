@@ -5,9 +5,13 @@ import zipfile
 from pathlib import Path
 from xml.sax.saxutils import quoteattr
 
+import orjson
 import pytest
 from _pytest.outcomes import Failed
-from document_generator.full_text_document_generator import FullTextDocumentGenerator
+from document_generator.full_text_document_generator import (
+    FullTextDocumentGenerator,
+    get_document_size,
+)
 from document_generator.mysql_data_extractor import extract_namespace_and_id
 from ht_utils.text_processor import string_preparation
 
@@ -85,12 +89,51 @@ class TestDocumentGenerator:
         except Failed:
             assert 0 == 0
 
+    def test_full_text_field_sorted_pages(self, tmp_path):
+        """ The pages are concatenated sorted by name and the files inside __MACOSX directory are ignored """
+        zip_doc_path = tmp_path / "test.zip"
+        with zipfile.ZipFile(zip_doc_path, mode="w") as zip_doc:
+            zip_doc.writestr("test/00000002.txt", "second page\n")
+            zip_doc.writestr("test/00000001.txt", 'first "page"')
+            zip_doc.writestr("__MACOSX/test/._00000001.txt", b"\xff\xfe")
+            zip_doc.writestr("test/00000001.jp2", b"image")
+
+        full_text = FullTextDocumentGenerator.get_full_text_field(str(zip_doc_path))
+
+        assert full_text == " ".join([string_preparation(b'first "page"'), string_preparation(b"second page")])
+
+    def test_get_document_size(self):
+        """ The size of the entry is computed without serializing the ocr field """
+        entry = {"id": "mdp.39015078560292",
+                 "ocr": quoteattr('Robinson "Crusoe"\tDefoe\\ Rābinsan Krūso') + " " + quoteattr("page 2"),
+                 "title": ["The adventures of Robinson Crusoe"]}
+
+        assert get_document_size(entry) == len(orjson.dumps(entry))
+
+    def test_get_document_size_control_characters(self):
+        """ The escape sequences of all the control characters are counted, e.g. \\f (2 bytes) and \\u0001 """
+        entry = {"id": "mdp.39015078560292",
+                 "ocr": "page 1\fpage 2\x01\x1f\b\r\n" + "".join(chr(code) for code in range(0x20))}
+
+        assert get_document_size(entry) == len(orjson.dumps(entry))
+
     def test_create_allfields_field(self, get_fullrecord_xml, get_allfield_string):
         all_field = FullTextDocumentGenerator.get_all_fields_field(get_fullrecord_xml)
 
         assert len(all_field.strip()) == len(get_allfield_string.strip())
         assert all_field.strip() == get_allfield_string.strip()
 
+    def test_create_allfields_field_large_record(self):
+        """All the subfields of a large record are included, also the data fields crossing the chunks of the parser"""
+        data_fields = "".join(f'<datafield tag="974"><subfield code="u">mdp.{item}</subfield>'
+                              f'<subfield code="z">v. {item}</subfield><subfield code="r"/></datafield>'
+                              for item in range(2000))
+        catalog_xml = (f'<record xmlns="http://www.loc.gov/MARC21/slim"><controlfield tag="001">1</controlfield>'
+                       f'<datafield tag="035"><subfield code="a">(OCoLC)1</subfield></datafield>{data_fields}</record>')
+
+        all_field = FullTextDocumentGenerator.get_all_fields_field(catalog_xml)
+        assert all_field == quoteattr(" ".join(f"mdp.{item} v. {item}" for item in range(2000)))
+
     def test_extract_namespace_and_id(self):
         """
         Extracts the namespace and the id from a given document id string.
@@ -0,0 +1,37 @@
+import pytest
+from document_generator.fingerprint import compute_fingerprint
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    (tmp_path / "mdp.39015078560292.zip").write_bytes(b"zip content")
+    (tmp_path / "mdp.39015078560292.mets.xml").write_bytes(b"<mets/>")
+    return str(tmp_path / "mdp.39015078560292")
+
+
+class TestFingerprint:
+
+    def test_compute_fingerprint_unchanged_inputs(self, source_path):
+        """The fingerprint does not depend on the order of the members and coll_ids retrieved from MySQL"""
+        message = {"ht_id": "mdp.39015078560292", "fullrecord": "<record/>", "title": ["Robinson Crusoe"]}
+
+        fingerprint = compute_fingerprint(source_path, message, {"rights": 1, "ht_heldby": ["umich", "harvard"]})
+
+        assert fingerprint == compute_fingerprint(source_path, dict(message),
+                                                  {"rights": 1, "ht_heldby": ["harvard", "umich"]})
+
+    def test_compute_fingerprint_changed_inputs(self, source_path):
+        message = {"ht_id": "mdp.39015078560292", "fullrecord": "<record/>"}
+        fingerprint = compute_fingerprint(source_path, message, {"rights": 1})
+
+        # Catalog record, rights and METS file
+        assert fingerprint != compute_fingerprint(source_path, {**message, "fullrecord": "<record>1</record>"},
+                                                  {"rights": 1})
+        assert fingerprint != compute_fingerprint(source_path, message, {"rights": 2})
+        with open(f"{source_path}.mets.xml", "wb") as mets_file:
+            mets_file.write(b"<mets>new</mets>")
+        assert fingerprint != compute_fingerprint(source_path, message, {"rights": 1})
+
+    def test_compute_fingerprint_without_zip(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            compute_fingerprint(str(tmp_path / "mdp.001"), {"ht_id": "mdp.001"}, {})
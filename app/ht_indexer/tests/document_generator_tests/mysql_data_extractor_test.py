@@ -0,0 +1,57 @@
+from unittest.mock import Mock
+
+import pytest
+from document_generator.mysql_data_extractor import MysqlMetadataExtractor
+
+
+def fake_query_mysql(query: str, params: tuple = None) -> list[dict]:
+    """Return fake rows for each one of the tables used by MysqlMetadataExtractor"""
+    if "rights_current" in query:
+        return [{"namespace": "mdp", "id": "39015078560292", "attr": 1}]
+    if "holdings_htitem_htmember" in query:
+        return [
+            {"volume_id": "mdp.39015078560292", "member_id": "umich", "access_count": 1},
+            {"volume_id": "mdp.39015078560292", "member_id": "yale", "access_count": 0},
+            {"volume_id": "uc2.ark:/13960/t4mk66f1d", "member_id": "ucla", "access_count": 0},
+        ]
+    if "mb_coll_item" in query:
+        return [{"extern_item_id": "uc2.ark:/13960/t4mk66f1d", "MColl_ID": 123}]
+    return []
+
+
+@pytest.fixture
+def mysql_metadata_extractor():
+    db_conn = Mock()
+    db_conn.query_mysql.side_effect = fake_query_mysql
+    return MysqlMetadataExtractor(db_conn)
+
+
+class TestMysqlMetadataExtractor:
+
+    def test_retrieve_mysql_data_batch(self, mysql_metadata_extractor):
+        """Use case: The MySQL fields of a batch of documents are retrieved with three queries"""
+        doc_ids = ["mdp.39015078560292", "uc2.ark:/13960/t4mk66f1d", "mdp.39015078560292"]
+
+        entries = mysql_metadata_extractor.retrieve_mysql_data_batch(doc_ids)
+
+        assert mysql_metadata_extractor.mysql_obj.query_mysql.call_count == 3
+        assert len(entries) == 2
+
+        assert entries["mdp.39015078560292"] == {
+            "rights": 1,
+            "ht_heldby": ["umich", "yale"],
+            "ht_heldby_brlm": ["umich"],
+            "coll_id": [0]
+        }
+        assert entries["uc2.ark:/13960/t4mk66f1d"] == {
+            "ht_heldby": ["ucla"],
+            "coll_id": [123]
+        }
+
+    def test_retrieve_mysql_data_batch_bind_parameters(self, mysql_metadata_extractor):
+        """Use case: The rights query binds the namespace and the id of each document"""
+        mysql_metadata_extractor.add_rights_field_batch(["uc2.ark:/13960/t4mk66f1d"])
+
+        query, params = mysql_metadata_extractor.mysql_obj.query_mysql.call_args[0]
+        assert "(namespace, id) IN ((%s, %s))" in query
+        assert params == ("uc2", "ark:/13960/t4mk66f1d")
@@ -0,0 +1,223 @@
+import queue
+import threading
+from unittest.mock import MagicMock, Mock, patch
+
+import orjson
+import pytest
+import requests
+from document_indexer_service.document_indexer_service import DocumentIndexerQueueService
+from ht_queue_service.claim_check_store import ClaimCheckStore
+
+
+def solr_response(body: bytes) -> MagicMock:
+    """Solr answers 400 if any document of the request has the id "bad" """
+    status_code = 400 if any(doc["id"].startswith("bad") for doc in orjson.loads(body)) else 200
+    response = MagicMock(status_code=status_code, ok=status_code == 200)
+    if status_code != 200:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=response)
+    return response
+
+
+class FakeConnection:
+    """Run the callbacks added by the worker threads when the connection processes the events"""
+
+    def __init__(self):
+        self.callbacks = queue.Queue()
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.put(callback)
+
+    def process_data_events(self, time_limit=0):
+        try:
+            self.callbacks.get(timeout=time_limit)()
+        except queue.Empty:
+            pass
+
+
+def make_indexer_service(in_flight_batches: int = 1) -> DocumentIndexerQueueService:
+    def init_consumer(self, queue_params):
+        self.prefetch_batches = 2
+        self.stop_requested = False
+
+    with patch("ht_queue_service.queue_multiple_consumer.QueueMultipleConsumer.__init__", init_consumer):
+        solr_api = Mock()
+        solr_api.index_serialized_documents.side_effect = lambda documents, *args: solr_response(
+            b"[" + b",".join(b"".join(chunks) for _, chunks in documents) + b"]"
+        )
+        service = DocumentIndexerQueueService(solr_api, Mock(), in_flight_batches=in_flight_batches)
+    service.channel = Mock(is_open=True)
+    service.channel.connection = FakeConnection()
+    service.queue_manager = Mock()
+    service.positive_acknowledge = Mock()
+    service.reject_message = Mock()
+    return service
+
+
+@pytest.fixture
+def indexer_service():
+    return make_indexer_service()
+
+
+def acknowledged_tags(service, delivery_tags: list[int]) -> list[int]:
+    """The messages are acknowledged with a single ack (multiple=True) after rejecting the failed ones"""
+    service.positive_acknowledge.assert_called_once()
+    assert service.positive_acknowledge.call_args.kwargs == {"multiple": True}
+    last_tag = service.positive_acknowledge.call_args.args[1]
+    return [tag for tag in delivery_tags if tag <= last_tag and tag not in rejected_tags(service)]
+
+
+def rejected_tags(service) -> list[int]:
+    return [call.args[1] for call in service.reject_message.call_args_list]
+
+
+class TestDocumentIndexerQueueService:
+
+    def test_process_batch_success(self, indexer_service):
+        batch = [{"id": f"mdp.{i}"} for i in range(4)]
+
+        indexer_service.process_batch(batch, [1, 2, 3, 4])
+
+        assert acknowledged_tags(indexer_service, [1, 2, 3, 4]) == [1, 2, 3, 4]
+        assert rejected_tags(indexer_service) == []
+        assert indexer_service.solr_api_full_text.index_serialized_documents.call_count == 1
+
+    def test_process_batch_bisection(self, indexer_service):
+        """Use case: Only the documents rejected by Solr are sent to the Dead Letter Queue"""
+        batch = [{"id": f"mdp.{i}"} for i in range(8)]
+        batch[2] = {"id": "bad.2"}
+        batch[7] = {"id": "bad.7"}
+
+        indexer_service.process_batch(batch, list(range(8)))
+
+        assert acknowledged_tags(indexer_service, list(range(8))) == [0, 1, 3, 4, 5, 6]
+        assert rejected_tags(indexer_service) == [2, 7]
+        # 2 halves, 2 quarters of each half and 2 singletons of each failed quarter
+        assert indexer_service.indexing_metrics == {"failed_batches": 1, "bisection_requests": 10,
+                                                    "failed_documents": 2}
+
+    def test_process_batch_solr_not_available(self, indexer_service):
+        """Use case: If Solr is not available, the batch is not split and all the messages are rejected"""
+        indexer_service.solr_api_full_text.index_serialized_documents.side_effect = (
+            requests.exceptions.ConnectionError("Solr not available")
+        )
+
+        indexer_service.process_batch([{"id": f"mdp.{i}"} for i in range(4)], [1, 2, 3, 4])
+
+        indexer_service.positive_acknowledge.assert_not_called()
+        assert rejected_tags(indexer_service) == [1, 2, 3, 4]
+        assert indexer_service.indexing_metrics["bisection_requests"] == 0
+
+    def test_process_batch_atomic_updates(self, indexer_service):
+        """Use case: The metadata-only updates are sent to the update handler, the documents to the JSON docs
+        handler"""
+        requests_by_handler = {}
+
+        def index_serialized_documents(documents, solr_url_json="update/json/docs"):
+            requests_by_handler[solr_url_json] = [orjson.loads(b"".join(chunks))["id"] for _, chunks in documents]
+            return solr_response(b"[]")
+
+        indexer_service.solr_api_full_text.index_serialized_documents.side_effect = index_serialized_documents
+        batch = [{"id": "mdp.1", "ocr": "text"}, {"id": "mdp.2", "rights": {"set": 1}, "ht_heldby": {"set": None}}]
+
+        indexer_service.process_batch(batch, [1, 2])
+
+        assert requests_by_handler == {"update/json/docs": ["mdp.1"], "update": ["mdp.2"]}
+        assert acknowledged_tags(indexer_service, [1, 2]) == [1, 2]
+
+    def test_process_batch_claim_check_references(self, indexer_service, tmp_path):
+        """Use case: The documents of the indexed references are deleted. The document of the message sent to the
+        Dead Letter Queue is kept, so the message can be requeued"""
+        claim_check_store = ClaimCheckStore(str(tmp_path))
+        indexer_service.claim_check_store = claim_check_store
+        batch = [claim_check_store.store({"id": "mdp.1"}), claim_check_store.store({"id": "bad.2"})]
+
+        indexer_service.process_batch(list(batch), [1, 2])
+
+        assert rejected_tags(indexer_service) == [2]
+        assert not (tmp_path / batch[0]["path"]).exists()
+        assert (tmp_path / batch[1]["path"]).exists()
+
+    def test_process_batch_claim_check_without_store(self, indexer_service, tmp_path):
+        """Use case: The references received by an indexer without claim-check store are sent to the Dead Letter
+        Queue, and their documents are not deleted"""
+        reference = ClaimCheckStore(str(tmp_path)).store({"id": "mdp.1"})
+
+        indexer_service.process_batch([reference, {"id": "mdp.2"}], [1, 2])
+
+        assert rejected_tags(indexer_service) == [1]
+        assert (tmp_path / reference["path"]).exists()
+
+    def test_process_batch_update_fingerprints(self, indexer_service):
+        """Use case: The fingerprints of the indexed documents are confirmed and the ones of the documents sent to
+        the Dead Letter Queue are removed, so they are generated again when they are requeued. The atomic updates do
+        not confirm any fingerprint"""
+        indexer_service.fingerprint_store = Mock()
+        batch = [{"id": "mdp.1"}, {"id": "bad.2"}, {"id": "mdp.3", "rights": {"set": 1}}]
+
+        indexer_service.process_batch(batch, [1, 2, 3])
+
+        assert rejected_tags(indexer_service) == [2]
+        indexer_service.fingerprint_store.remove.assert_called_once_with(["bad.2"])
+        indexer_service.fingerprint_store.confirm_fingerprints.assert_called_once_with(["mdp.1"])
+
+    def test_commit_when_service_stops(self, indexer_service):
+        with patch("ht_queue_service.queue_multiple_consumer.QueueMultipleConsumer.start_consuming"):
+            indexer_service.start_consuming()
+
+        indexer_service.solr_api_full_text.commit_pending_documents.assert_called_once()
+
+
+class TestPipelinedDocumentIndexerQueueService:
+
+    def test_batches_settled_in_order(self):
+        """Use case: The batches are indexed by worker threads, and they are acknowledged in the order they were
+        consumed, even if a later batch is indexed first"""
+        service = make_indexer_service(in_flight_batches=2)
+        assert service.prefetch_batches == 3
+        first_batch_indexed = threading.Event()
+        index_messages = service.index_messages
+
+        def slow_first_batch(messages):
+            if messages[0]["id"] == "mdp.1":
+                first_batch_indexed.wait(timeout=5)
+            index_messages(messages)
+
+        def fast_next_batches(messages):
+            index_messages(messages)
+            first_batch_indexed.set()
+
+        service.index_messages = lambda messages: (slow_first_batch if messages[0]["id"] == "mdp.1"
+                                                   else fast_next_batches)(messages)
+
+        service.process_batch([{"id": "mdp.1"}, {"id": "mdp.2"}], [1, 2])
+        service.process_batch([{"id": "mdp.3"}, {"id": "bad.4"}], [3, 4])
+        # The third batch waits until one of the in-flight batches is settled
+        service.process_batch([{"id": "mdp.5"}], [5])
+        service.wait_in_flight_batches()
+
+        assert [call.args[1] for call in service.positive_acknowledge.call_args_list] == [2, 3, 5]
+        assert rejected_tags(service) == [4]
+        assert service.submitted_batches == service.settled_batches == 3
+        service.indexing_executor.shutdown()
+
+    def test_stop_requested_while_batches_in_flight(self):
+        """Use case: Kubernetes stops the pod (SIGTERM) while a batch is indexed by a worker thread. The service
+        stops consuming, waits for the in-flight batch to be settled and commits the indexed documents"""
+        service = make_indexer_service(in_flight_batches=2)
+        service.channel.is_closed = False
+        service.channel.consume.return_value = iter([
+            (Mock(delivery_tag=tag), Mock(content_encoding=None), orjson.dumps({"id": f"mdp.{tag}"}))
+            for tag in range(1, 5)
+        ])
+        service.queue_manager = Mock(batch_size=2)
+        service.max_linger_time = 60
+        service.shutdown_on_empty_queue = False
+        process_batch = service.process_batch
+        service.process_batch = lambda batch, delivery_tags: service.request_stop() or process_batch(batch,
+                                                                                                    delivery_tags)
+
+        service.start_consuming()
+
+        assert acknowledged_tags(service, [1, 2, 3, 4]) == [1, 2]
+        assert service.submitted_batches == service.settled_batches == 1
+        service.solr_api_full_text.commit_pending_documents.assert_called_once()
@@ -1,9 +1,18 @@
 import os
+import threading
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+import orjson
 import pytest
-from ht_indexer_api.ht_indexer_api import HTSolrAPI
+from ht_indexer_api.ht_indexer_api import (
+    COMMIT_WITHIN,
+    HARD_COMMIT,
+    NO_COMMIT,
+    SOFT_COMMIT,
+    HTSolrAPI,
+    split_documents_by_size,
+)
 
 
 @pytest.fixture
@@ -53,3 +62,142 @@ class TestHTSolrAPI:
 
         # Assert
         assert response.status_code == 200
+
+    @patch('ht_utils.solr_client.SolrClient.post')
+    def test_index_serialized_documents(self, mock_post, get_solr_api):
+        """The serialized documents are streamed as a JSON array in the body of the request"""
+        documents = [{"id": "mdp.39015078560292"}, {"id": "mdp.39015078560293", "title": ["Robinson Crusoe"]}]
+        mock_post.side_effect = lambda url, data, **kwargs: MagicMock(status_code=200, body=b"".join(data))
+
+        response = get_solr_api.index_serialized_documents(
+            (len(orjson.dumps(doc)), iter([orjson.dumps(doc)[:10], orjson.dumps(doc)[10:]])) for doc in documents
+        )
+
+        assert orjson.loads(response.body) == documents
+
+    @patch('ht_utils.solr_client.SolrClient.post')
+    def test_send_solr_json_request(self, mock_post, get_solr_api):
+        """The parameters of the query are sent in the JSON body of the request, not in the URL"""
+        mock_post.return_value = MagicMock(status_code=200)
+        solr_params = {"q": "*:*", "fq": "{!terms f=ht_id}" + ",".join(f"mdp.{i}" for i in range(5000))}
+
+        get_solr_api.send_solr_json_request("http://solr-lss-dev:8983/solr/catalog/query", solr_params)
+
+        assert mock_post.call_args.kwargs["json"] == {"params": solr_params}
+        assert "params" not in mock_post.call_args.kwargs
+
+    @patch('ht_utils.solr_client.SolrClient.post')
+    def test_index_documents_split_by_size(self, mock_post, get_solr_api):
+        """A batch bigger than max_bytes_per_request is sent in several requests"""
+        documents = [{"id": f"mdp.3901507856029{i}", "ocr": "Robinson Crusoe " * 100} for i in range(5)]
+        requests_body = []
+
+        def post(url, data, **kwargs):
+            requests_body.append(b"".join(data))
+            return MagicMock(status_code=200, ok=True)
+
+        mock_post.side_effect = post
+        get_solr_api.max_bytes_per_request = 2 * len(orjson.dumps(documents[0])) + 3
+
+        get_solr_api.index_documents(documents)
+
+        assert [len(orjson.loads(body)) for body in requests_body] == [2, 2, 1]
+        assert all(len(body) <= get_solr_api.max_bytes_per_request for body in requests_body)
+        assert [doc for body in requests_body for doc in orjson.loads(body)] == documents
+
+    @patch('ht_utils.solr_client.SolrClient.post')
+    def test_index_documents_stop_at_failed_request(self, mock_post, get_solr_api):
+        documents = [{"id": f"mdp.3901507856029{i}"} for i in range(3)]
+        mock_post.side_effect = lambda url, data, **kwargs: MagicMock(status_code=503, ok=False, body=b"".join(data))
+        get_solr_api.max_bytes_per_request = 1
+
+        response = get_solr_api.index_documents(documents)
+
+        assert response.status_code == 503
+        assert mock_post.call_count == 1
+
+
+class TestSplitDocumentsBySize:
+
+    def test_document_bigger_than_max_bytes_is_sent_alone(self):
+        documents = [(10, (b"",)), (100, (b"",)), (10, (b"",)), (10, (b"",))]
+
+        groups = list(split_documents_by_size(documents, 30))
+
+        assert [[size for size, _ in group] for group in groups] == [[10], [100], [10, 10]]
+
+
+class TestCommitPolicy:
+
+    @pytest.mark.parametrize("commit_policy, update_params", [
+        (NO_COMMIT, {}),
+        (COMMIT_WITHIN, {"commitWithin": 5000}),
+        (SOFT_COMMIT, {"softCommit": "true"}),
+        (HARD_COMMIT, {}),
+    ])
+    def test_update_params(self, commit_policy, update_params):
+        solr_api = HTSolrAPI("http://solr-lss-dev:8983/solr/core-x/", commit_policy=commit_policy,
+                             commit_within_ms=5000)
+
+        assert solr_api.get_update_params() == update_params
+
+    def test_unsupported_commit_policy(self):
+        with pytest.raises(ValueError):
+            HTSolrAPI("http://solr-lss-dev:8983/solr/core-x/", commit_policy="always")
+
+    @patch('ht_utils.solr_client.SolrClient.post')
+    def test_hard_commit_every_documents(self, mock_post):
+        """A hard commit is sent every commit_every_documents indexed documents"""
+        solr_api = HTSolrAPI("http://solr-lss-dev:8983/solr/core-x/", commit_policy=HARD_COMMIT,
+                             commit_every_documents=4)
+
+        def post(url, data=None, **kwargs):
+            if data is not None:
+                b"".join(data)
+            return MagicMock(status_code=200, ok=True)
+
+        mock_post.side_effect = post
+
+        for i in range(3):
+            solr_api.index_documents([{"id": f"mdp.{i}.1"}, {"id": f"mdp.{i}.2"}])
+
+        commit_calls = [call for call in mock_post.call_args_list if call.kwargs["params"] == {"commit": "true"}]
+        assert len(commit_calls) == 1
+        assert solr_api.uncommitted_documents == 2
+
+        # The pending documents are committed when the indexer stops
+        solr_api.commit_pending_documents()
+        solr_api.commit_pending_documents()
+        commit_calls = [call for call in mock_post.call_args_list if call.kwargs["params"] == {"commit": "true"}]
+        assert len(commit_calls) == 2
+        assert solr_api.uncommitted_documents == 0
+
+    @patch('ht_utils.solr_client.SolrClient.post')
+    def test_commit_pending_documents_while_indexing(self, mock_post):
+        """Use case: A worker thread counts its indexed documents while the pending documents are committed. The
+        counter is not reset after the commit, so the new documents are committed later"""
+        solr_api = HTSolrAPI("http://solr-lss-dev:8983/solr/core-x/", commit_policy=HARD_COMMIT)
+        solr_api.uncommitted_documents = 2
+        commit_started = threading.Event()
+        release_commit = threading.Event()
+
+        def post(url, **kwargs):
+            commit_started.set()
+            release_commit.wait(timeout=5)
+            return MagicMock(status_code=200, ok=True)
+
+        mock_post.side_effect = post
+
+        commit_thread = threading.Thread(target=solr_api.commit_pending_documents)
+        commit_thread.start()
+        commit_started.wait(timeout=5)
+        count_thread = threading.Thread(target=solr_api.count_indexed_documents, args=(1,))
+        count_thread.start()
+        # The worker thread waits until the commit finishes
+        count_thread.join(timeout=0.1)
+        assert count_thread.is_alive()
+        release_commit.set()
+        commit_thread.join()
+        count_thread.join()
+
+        assert solr_api.uncommitted_documents == 1
@@ -1,7 +1,8 @@
+import copy
 import json
 import os
 from typing import Any
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, Mock
 
 import pytest
 from conftest import create_test_queue_config
@@ -81,15 +82,59 @@ class TestFullTextRetrieverService:
         output = json.loads(response.content.decode("utf-8"))
         assert output.get("response").get("numFound") == 1
 
-    def test_generate_metadata(self, get_item_metadata):
-        """Use case: Generate the metadata of the item to be indexed"""
-        list_documents = ['mdp.39015078560292']
+    def test_get_missing_ids(self):
+        """Use case: The ids without items to publish (e.g. not found in the catalog) are failed in MySQL"""
+        record_metadata = Mock(record={"id": "001"})
+        items = [Mock(ht_id="mdp.1", record_metadata=record_metadata)]
 
-        metadata, item_id = FullTextSearchRetrieverQueueService.generate_metadata(get_item_metadata)
+        assert FullTextSearchRetrieverQueueService.get_missing_ids(["mdp.1", "mdp.2"], items, "item") == ["mdp.2"]
+        assert FullTextSearchRetrieverQueueService.get_missing_ids(["001", "002"], items, "record") == ["002"]
 
-        assert metadata.get("ht_id") == list_documents[0]
-        assert metadata.get('countryOfPubStr') == ['India']
-        assert item_id == list_documents[0]
+    def test_publishing_documents_marks_only_confirmed_items(self):
+        """Use case: The items not confirmed by the broker are marked as failed in MySQL"""
+        records = [Mock(ht_id=ht_id, metadata={"id": "008394936"}) for ht_id in ["mdp.1", "mdp.2", "mdp.3"]]
+        queue_producer = Mock()
+        queue_producer.publish_many.side_effect = lambda messages: (
+            [messages[0], messages[2]], [(messages[1], Exception("nack"))]
+        )
+        mysql_db = MagicMock()
+
+        FullTextSearchRetrieverQueueService.publishing_documents(queue_producer, records, mysql_db)
+
+        failed_call, processed_call = mysql_db.update_by_keys.call_args_list
+        assert processed_call.args[1][0]["keys"] == ["mdp.1", "mdp.3"]
+        assert processed_call.args[1][0]["retriever_status"] == "completed"
+        assert failed_call.args[1][0]["keys"] == ["mdp.2"]
+        assert failed_call.args[1][0]["retriever_status"] == "failed"
+
+    def test_generate_chunk_metadata_by_item(self, get_record_data):
+        """Use case: Only the requested items of each record returned by Solr are processed"""
+        second_record = copy.deepcopy(get_record_data)
+        second_record["id"] = "008394937"
+        second_record["ht_id"] = ["inu.30000108625017", "inu.30000108625018"]
+        second_record["htsource"] = ["Indiana University"]
+        solr_output = {"response": {"docs": [get_record_data, second_record]}}
+
+        record_metadata_list = FullTextSearchRetrieverQueueService.generate_chunk_metadata(
+            ["inu.30000108625018", "mdp.39015078560292"], solr_output, by_field="item")
+
+        assert [record.ht_id for record in record_metadata_list] == ["mdp.39015078560292", "inu.30000108625018"]
+
+    def test_generate_chunk_metadata_malformed_marc_record(self, get_record_data):
+        """Use case: A record with a malformed MARC record is skipped, its requested items are returned as failed
+        with the parser error, and the rest of the records of the chunk are processed"""
+        malformed_record = copy.deepcopy(get_record_data)
+        malformed_record["id"] = "008394937"
+        malformed_record["ht_id"] = ["inu.30000108625017", "inu.30000108625018"]
+        malformed_record["fullrecord"] = "<record><datafield tag='245'>"
+        solr_output = {"response": {"docs": [get_record_data, malformed_record]}}
+        failed_ids = {}
+
+        record_metadata_list = FullTextSearchRetrieverQueueService.generate_chunk_metadata(
+            ["inu.30000108625018", "mdp.39015078560292"], solr_output, by_field="item", failed_ids=failed_ids)
+
+        assert [record.ht_id for record in record_metadata_list] == ["mdp.39015078560292"]
+        assert list(failed_ids.values()) == [["inu.30000108625018"]]
 
     def test_full_text_search_retriever_service(self, get_retriever_service_solr_parameters: dict[str, Any],
                                                 solr_catalog_url: str,
@@ -1,3 +1,5 @@
+from unittest.mock import Mock
+
 from document_retriever_service.retriever_services_utils import RetrieverServicesUtils
 
 
@@ -38,3 +40,17 @@ class TestRetrieverServicesUtils:
 
         # Empty list
         assert RetrieverServicesUtils.extract_catalog_record_id([]) == []
+
+    def test_publish_documents(self):
+        """The metadata of all the items is published in one call"""
+        records = [Mock(ht_id=ht_id, metadata={"id": "008394936"}) for ht_id in ["mdp.1", "mdp.2"]]
+        queue_producer = Mock()
+        queue_producer.publish_many.side_effect = lambda messages: (messages, [])
+
+        confirmed_messages, failed_messages = RetrieverServicesUtils.publish_documents(queue_producer, records)
+
+        queue_producer.publish_many.assert_called_once()
+        assert confirmed_messages == [{"id": "008394936", "ht_id": "mdp.1"}, {"id": "008394936", "ht_id": "mdp.2"}]
+        assert failed_messages == []
+        # The metadata of the items is not modified
+        assert [record.metadata for record in records] == [{"id": "008394936"}, {"id": "008394936"}]
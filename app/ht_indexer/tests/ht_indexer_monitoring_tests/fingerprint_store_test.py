@@ -0,0 +1,62 @@
+from unittest.mock import Mock
+
+from ht_indexer_monitoring.fingerprint_store import (
+    FINGERPRINT_QUERY_BATCH_SIZE,
+    SAVE_PENDING_FINGERPRINT_COLUMNS,
+    SAVE_PENDING_FINGERPRINT_ON_DUPLICATE,
+    SAVE_PENDING_FINGERPRINT_STATEMENT,
+    FingerprintStore,
+)
+from ht_indexer_monitoring.ht_indexer_tracktable import PROCESSING_STATUS_TABLE_NAME
+
+
+class TestFingerprintStore:
+
+    def test_get_and_save_fingerprints(self):
+        db_conn = Mock()
+        db_conn.query_mysql.return_value = [{"ht_id": "mdp.001", "fingerprint": "abc"}]
+        fingerprint_store = FingerprintStore(db_conn)
+
+        assert fingerprint_store.get_fingerprints(["mdp.001", "mdp.002", "mdp.001"]) == {"mdp.001": "abc"}
+        query, params = db_conn.query_mysql.call_args.args
+        assert params == {"ht_id_0": "mdp.001", "ht_id_1": "mdp.002"}
+        assert query.endswith("ht_id IN (:ht_id_0, :ht_id_1)")
+        # Only the fingerprints confirmed by the indexer are compared
+        assert "fingerprint IS NOT NULL" in query
+
+        fingerprint_store.save_pending_fingerprints({"mdp.002": "def"})
+        db_conn.insert_rows.assert_called_once_with(SAVE_PENDING_FINGERPRINT_STATEMENT,
+                                                    SAVE_PENDING_FINGERPRINT_COLUMNS,
+                                                    [{"ht_id": "mdp.002", "pending_fingerprint": "def"}],
+                                                    on_duplicate=SAVE_PENDING_FINGERPRINT_ON_DUPLICATE)
+
+    def test_mark_completed_by_batch(self):
+        """Use case: The skipped items are marked as completed in the tracktable, with one query per batch of
+        items"""
+        db_conn = Mock()
+        ht_ids = [f"mdp.{item}" for item in range(1001)]
+
+        FingerprintStore(db_conn).mark_completed(ht_ids)
+
+        db_conn.update_by_keys.assert_called_once()
+        query, values = db_conn.update_by_keys.call_args.args
+        assert query.startswith(f"UPDATE {PROCESSING_STATUS_TABLE_NAME}") and query.endswith("WHERE ht_id IN :keys")
+        assert [len(batch["keys"]) for batch in values] == [1000, 1]
+        assert values[0]["status"] == values[0]["generator_status"] == values[0]["indexer_status"] == "completed"
+        assert values[0]["error"] is None
+
+    def test_confirm_and_remove_fingerprints(self):
+        """Use case: The fingerprints are confirmed and removed in batches of FINGERPRINT_QUERY_BATCH_SIZE items"""
+        db_conn = Mock()
+        fingerprint_store = FingerprintStore(db_conn)
+        ht_ids = [f"mdp.{item}" for item in range(FINGERPRINT_QUERY_BATCH_SIZE + 1)]
+
+        fingerprint_store.confirm_fingerprints(ht_ids)
+        fingerprint_store.remove(["mdp.002"])
+        fingerprint_store.confirm_fingerprints([])
+
+        (confirm_query, confirm_values), (remove_query, remove_values) = [
+            call.args for call in db_conn.update_by_keys.call_args_list]
+        assert confirm_query.startswith("UPDATE") and "fingerprint = pending_fingerprint" in confirm_query
+        assert confirm_values == [{"keys": ht_ids[:FINGERPRINT_QUERY_BATCH_SIZE]}, {"keys": ht_ids[-1:]}]
+        assert remove_query.startswith("DELETE") and remove_values == [{"keys": ["mdp.002"]}]
@@ -5,9 +5,13 @@ from unittest.mock import Mock
 import pytest
 from ht_indexer_monitoring.ht_indexer_tracktable import (
     PROCESSING_STATUS_TABLE_NAME,
+    RESET_ITEM_STATUS,
+    TRACKTABLE_INDEXES,
     HTIndexerTrackData,
     HTIndexerTracktable,
+    split_id_range,
 )
+from sqlalchemy.exc import SQLAlchemyError
 
 
 @pytest.fixture
@@ -83,8 +87,203 @@ class TestHTIndexerTracktable:
             )
         ]
         ht_indexer_tracktable_instance.insert_batch(data)
-        mock_db_conn.insert_batch.assert_called_once()
-        # Check the arguments passed to the insert_batch method, position 0 is the query, position 1 is the data
-        assert mock_db_conn.insert_batch.call_args[0][0].startswith(f"INSERT IGNORE INTO {PROCESSING_STATUS_TABLE_NAME}")
-        # Check the number of items to be inserted (position 1)
-        assert len(mock_db_conn.insert_batch.call_args[0][1]) == 2
+        # The items are inserted with one multi-row statement
+        mock_db_conn.insert_rows.assert_called_once()
+        # Check the arguments passed to the insert_rows method, position 0 is the statement, position 2 is the data
+        assert mock_db_conn.insert_rows.call_args[0][0].startswith(f"INSERT IGNORE INTO {PROCESSING_STATUS_TABLE_NAME}")
+        # Check the number of items to be inserted (position 2)
+        assert len(mock_db_conn.insert_rows.call_args[0][2]) == 2
+        assert mock_db_conn.insert_rows.call_args[0][2][0]["ht_id"] == "test_ht_id_1"
+
+    def test_claim_pending_items(self, ht_indexer_tracktable_instance, mock_db_conn):
+        mock_db_conn.claim_rows.return_value = [{"ht_id": "test_ht_id_1", "record_id": "test_record_id_1"}]
+
+        items = ht_indexer_tracktable_instance.claim_pending_items(100, last_ht_id="test_ht_id_0")
+
+        assert items == [{"ht_id": "test_ht_id_1", "record_id": "test_record_id_1"}]
+        select_query, update_query = mock_db_conn.claim_rows.call_args.args
+        assert "FOR UPDATE SKIP LOCKED" in select_query
+        assert update_query.startswith(f"UPDATE {PROCESSING_STATUS_TABLE_NAME} SET retriever_status")
+        assert mock_db_conn.claim_rows.call_args.kwargs["params"] == {
+            "status": "pending", "last_ht_id": "test_ht_id_0", "limit": 100, "claimed_status": "processing"}
+
+    def test_release_expired_claims(self, ht_indexer_tracktable_instance, mock_db_conn):
+        """Use case: The items claimed by a retriever that crashed are set as pending when the claim expires"""
+        ht_indexer_tracktable_instance.release_expired_claims(lease_seconds=600)
+
+        query, values = mock_db_conn.update_status.call_args.args
+        assert "SET retriever_status = 'pending', claimed_at = NULL" in query
+        assert "retriever_status = 'processing'" in query
+        assert values == [{"lease_seconds": 600}]
+
+    def test_fail_claimed_items(self, ht_indexer_tracktable_instance, mock_db_conn):
+        """Use case: The claimed items of the records not found in the catalog are failed by record id"""
+        ht_indexer_tracktable_instance.fail_claimed_items(["001", "002"], "not found", by_field="record")
+
+        query, values = mock_db_conn.update_by_keys.call_args.args
+        assert "retriever_status = 'failed'" in query
+        assert query.strip().endswith("record_id IN :keys")
+        assert values == [{"error": "not found", "keys": ["001", "002"]}]
+
+    def test_update_items_status_grouped_by_status(self, ht_indexer_tracktable_instance, mock_db_conn):
+        """The items with the same status are updated with one query"""
+        items = [
+            {"status": "processing", "retriever_status": "completed", "ht_id": "a"},
+            {"status": "failed", "retriever_status": "failed", "error": "nack", "ht_id": "b"},
+            {"status": "processing", "retriever_status": "completed", "ht_id": "c"},
+            {"status": "processing", "retriever_status": "completed", "ht_id": "d"},
+        ]
+
+        ht_indexer_tracktable_instance.update_items_status(items, batch_size=2)
+
+        completed_call, failed_call = mock_db_conn.update_by_keys.call_args_list
+        assert completed_call.args[0] == (f"UPDATE {PROCESSING_STATUS_TABLE_NAME} SET status = :status, "
+                                          f"retriever_status = :retriever_status WHERE ht_id IN :keys")
+        assert completed_call.args[1] == [
+            {"status": "processing", "retriever_status": "completed", "keys": ["a", "c"]},
+            {"status": "processing", "retriever_status": "completed", "keys": ["d"]},
+        ]
+        assert "error = :error" in failed_call.args[0]
+        assert failed_call.args[1] == [{"status": "failed", "retriever_status": "failed", "error": "nack",
+                                        "keys": ["b"]}]
+
+    def test_migrate_table(self, ht_indexer_tracktable_instance, mock_db_conn):
+        """The surrogate key and the missing indexes are added in one ALTER TABLE"""
+        mock_db_conn.query_mysql.side_effect = [
+            [{"column_name": "ht_id"}, {"column_name": "record_id"}],
+            [{"index_name": "ht_id"}, {"index_name": "idx_retriever_status_ht_id"}],
+        ]
+
+        changes = ht_indexer_tracktable_instance.migrate_table()
+
+        assert len(changes) == 5
+        assert changes[0].startswith("ADD COLUMN id")
+        assert changes[1].startswith("ADD COLUMN claimed_at")
+        mock_db_conn.alter_table.assert_called_once()
+        assert "idx_retriever_status_ht_id" not in mock_db_conn.alter_table.call_args.args[0]
+
+    def test_migrate_table_failed(self, ht_indexer_tracktable_instance, mock_db_conn):
+        """Use case: The ALTER TABLE fails, the migration is not reported as applied"""
+        mock_db_conn.query_mysql.side_effect = [[{"column_name": "ht_id"}], [{"index_name": "ht_id"}]]
+        mock_db_conn.alter_table.side_effect = SQLAlchemyError("Lock wait timeout exceeded")
+
+        with pytest.raises(SQLAlchemyError):
+            ht_indexer_tracktable_instance.migrate_table()
+
+    def test_migrate_table_up_to_date(self, ht_indexer_tracktable_instance, mock_db_conn):
+        mock_db_conn.query_mysql.side_effect = [
+            [{"column_name": "id"}, {"column_name": "claimed_at"}],
+            [{"index_name": name} for name in TRACKTABLE_INDEXES],
+        ]
+
+        assert ht_indexer_tracktable_instance.migrate_table() == []
+        mock_db_conn.alter_table.assert_not_called()
+
+    def test_get_catalog_data_by_page(self, mock_db_conn):
+        """Each page of the cursor is converted to a list of items, one item by ht_id of the record"""
+        solr_exporter = Mock()
+        solr_exporter.run_cursor_pages.return_value = iter([
+            [{"id": "001", "ht_id": ["mdp.1", "mdp.2"]}, {"id": "002", "ht_id": None}],
+            [{"id": "003", "ht_id": ["mdp.3"]}],
+        ])
+        tracktable = HTIndexerTracktable(mock_db_conn, solr_exporter=solr_exporter)
+
+        pages = list(tracktable.get_catalog_data("*:*", Path("config.yaml"), "all", ["ht_id", "id"]))
+
+        assert [[(item.ht_id, item.record_id) for item in page] for page in pages] == [
+            [("mdp.1", "001"), ("mdp.2", "001")], [("mdp.3", "003")]]
+
+    def test_load_catalog_data_parallel_cursors(self, mock_db_conn):
+        """Each range of ids is exported by a cursor, and all the items are inserted"""
+        solr_exporter = Mock()
+        solr_exporter.get_first_id.side_effect = ["000000001", "000000100"]
+        solr_exporter.run_cursor_pages.side_effect = lambda *args, filter_query=None, **kwargs: iter([
+            [{"id": filter_query, "ht_id": ["a", "b"]}],
+            [{"id": filter_query, "ht_id": ["c"]}],
+        ])
+        tracktable = HTIndexerTracktable(mock_db_conn, solr_exporter=solr_exporter)
+
+        total_items = tracktable.load_catalog_data("*:*", Path("config.yaml"), "all", ["ht_id", "id"],
+                                                   parallel_cursors=2)
+
+        assert total_items == 6
+        assert mock_db_conn.insert_rows.call_count == 4
+        filter_queries = {call.kwargs["filter_query"] for call in solr_exporter.run_cursor_pages.call_args_list}
+        assert filter_queries == {'id:[* TO "000000050"}', 'id:["000000050" TO *]'}
+
+    def test_load_catalog_data_max_items(self, mock_db_conn):
+        solr_exporter = Mock()
+        solr_exporter.run_cursor_pages.return_value = iter([[{"id": "001", "ht_id": ["a", "b"]}]] * 5)
+        tracktable = HTIndexerTracktable(mock_db_conn, solr_exporter=solr_exporter)
+
+        assert tracktable.load_catalog_data("*:*", Path("config.yaml"), "all", ["ht_id", "id"], max_items=3) == 4
+
+    def test_sync_catalog_data_first_run(self, mock_db_conn):
+        """The first sync loads all the records without changing the existing items, and stores the high-water mark"""
+        mock_db_conn.query_mysql.return_value = []
+        solr_exporter = Mock()
+        solr_exporter.run_cursor_pages.return_value = iter([
+            [{"id": "001", "ht_id": ["a"], "time_of_index": "2024-01-02T00:00:00Z"},
+             {"id": "002", "ht_id": ["b"], "time_of_index": "2024-01-03T00:00:00Z"}],
+        ])
+        tracktable = HTIndexerTracktable(mock_db_conn, solr_exporter=solr_exporter)
+
+        assert tracktable.sync_catalog_data("*:*", Path("config.yaml"), "all", ["ht_id", "id"]) == 2
+
+        call = solr_exporter.run_cursor_pages.call_args
+        assert call.kwargs["filter_query"] is None
+        assert "time_of_index" in call.kwargs["list_output_fields"]
+        assert mock_db_conn.insert_rows.call_args.kwargs["on_duplicate"] == ""
+        assert mock_db_conn.insert_batch.call_args.args[1] == [
+            {"sync_name": "catalog:*:*", "high_water_mark": "2024-01-03T00:00:00Z"}]
+
+    def test_sync_catalog_data_incremental(self, mock_db_conn):
+        """Only the records indexed after the high-water mark are fetched, and their items are reset to pending"""
+        mock_db_conn.query_mysql.return_value = [{"high_water_mark": "2024-01-03T00:00:00Z"}]
+        solr_exporter = Mock()
+        solr_exporter.run_cursor_pages.return_value = iter([
+            [{"id": "003", "ht_id": ["c"], "time_of_index": "2024-01-04T00:00:00Z"}],
+        ])
+        tracktable = HTIndexerTracktable(mock_db_conn, solr_exporter=solr_exporter)
+
+        assert tracktable.sync_catalog_data("*:*", Path("config.yaml"), "all", ["ht_id", "id"],
+                                            overlap_minutes=30) == 1
+
+        assert (solr_exporter.run_cursor_pages.call_args.kwargs["filter_query"] ==
+                "time_of_index:[2024-01-03T00:00:00Z-30MINUTES TO *]")
+        insert_statement = mock_db_conn.insert_rows.call_args.args[0]
+        assert insert_statement.startswith("INSERT INTO")
+        assert mock_db_conn.insert_rows.call_args.kwargs["on_duplicate"] == RESET_ITEM_STATUS
+        assert mock_db_conn.insert_batch.call_args.args[1][0]["high_water_mark"] == "2024-01-04T00:00:00Z"
+
+    def test_sync_catalog_data_insert_error(self, mock_db_conn):
+        """Use case: If the items of a page are not inserted, the sync fails and the high-water mark is not stored,
+        so the records are fetched again by the next sync"""
+        mock_db_conn.query_mysql.return_value = [{"high_water_mark": "2024-01-03T00:00:00Z"}]
+        mock_db_conn.insert_rows.side_effect = Exception("MySQL not available")
+        solr_exporter = Mock()
+        solr_exporter.run_cursor_pages.return_value = iter([
+            [{"id": "003", "ht_id": ["c"], "time_of_index": "2024-01-04T00:00:00Z"}],
+        ])
+        tracktable = HTIndexerTracktable(mock_db_conn, solr_exporter=solr_exporter)
+
+        with pytest.raises(Exception, match="MySQL not available"):
+            tracktable.sync_catalog_data("*:*", Path("config.yaml"), "all", ["ht_id", "id"])
+        mock_db_conn.insert_batch.assert_not_called()
+
+    def test_sync_catalog_data_no_changes(self, mock_db_conn):
+        """The high-water mark is not stored again if there are no new records"""
+        mock_db_conn.query_mysql.return_value = [{"high_water_mark": "2024-01-03T00:00:00Z"}]
+        solr_exporter = Mock()
+        solr_exporter.run_cursor_pages.return_value = iter([])
+        tracktable = HTIndexerTracktable(mock_db_conn, solr_exporter=solr_exporter)
+
+        assert tracktable.sync_catalog_data("*:*", Path("config.yaml"), "all", ["ht_id", "id"]) == 0
+        mock_db_conn.insert_batch.assert_not_called()
+
+    def test_split_id_range(self):
+        assert split_id_range("000000001", "000000101", 2) == ['id:[* TO "000000051"}', 'id:["000000051" TO *]']
+        # The ids cannot be split
+        assert split_id_range("000000001", "000000101", 1) == [None]
+        assert split_id_range("uc1.001", "uc1.002", 2) == [None]
+        assert split_id_range(None, None, 2) == [None]
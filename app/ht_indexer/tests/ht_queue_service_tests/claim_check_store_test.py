@@ -0,0 +1,93 @@
+import os
+import time
+from pathlib import Path
+
+import orjson
+import pytest
+from ht_queue_service.claim_check_store import ClaimCheckStore
+
+document = {"id": "mdp.39015078560292", "ocr": "Robinson Crusoe " * 1000, "title": ["Robinson Crusoe"]}
+
+
+@pytest.fixture
+def claim_check_store(tmp_path):
+    return ClaimCheckStore(str(tmp_path / "spool"))
+
+
+class TestClaimCheckStore:
+
+    def test_store_and_read_document(self, claim_check_store):
+        """The document read from the store is the same that was stored"""
+        reference = claim_check_store.store(document)
+
+        assert reference.keys() == {"id", "path", "size", "checksum"}
+        assert reference["id"] == document["id"]
+        assert ClaimCheckStore.is_reference(reference)
+        assert not ClaimCheckStore.is_reference(document)
+        assert orjson.loads(b"".join(claim_check_store.read_chunks(reference))) == document
+
+    def test_store_same_document_twice(self, claim_check_store):
+        """Use case: The same document is generated twice before it is indexed. Each reference has its own file,
+        so removing the first one once it is indexed does not break the second one"""
+        first_reference = claim_check_store.store(document)
+        second_reference = claim_check_store.store(document)
+
+        assert first_reference["checksum"] == second_reference["checksum"]
+        assert first_reference["path"] != second_reference["path"]
+
+        claim_check_store.remove(first_reference)
+        assert orjson.loads(b"".join(claim_check_store.read_chunks(second_reference))) == document
+
+    def test_read_corrupted_document(self, claim_check_store):
+        reference = claim_check_store.store(document)
+        with open(claim_check_store.spool_path / reference["path"], "r+b") as document_file:
+            document_file.write(b"{\"id\":\"xxx.39015078560292\"")
+
+        chunks = claim_check_store.read_chunks(reference)
+        # The checksum is verified before the first chunk is streamed
+        with pytest.raises(ValueError):
+            next(chunks)
+
+    def test_remove_document(self, claim_check_store):
+        reference = claim_check_store.store(document)
+        claim_check_store.remove(reference)
+
+        with pytest.raises(FileNotFoundError):
+            b"".join(claim_check_store.read_chunks(reference))
+        # Removing a document that is not in the store does not fail
+        claim_check_store.remove(reference)
+
+    def test_store_relative_path(self, claim_check_store, tmp_path):
+        """Use case: The volume is mounted in a different path in the consumer pod. The path of the reference is
+        relative to the store, so the consumer reads the document from its own store"""
+        reference = claim_check_store.store(document)
+        assert not Path(reference["path"]).is_absolute()
+
+        os.rename(claim_check_store.spool_path, tmp_path / "consumer_spool")
+        consumer_store = ClaimCheckStore(str(tmp_path / "consumer_spool"))
+
+        assert orjson.loads(b"".join(consumer_store.read_chunks(reference))) == document
+
+    def test_reference_outside_the_store(self, claim_check_store, tmp_path):
+        """Use case: A reference to a file outside the store is neither read nor deleted"""
+        other_file = tmp_path / "other.json"
+        other_file.write_bytes(b"{}")
+        for path in (str(other_file), "../other.json"):
+            reference = {"id": "mdp.1", "path": path, "size": 2, "checksum": "x"}
+
+            with pytest.raises(ValueError):
+                next(claim_check_store.read_chunks(reference))
+            claim_check_store.remove(reference)
+
+        assert other_file.exists()
+
+    def test_remove_expired_documents(self, claim_check_store):
+        """Use case: The documents of the messages in the Dead Letter Queue are deleted after the retention period"""
+        expired_reference = claim_check_store.store(document)
+        reference = claim_check_store.store({**document, "title": ["Other"]})
+        expired_time = time.time() - 3600
+        os.utime(claim_check_store.spool_path / expired_reference["path"], (expired_time, expired_time))
+
+        assert claim_check_store.remove_expired(60) == 1
+        assert not (claim_check_store.spool_path / expired_reference["path"]).exists()
+        assert (claim_check_store.spool_path / reference["path"]).exists()
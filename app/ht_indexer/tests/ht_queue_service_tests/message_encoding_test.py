@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from ht_queue_service.message_encoding import (
+    decode_message,
+    encode_message,
+    validate_content_encoding,
+)
+
+message = {"id": "mdp.39015078560292", "ocr": "Robinson Crusoe " * 1000, "title": ["Rābinsan Krūso kā itihāsa"]}
+
+
+class TestMessageEncoding:
+
+    @pytest.mark.parametrize("content_encoding", [None, "gzip", "zstd"])
+    def test_encode_decode_message(self, content_encoding):
+        """The message is the same after encoding and decoding it"""
+        body = encode_message(message, content_encoding)
+
+        assert decode_message(body, content_encoding) == message
+
+    @pytest.mark.parametrize("content_encoding", ["gzip", "zstd"])
+    def test_compressed_message_is_smaller(self, content_encoding):
+        assert len(encode_message(message, content_encoding)) < len(encode_message(message)) / 10
+
+    def test_decode_legacy_plain_message(self):
+        """Messages published with json.dumps and without content encoding are accepted"""
+        body = json.dumps(message).encode("utf-8")
+
+        assert decode_message(body, None) == message
+
+    def test_unsupported_content_encoding(self):
+        with pytest.raises(ValueError):
+            validate_content_encoding("brotli")
+        with pytest.raises(ValueError):
+            decode_message(b"{}", "brotli")
+
+    def test_encode_non_serializable_message_raises_type_error(self):
+        class NonSerializable:
+            pass
+
+        with pytest.raises(TypeError):
+            encode_message({"ht_id": "123", "payload": NonSerializable()})
@@ -0,0 +1,67 @@
+from unittest.mock import MagicMock, Mock, patch
+
+import pika.exceptions
+import pytest
+from ht_queue_service.queue_flow_controller import QueueFlowController
+
+
+def make_flow_controller(queue_status: list, **kwargs) -> QueueFlowController:
+    queue_producer = Mock(channel=MagicMock(is_closed=False))
+    queue_producer.queue_manager = Mock(queue_name="test_flow_controller")
+    queue_producer.queue_manager.get_queue_status.side_effect = queue_status
+    return QueueFlowController(queue_producer, **kwargs)
+
+
+class TestQueueFlowController:
+
+    def test_queue_producer_required(self):
+        """Use case: the connection to the queue failed, get_queue_producer returns None"""
+        with pytest.raises(ValueError):
+            QueueFlowController(None, max_credits=500)
+
+    def test_credits_limited_by_max_queue_messages(self):
+        """While the drain rate is unknown, the queue is filled up to max_queue_messages"""
+        flow_controller = make_flow_controller([(900, 1)], max_credits=500, max_queue_messages=1000)
+
+        assert flow_controller.get_credits() == 100
+
+    def test_credits_limited_by_max_credits(self):
+        flow_controller = make_flow_controller([(0, 1)], max_credits=500, max_queue_messages=1000)
+
+        assert flow_controller.get_credits() == 500
+
+    def test_credits_limited_by_queue_bytes(self):
+        """The byte budget uses the average size of the published messages"""
+        flow_controller = make_flow_controller([(10, 1)], max_credits=500, max_queue_bytes=100_000)
+        flow_controller.record_published(10, 50_000)
+
+        assert flow_controller.get_message_size() == 5000
+        assert flow_controller.get_credits() == 10
+
+    def test_target_depth_follows_drain_rate(self):
+        """The consumers drained 100 messages per second, the queue keeps buffer_seconds of messages"""
+        flow_controller = make_flow_controller([(1000, 1), (0, 1)], max_credits=50_000, max_queue_messages=100_000,
+                                               buffer_seconds=60, min_queue_messages=10)
+
+        with patch("ht_queue_service.queue_flow_controller.time.monotonic", side_effect=[0, 20]):
+            flow_controller.get_credits()
+            # 1000 messages in the queue and 1000 published in 20 seconds, the queue is empty
+            flow_controller.record_published(1000, 1000)
+            credits = flow_controller.get_credits()
+
+        assert flow_controller.drain_rate == 100
+        assert flow_controller.get_target_depth() == 6000
+        assert credits == 6000
+
+    def test_no_credits_if_queue_is_not_available(self):
+        flow_controller = make_flow_controller([pika.exceptions.AMQPConnectionError("closed")], max_credits=500)
+
+        assert flow_controller.get_credits() == 0
+
+    def test_wait_for_credits(self):
+        """The producer waits until there are at least min_credits credits"""
+        flow_controller = make_flow_controller([(1000, 1), (950, 1), (500, 1)], max_credits=500, min_credits=200,
+                                               max_queue_messages=1000, poll_interval=0)
+
+        assert flow_controller.wait_for_credits() == 500
+        assert flow_controller.queue_producer.queue_manager.get_queue_status.call_count == 3
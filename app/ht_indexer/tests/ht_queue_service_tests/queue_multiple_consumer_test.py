@@ -2,6 +2,7 @@ import json
 import os
 from collections import defaultdict
 from typing import Any
+from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 from conftest import create_test_queue_config
@@ -409,4 +410,61 @@ class TestHTMultipleQueueConsumer:
         os.remove(global_path)
         os.remove(app_path)
         os.remove(consumer_global_path)
-        os.remove(consumer_app_path)
\ No newline at end of file
+        os.remove(consumer_app_path)
+
+class TestPrefetchingConsumer:
+
+    @staticmethod
+    def make_consumer(deliveries: list, batch_size: int = 3) -> HTMultipleConsumerServiceConcrete:
+        with patch("ht_queue_service.queue_multiple_consumer.QueueMultipleConsumer.__init__", return_value=None):
+            consumer = HTMultipleConsumerServiceConcrete(Mock())
+        consumer.channel = MagicMock(is_closed=False)
+        consumer.channel.consume.return_value = iter(deliveries)
+        consumer.queue_manager = Mock(batch_size=batch_size, queue_name="test_prefetching_consumer")
+        consumer.prefetch_batches = 2
+        consumer.max_linger_time = 60
+        consumer.shutdown_on_empty_queue = True
+        consumer.stop_requested = False
+        consumer.batches = []
+        consumer.process_batch = lambda batch, delivery_tags: consumer.batches.append(list(delivery_tags)) or True
+        return consumer
+
+    @staticmethod
+    def delivery(delivery_tag: int):
+        return Mock(delivery_tag=delivery_tag), Mock(content_encoding=None), json.dumps({"ht_id": delivery_tag})
+
+    def test_consume_prefetched_batches(self):
+        """The messages are processed in full batches and the last batch is processed when no message arrives
+        before the linger time"""
+        deliveries = [self.delivery(tag) for tag in range(1, 6)] + [(None, None, None), (None, None, None)]
+        consumer = self.make_consumer(deliveries)
+
+        consumer.consume_batch()
+
+        consumer.channel.basic_qos.assert_called_once_with(prefetch_count=6)
+        assert consumer.batches == [[1, 2, 3], [4, 5]]
+        consumer.channel.cancel.assert_called_once()
+
+    def test_batch_processed_after_linger_time(self):
+        deliveries = [self.delivery(1), self.delivery(2), (None, None, None)]
+        consumer = self.make_consumer(deliveries, batch_size=10)
+        consumer.max_linger_time = 0
+
+        consumer.consume_batch()
+
+        assert consumer.batches == [[1], [2]]
+
+    def test_stop_requested(self):
+        """Use case: The service receives SIGTERM while a batch is processed. The consumer stops after the batch,
+        and the prefetched messages are returned to the queue"""
+        deliveries = [self.delivery(tag) for tag in range(1, 7)]
+        consumer = self.make_consumer(deliveries, batch_size=2)
+        consumer.shutdown_on_empty_queue = False
+        process_batch = consumer.process_batch
+        consumer.process_batch = lambda batch, delivery_tags: consumer.request_stop() or process_batch(batch,
+                                                                                                      delivery_tags)
+
+        consumer.consume_batch()
+
+        assert consumer.batches == [[1, 2]]
+        consumer.channel.cancel.assert_called_once()
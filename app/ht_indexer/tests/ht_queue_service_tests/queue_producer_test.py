@@ -1,11 +1,15 @@
 import json
 import os
+import threading
+import weakref
 from typing import Any
+from unittest.mock import MagicMock, Mock, patch
 
+import pika.exceptions
 import pytest
 from conftest import create_test_queue_config
 from ht_queue_service.queue_consumer import QueueConsumer
-from ht_queue_service.queue_producer import QueueProducer
+from ht_queue_service.queue_producer import PUBLISH_WINDOW_SIZE, QueueProducer
 from ht_utils.ht_logger import get_ht_logger
 
 logger = get_ht_logger(name=__name__)
@@ -140,3 +144,112 @@ class TestQueueProducer:
         # Delete the temporary files
         os.remove(global_path)
         os.remove(app_path)
+
+
+class TestPublisherConfirms:
+
+    @staticmethod
+    def make_producer() -> QueueProducer:
+        with patch("ht_queue_service.queue_producer.QueueProducer.__init__", return_value=None):
+            producer = QueueProducer(Mock())
+        producer.channel = MagicMock(is_closed=False)
+        producer.channel_creator = Mock()
+        producer.queue_manager = Mock(main_exchange_name="test_exchange", queue_name="test_publisher_confirms")
+        producer.content_encoding = None
+        producer.message_properties = Mock()
+        producer._thread_local = threading.local()
+        producer._transaction_channels = weakref.WeakSet()
+        producer.published_messages = 0
+        producer.published_bytes = 0
+        return producer
+
+    def test_publish_many_confirmed_messages(self):
+        producer = self.make_producer()
+        messages = [{"ht_id": f"mdp.{i}"} for i in range(3)]
+
+        confirmed_messages, failed_messages = producer.publish_many(messages)
+
+        assert confirmed_messages == messages
+        assert failed_messages == []
+        assert producer.published_messages == 3
+        # Transaction mode is enabled once for the channel, and the broker is waited once for the window
+        producer.channel.tx_select.assert_called_once()
+        producer.channel.tx_commit.assert_called_once()
+        assert producer.channel.basic_publish.call_count == 3
+        assert producer.channel.basic_publish.call_args.kwargs["mandatory"] is True
+        assert json.loads(producer.channel.basic_publish.call_args.kwargs["body"]) == messages[-1]
+        # All the messages share the same properties
+        assert {id(call.kwargs["properties"]) for call in producer.channel.basic_publish.call_args_list} == {
+            id(producer.message_properties)}
+
+    def test_publish_many_by_window(self):
+        """The broker is waited once per window of PUBLISH_WINDOW_SIZE messages"""
+        producer = self.make_producer()
+        messages = [{"ht_id": f"mdp.{i}"} for i in range(PUBLISH_WINDOW_SIZE * 2 + 1)]
+
+        confirmed_messages, failed_messages = producer.publish_many(messages)
+
+        assert confirmed_messages == messages
+        assert producer.channel.tx_commit.call_count == 3
+
+    def test_publish_many_reports_not_confirmed_messages(self):
+        """Use case: The messages returned by the broker are reported as failed. If the commit of a window fails,
+        all its messages are reported as failed"""
+        producer = self.make_producer()
+        commit_error = pika.exceptions.AMQPError("commit failed")
+        messages = [{"ht_id": f"mdp.{i}"} for i in range(PUBLISH_WINDOW_SIZE + 2)]
+
+        def tx_commit():
+            if producer.channel.tx_commit.call_count == 1:
+                producer._on_message_returned(producer.channel, Mock(), Mock(), json.dumps(messages[1]).encode())
+                return
+            raise commit_error
+
+        producer.channel.tx_commit.side_effect = tx_commit
+        with patch("ht_queue_service.queue_producer.encode_message",
+                   side_effect=lambda message, _: json.dumps(message).encode()):
+            confirmed_messages, failed_messages = producer.publish_many(messages)
+
+        assert confirmed_messages == [messages[0]] + messages[2:PUBLISH_WINDOW_SIZE]
+        assert [message for message, _ in failed_messages] == [messages[1]] + messages[PUBLISH_WINDOW_SIZE:]
+        assert isinstance(failed_messages[0][1], pika.exceptions.UnroutableError)
+        assert failed_messages[-1][1] is commit_error
+        assert producer.published_messages == PUBLISH_WINDOW_SIZE - 1
+
+    def test_publish_many_reconnects_closed_channel(self):
+        """If the channel is closed while publishing, the window is published again in a new channel in
+        transaction mode"""
+        producer = self.make_producer()
+        closed_channel = producer.channel
+        closed_channel.basic_publish.side_effect = pika.exceptions.ChannelClosed(406, "closed")
+        new_channel = MagicMock(is_closed=False)
+        producer.queue_reconnect = Mock(side_effect=lambda: setattr(producer, "channel", new_channel))
+
+        confirmed_messages, failed_messages = producer.publish_many([{"ht_id": "mdp.1"}, {"ht_id": "mdp.2"}])
+
+        assert confirmed_messages == [{"ht_id": "mdp.1"}, {"ht_id": "mdp.2"}]
+        assert failed_messages == []
+        new_channel.tx_select.assert_called_once()
+        assert new_channel.basic_publish.call_count == 2
+        new_channel.tx_commit.assert_called_once()
+
+    def test_publish_many_non_serializable_message(self):
+        producer = self.make_producer()
+
+        class NonSerializable:
+            pass
+
+        messages = [{"ht_id": "123", "payload": NonSerializable()}, {"ht_id": "456"}]
+        confirmed_messages, failed_messages = producer.publish_many(messages)
+
+        assert confirmed_messages == [messages[1]]
+        assert isinstance(failed_messages[0][1], TypeError)
+
+    def test_publish_message_in_transaction_channel(self):
+        """A message published with publish_messages in the channel used by publish_many is committed"""
+        producer = self.make_producer()
+        producer.publish_many([{"ht_id": "mdp.1"}])
+
+        producer.publish_messages({"ht_id": "mdp.2"})
+
+        assert producer.channel.tx_commit.call_count == 2
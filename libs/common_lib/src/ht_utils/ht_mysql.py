@@ -2,7 +2,7 @@ import os
 import sys
 import threading
 from typing import Any, Optional, List, Dict
-from sqlalchemy import create_engine, text, exc
+from sqlalchemy import bindparam, create_engine, text, exc
 from sqlalchemy.engine import Engine
 from ht_utils.ht_logger import get_ht_logger
 from ht_utils.ht_utils import get_general_error_message
@@ -75,6 +75,29 @@ class HtMysql:
         except exc.SQLAlchemyError as e:
             logger.error(f"Error inserting batch of records: {e}")
 
+    def insert_rows(self, insert_statement: str, columns: list[str], rows: list[dict], on_duplicate: str = ""):
+        """Insert the rows with one multi-row statement INSERT ... VALUES (...), (...), instead of one
+        INSERT by row.
+        :param insert_statement: The beginning of the statement, e.g. INSERT IGNORE INTO table (column_1, column_2)
+        :param columns: The columns of the statement, in the same order
+        :param rows: List of dictionaries with the values of the columns
+        :param on_duplicate: Optional end of the statement, e.g. ON DUPLICATE KEY UPDATE column_2 = VALUES(column_2)
+        :raises SQLAlchemyError: If the rows are not inserted, so the caller does not count them as loaded
+        """
+        if not rows:
+            return
+        values = ", ".join(
+            "(" + ", ".join(f":{column}_{position}" for column in columns) + ")" for position in range(len(rows))
+        )
+        params = {f"{column}_{position}": row.get(column) for position, row in enumerate(rows) for column in columns}
+        try:
+            with HtMysql._engine.begin() as conn:
+                conn.execute(text(f"{insert_statement} VALUES {values} {on_duplicate}"), params)
+                logger.info(f"Inserted {len(rows)} records successfully.")
+        except exc.SQLAlchemyError as e:
+            logger.error(f"Error inserting batch of records: {e}")
+            raise
+
     def create_table(self, create_table_sql: str):
         try:
             with HtMysql._engine.begin() as conn:
@@ -91,6 +114,58 @@ class HtMysql:
         except exc.SQLAlchemyError as e:
             logger.error(f"Error updating status: {e}")
 
+    def update_by_keys(self, update_query: str, update_values: list[dict]):
+        """Execute an update of a group of rows for each dictionary of values, in one transaction.
+        :param update_query: The SQL query to update the rows, it receives the keys of the rows
+        in the :keys parameter (e.g. UPDATE ... SET status = :status WHERE ht_id IN :keys)
+        :param update_values: List of dictionaries with the values of the query and the list of keys
+        """
+        try:
+            with HtMysql._engine.begin() as conn:
+                query = text(update_query).bindparams(bindparam("keys", expanding=True))
+                for values in update_values:
+                    conn.execute(query, values)
+                logger.info(f"Updated {sum(len(values['keys']) for values in update_values)} records successfully.")
+        except exc.SQLAlchemyError as e:
+            logger.error(f"Error updating status: {e}")
+
+    def alter_table(self, alter_table_sql: str):
+        """Alter the schema of a table.
+        :param alter_table_sql: The ALTER TABLE statement
+        :raises SQLAlchemyError: If the table is not altered, so the caller does not report the migration as applied
+        """
+        try:
+            with HtMysql._engine.begin() as conn:
+                conn.execute(text(alter_table_sql))
+                logger.info("Table altered successfully")
+        except exc.SQLAlchemyError as e:
+            logger.error(f"Failed to alter table: {e}")
+            raise
+
+    def claim_rows(self, select_query: str, update_query: str, params: dict | None = None,
+                   key: str = "ht_id") -> list[dict[str, Any]]:
+        """Select some rows and update them in the same transaction, so the rows are claimed by only one process.
+        The select query should lock the rows (SELECT ... FOR UPDATE SKIP LOCKED), the rows locked by other
+        processes are skipped.
+        :param select_query: The SQL query to select the rows
+        :param update_query: The SQL query to update the selected rows, it receives the key of the rows
+        in the :keys parameter (e.g. UPDATE ... WHERE ht_id IN :keys)
+        :param params: Optional dictionary of parameters to bind to both queries
+        :param key: Column that identifies the rows
+        :return: List of dictionaries representing the claimed rows
+        """
+        params = params or {}
+        try:
+            with HtMysql._engine.begin() as conn:
+                rows = [dict(row._mapping) for row in conn.execute(text(select_query), params)]
+                if rows:
+                    conn.execute(text(update_query).bindparams(bindparam("keys", expanding=True)),
+                                 {**params, "keys": [row[key] for row in rows]})
+                return rows
+        except exc.SQLAlchemyError as e:
+            logger.error(f"MySQL Claim Error: {get_general_error_message('DatabaseClaim', e)}")
+            return []
+
 def get_mysql_conn(pool_size: int = 1) -> HtMysql:
     # MySql connection
     try:
@@ -1,7 +1,13 @@
+from collections.abc import Callable, Generator, Iterable
+
 from ht_utils.ht_logger import get_ht_logger
 
 logger = get_ht_logger(name=__name__)
 
+# Maximum size of the list of values of a terms query. The query is sent in the body of the request, Solr accepts
+# request bodies up to 2 MB by default (formdataUploadLimitInKB), so it is not limited by the length of the URL.
+SOLR_TERMS_QUERY_MAX_BYTES = 256 * 1024
+
 
 def make_query(list_documents: list[str], by_field: str = 'item') -> str:
     """
@@ -57,4 +63,34 @@ def make_solr_term_query(list_documents: list[str], by_field: str = 'item') -> s
 
     if by_field == 'record':
         query = '{!terms f=id}' + ','.join(list_documents)
-    return query
\ No newline at end of file
+    return query
+
+
+def split_terms_by_size(values: Iterable[str], max_bytes: int = SOLR_TERMS_QUERY_MAX_BYTES,
+                        max_terms: int | None = None,
+                        key: Callable[[str], str] | None = None) -> Generator[list[str], None, None]:
+    """
+    Group the values of a terms query in lists whose comma-separated values have at most max_bytes bytes
+    (see make_solr_term_query), so the size of the request, and not a fixed number of values, bounds each lookup.
+    A value bigger than max_bytes is returned in a list alone.
+    :param values: Values of the query, e.g. ht_ids or record ids
+    :param max_bytes: Maximum size of the comma-separated values of each list
+    :param max_terms: Optional maximum number of values of each list
+    :param key: Optional function that returns the term sent in the query for each value (e.g. the normalized
+    record id). The size of the term is counted instead of the size of the value
+    :return: Generator of lists of values
+    """
+    batch = []
+    batch_size = 0
+    for value in values:
+        term = key(value) if key else value
+        value_size = len(term.encode("utf-8")) + (1 if batch else 0)
+        if batch and (batch_size + value_size > max_bytes or (max_terms and len(batch) >= max_terms)):
+            yield batch
+            batch = []
+            batch_size = 0
+            value_size -= 1
+        batch.append(value)
+        batch_size += value_size
+    if batch:
+        yield batch
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections.abc import Iterator
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ht_utils.ht_logger import get_ht_logger
+
+logger = get_ht_logger(name=__name__)
+
+# Connections kept open by host. The indexer and the retriever send thousands of requests to the same Solr host,
+# so the connections are reused (keep-alive) instead of opening a new TCP/TLS connection for each request.
+DEFAULT_POOL_SIZE = 10
+# Timeout in seconds (connect, read). Indexing a batch of large documents could take some minutes
+DEFAULT_TIMEOUT = (10, 300)
+# Number of times a request is retried when Solr is overloaded or not reachable
+DEFAULT_MAX_RETRIES = 3
+# The waiting time between retries is backoff_factor * 2 ** attempt seconds (0.5, 1, 2, ...)
+DEFAULT_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+_solr_clients: dict[str, "SolrClient"] = {}
+_solr_clients_lock = threading.Lock()
+
+
+class SolrClient:
+    """
+    HTTP client shared by all the classes sending requests to the same Solr host.
+
+    It uses a requests.Session with a pool of persistent connections, a default timeout and retries with
+    exponential backoff when the request fails because of a connection error or Solr answers 429 or 5xx.
+    Requests with a streaming body (e.g. a generator) are not retried, because the body cannot be sent again.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+                 timeout: float | tuple[float, float] = DEFAULT_TIMEOUT):
+        """
+        :param pool_size: Maximum number of connections kept open with the Solr host
+        :param max_retries: Number of times a failed request is retried
+        :param backoff_factor: Factor to compute the waiting time between retries
+        :param timeout: Default timeout of the requests (connect, read)
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get_waiting_time(self, attempt: int, response: requests.Response | None = None) -> float:
+        """Return the seconds to wait before retrying. The Retry-After header sent by Solr is used if exists."""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_factor * 2 ** attempt
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request to Solr, retrying it if it fails because of a transient error.
+        :param method: HTTP method
+        :param url: Solr url
+        :param kwargs: Arguments of requests.Session.request (params, data, json, headers, auth, stream, timeout...)
+        :return: The response. If all the retries failed, the last response with an error status code
+        :raises requests.exceptions.RequestException: If Solr is not reachable after all the retries
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        replayable = not isinstance(kwargs.get("data"), Iterator)
+
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUS_CODES or not replayable or attempt >= self.max_retries:
+                    return response
+                error = f"status_code={response.status_code}"
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not replayable or attempt >= self.max_retries:
+                    raise
+                error = str(e)
+
+            waiting_time = self.get_waiting_time(attempt, response)
+            if response is not None:
+                response.close()
+            attempt += 1
+            logger.warning(f"Solr request {method} {url} failed with {error}. "
+                           f"Retry {attempt}/{self.max_retries} in {waiting_time} seconds")
+            time.sleep(waiting_time)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def get_solr_client(solr_url: str, **kwargs) -> SolrClient:
+    """
+    Return the client shared by all the requests sent to the host of the Solr url. The client is created
+    with the first call, the arguments of the next calls with the same host are ignored.
+    :param solr_url: Solr url, e.g. http://solr-lss-dev:8983/solr/core-x/
+    :param kwargs: Arguments of SolrClient (pool_size, max_retries, backoff_factor, timeout)
+    """
+    url = urlsplit(solr_url or "")
+    base_url = f"{url.scheme}://{url.netloc}"
+    with _solr_clients_lock:
+        if base_url not in _solr_clients:
+            _solr_clients[base_url] = SolrClient(**kwargs)
+        return _solr_clients[base_url]
@@ -0,0 +1,30 @@
+from ht_utils.query_maker import make_solr_term_query, split_terms_by_size
+
+
+def test_make_solr_term_query_by_record():
+    assert make_solr_term_query(["000001", "000002"], by_field="record") == "{!terms f=id}000001,000002"
+
+
+def test_split_terms_by_size():
+    """The comma-separated values of each batch fit in max_bytes"""
+    values = [f"mdp.{i:010d}" for i in range(10)]  # 14 bytes each
+
+    batches = list(split_terms_by_size(values, max_bytes=44))
+
+    assert batches == [values[0:3], values[3:6], values[6:9], values[9:]]
+    assert all(len(",".join(batch)) <= 44 for batch in batches)
+
+
+def test_split_terms_by_size_max_terms():
+    assert list(split_terms_by_size(["a", "b", "c"], max_bytes=1024, max_terms=2)) == [["a", "b"], ["c"]]
+
+
+def test_split_terms_by_size_value_bigger_than_max_bytes():
+    assert list(split_terms_by_size(["a" * 20, "b"], max_bytes=10)) == [["a" * 20], ["b"]]
+
+
+def test_split_terms_by_size_key():
+    """The size of the terms sent in the query is counted, e.g. the record ids padded with zeros"""
+    batches = list(split_terms_by_size(["1", "2", "3"], max_bytes=20, key=lambda value: value.zfill(9)))
+
+    assert batches == [["1", "2"], ["3"]]
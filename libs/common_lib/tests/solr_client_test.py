@@ -0,0 +1,65 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from ht_utils.solr_client import SolrClient, get_solr_client
+
+
+def make_response(status_code: int, headers: dict = None) -> MagicMock:
+    return MagicMock(status_code=status_code, headers=headers or {})
+
+
+@pytest.fixture
+def solr_client():
+    return SolrClient(max_retries=2, backoff_factor=0)
+
+
+def test_get_solr_client_shared_by_host():
+    solr_client = get_solr_client("http://solr-lss-dev:8983/solr/core-x/")
+
+    assert get_solr_client("http://solr-lss-dev:8983/solr/core-y/query") is solr_client
+    assert get_solr_client("http://solr-sdr-catalog:9033/solr/catalog") is not solr_client
+
+
+def test_retry_on_server_error(solr_client):
+    with patch.object(solr_client.session, "request",
+                      side_effect=[make_response(503), make_response(429), make_response(200)]) as mock_request:
+        response = solr_client.post("http://solr-lss-dev:8983/solr/core-x/query", data={"q": "*:*"})
+
+    assert response.status_code == 200
+    assert mock_request.call_count == 3
+    # The default timeout is used if the caller does not define it
+    assert mock_request.call_args.kwargs["timeout"] == solr_client.timeout
+
+
+def test_return_last_response_after_all_retries(solr_client):
+    with patch.object(solr_client.session, "request", return_value=make_response(500)) as mock_request:
+        response = solr_client.get("http://solr-lss-dev:8983/solr/core-x/")
+
+    assert response.status_code == 500
+    assert mock_request.call_count == 3
+
+
+def test_retry_on_connection_error(solr_client):
+    with patch.object(solr_client.session, "request",
+                      side_effect=[requests.exceptions.ConnectionError("refused"), make_response(200)]):
+        assert solr_client.get("http://solr-lss-dev:8983/solr/core-x/").status_code == 200
+
+    with patch.object(solr_client.session, "request", side_effect=requests.exceptions.ConnectionError("refused")):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            solr_client.get("http://solr-lss-dev:8983/solr/core-x/")
+
+
+def test_streaming_body_is_not_retried(solr_client):
+    with patch.object(solr_client.session, "request", return_value=make_response(503)) as mock_request:
+        response = solr_client.post("http://solr-lss-dev:8983/solr/core-x/update", data=iter([b"[", b"]"]))
+
+    assert response.status_code == 503
+    assert mock_request.call_count == 1
+
+
+def test_waiting_time_uses_retry_after_header(solr_client):
+    solr_client.backoff_factor = 0.5
+
+    assert solr_client.get_waiting_time(0, make_response(429, {"Retry-After": "7"})) == 7
+    assert solr_client.get_waiting_time(2, make_response(503)) == 2
@@ -3,8 +3,8 @@ import os
 from argparse import ArgumentParser
 from pathlib import Path
 
-import requests
 import yaml
+from ht_utils.solr_client import get_solr_client
 from requests.auth import HTTPBasicAuth
 
 from ht_search.config_files import config_files_path
@@ -106,6 +106,7 @@ class SolrExporter:
         self.environment = env
         self.headers = {"Content-Type": "application/json"}
         self.auth = HTTPBasicAuth(user, password) if user and password else None
+        self.solr_client = get_solr_client(solr_url)
 
     def send_query(self, params):
 
@@ -117,7 +118,7 @@ class SolrExporter:
         # Use stream=True to avoid loading all the data in memory at once (useful for large responses)
         # In chunked transfer, the data stream is divided into a series of non-overlapping "chunks".
 
-        response = requests.post(
+        response = self.solr_client.post(
             url=self.solr_url, params=params, headers=self.headers, stream=True,
             auth=self.auth
         )
@@ -149,30 +150,68 @@ class SolrExporter:
         :return: generator
         """
 
-        params = default_solr_params(self.environment)
+        if list_output_fields is None:
+            list_output_fields = default_solr_params(self.environment)["fl"].split(",")
+
+        for page in self.run_cursor_pages(query_string, query_config_path, conf_query=conf_query,
+                                          list_output_fields=list_output_fields):
+            for result in page:
+                yield process_results(result, list_output_fields)
+
+    def run_cursor_pages(self, query_string, query_config_path=None, conf_query="ocr", list_output_fields: list = None,
+                         filter_query: str = None):
+
+        """ Run the cursor to export all results, page by page.
+        The documents are returned as they are parsed from the Solr response, without serializing them again,
+        so this is the method to use when the results are processed in Python.
+        :param query_string: Str, query string
+        :param query_config_path: Path of the config file with the queries
+        :param conf_query: Query configuration name
+        :param list_output_fields: List of fields to return, by default the fields of default_solr_params
+        :param filter_query: Optional Solr filter query (fq), e.g. to export a range of ids
+        :return: generator of lists of documents (dict), one list by page
+        """
+
+        # Copy the default parameters, the cursor mark changes with each page, and several cursors could run at
+        # the same time
+        params = dict(default_solr_params(self.environment))
 
         # Replace the default list of fields with the one passed as a parameter
         if list_output_fields is not None:
             params["fl"] = ",".join(list_output_fields)
-        else:
-            list_output_fields = params["fl"].split(",")
         params["cursorMark"] = "*"
         # TODO: Implement the feature to access to Solr debug using this python script
         params["debugQuery"] = "true"
         params["q"] = make_query(query_string, query_config_path, conf_query=conf_query)
+        if filter_query:
+            params["fq"] = filter_query
 
         while True:
             results = self.send_query(params)  # send_query
 
             output = json.loads(results.content)
 
-            for result in output['response']['docs']:
-                yield process_results(result, list_output_fields)
+            yield output['response']['docs']
             if params["cursorMark"] != output["nextCursorMark"]:
                 params["cursorMark"] = output["nextCursorMark"]
             else:
                 break
 
+    def get_first_id(self, query_string, query_config_path=None, conf_query="ocr", descending: bool = False):
+
+        """ Return the first id of the results sorted by id, or the last one if descending is True
+        :param query_string: Str, query string
+        :param query_config_path: Path of the config file with the queries
+        :param conf_query: Query configuration name
+        :param descending: bool, sort the results by id in descending order
+        :return: The id, or None if there are no results
+        """
+        params = dict(default_solr_params(self.environment))
+        params.update({"q": make_query(query_string, query_config_path, conf_query=conf_query),
+                       "sort": f"id {'desc' if descending else 'asc'}", "rows": 1, "fl": "id"})
+        docs = json.loads(self.send_query(params).content)["response"]["docs"]
+        return docs[0]["id"] if docs else None
+
     @staticmethod
     def create_boost_phrase_fields(query_fields):
 
@@ -192,7 +231,7 @@ class SolrExporter:
         """ Get the Solr status
         :return: response
         """
-        response = requests.get(self.solr_url, auth=self.auth)
+        response = self.solr_client.get(self.solr_url, auth=self.auth)
         return response
 
 
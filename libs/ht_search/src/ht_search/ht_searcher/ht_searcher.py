@@ -2,8 +2,8 @@ import json
 from collections.abc import Generator
 from typing import Any
 
-import requests
 from ht_utils.ht_logger import get_ht_logger
+from ht_utils.solr_client import get_solr_client
 from requests.auth import HTTPBasicAuth
 
 from ht_search.config_search import add_shards
@@ -49,6 +49,7 @@ class HTSearcher:
         self.environment = environment  # Not sure if we need it right now
         self.query_maker = ht_search_query
         self.auth = HTTPBasicAuth(user, password) if user and password else None
+        self.solr_client = get_solr_client(solr_url)
 
         # TODO HTTP request string and JSON object. We should transform the query string into a JSON object
         self.headers = {
@@ -60,7 +61,7 @@ class HTSearcher:
         # Use stream=True to avoid loading all the data in memory at once (useful for large responses)
         # In chunked transfer, the data stream is divided into a series of non-overlapping "chunks".
 
-        response = requests.post(
+        response = self.solr_client.post(
             url=f"{self.solr_url}/query", params=params, headers=self.headers, stream=True, auth=self.auth
         )
 